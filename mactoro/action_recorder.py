@@ -21,6 +21,7 @@ class ActionRecorder:
         self.actions = []
         self.recording = False
         self.start_time = None
+        self.start_monotonic = None
         self.last_action_time = None
         self.current_keys = set()
         self.mouse_pressed = False
@@ -175,6 +176,10 @@ class ActionRecorder:
             if wait_time > self.min_wait_time:
                 action['wait'] = round(wait_time, 2)
         
+        # 記録開始からの経過時間（タイムライン再生用）
+        if self.start_monotonic is not None:
+            action['offset'] = round(time.monotonic() - self.start_monotonic, 3)
+        
         # タイムスタンプを追加
         action['timestamp'] = datetime.now().isoformat()
         
@@ -385,6 +390,7 @@ class ActionRecorder:
         """Start recording"""
         self.recording = True
         self.start_time = time.time()
+        self.start_monotonic = time.monotonic()
         self.last_action_time = time.time()
         
         print("\n=== Action recording started ===")
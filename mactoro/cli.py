@@ -3,6 +3,7 @@ import click
 import sys
 from .window_controller import WindowController
 from .action_recorder import ActionRecorder  
+from .execution_plan import PlanError
 import json
 import os
 from datetime import datetime
@@ -131,7 +132,17 @@ def record_analyze_image(image):
 @click.option('--coordinates', help='Coordinates definition file path (optional)')
 @click.option('--debug', '-d', is_flag=True, help='Enable debug mode')
 @click.option('--dry-run', is_flag=True, help='Show what would be executed without running')
-def run(config, window, window_id, coordinates, debug, dry_run):
+@click.option('--timeline', is_flag=True, help='Replay recorded actions at their original times')
+@click.option('--speed', type=click.FloatRange(min=0, min_open=True),
+              help='Replay speed multiplier for recorded waits and drags (e.g. 4)')
+@click.option('--trace', type=click.Path(dir_okay=False), help='Stream every executed action to a JSON lines file')
+@click.option('--quiet', '-q', is_flag=True, help='Only log warnings and errors')
+@click.option('--verbose', '-v', is_flag=True, help='Log debug details for every action')
+@click.option('--log-format', type=click.Choice(['text', 'json']), help='Log output format')
+@click.option('--log-sample', type=click.IntRange(min=1),
+              help='Log only one in N actions inside loops')
+def run(config, window, window_id, coordinates, debug, dry_run, timeline, speed, trace,
+        quiet, verbose, log_format, log_sample):
     """Execute automation from configuration file
     
     Examples:
@@ -146,9 +157,19 @@ def run(config, window, window_id, coordinates, debug, dry_run):
     
     if dry_run:
         print(f"Dry run mode - would execute: {config}")
-        with open(config, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-        print(f"Total actions: {len(config_data.get('actions', []))}")
+        controller = WindowController()
+        if coordinates and os.path.exists(coordinates):
+            controller.recorded_coordinates = controller.load_coordinates(coordinates)
+        config_data = controller.load_config(config)
+        try:
+            controller.apply_settings(config_data.get('settings', {}), speed)
+            plan = controller.compile_config(config_data)
+        except (PlanError, ValueError) as e:
+            print(f"Invalid configuration: {e}")
+            sys.exit(1)
+        finally:
+            controller.tiles.close()
+        print(f"Total actions: {len(plan)}")
         return
     
     controller = WindowController()
@@ -157,7 +178,13 @@ def run(config, window, window_id, coordinates, debug, dry_run):
         window_id=window_id,
         config_path=config,
         coordinates_path=coordinates,
-        debug=debug
+        debug=debug,
+        timeline=timeline,
+        speed=speed,
+        trace_path=trace,
+        log_level='warning' if quiet else 'debug' if verbose else None,
+        log_format=log_format,
+        log_sample=log_sample
     )
 
 @main.command()
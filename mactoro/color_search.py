@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Vectorized color search over captured frames
+
+Frames are HxWx3 uint8 RGB arrays (see screen_capture); every function
+here returns points as (x, y) frame coordinates.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+SCAN_ORDERS = ('row_major', 'nearest')
+
+# Named blob selections; an integer selects the nth blob instead
+BLOB_SELECTIONS = ('largest', 'nearest')
+
+# Subsampling steps accepted by the coarse-to-fine search
+DOWNSAMPLE_FACTORS = (1, 2, 4, 8)
+
+Point = Tuple[int, int]
+MaskFunction = Callable[[np.ndarray], np.ndarray]
+
+
+def color_mask(frame: np.ndarray, color: Sequence[int], tolerance: int = 10) -> np.ndarray:
+    """Boolean HxW mask of pixels within tolerance of color on every channel"""
+    lows = [max(0, int(value) - tolerance) for value in color[:3]]
+    highs = [min(255, int(value) + tolerance) for value in color[:3]]
+
+    if CV2_AVAILABLE and frame.flags.c_contiguous:
+        mask = cv2.inRange(frame, tuple(lows), tuple(highs))
+        # inRange marks hits with 255; shift to 0/1 in place so the bool view is canonical
+        return np.right_shift(mask, 7, out=mask).view(bool)
+
+    # Strided views (Quartz frames): one uint8 subtract and compare per channel.
+    # Values below low wrap around past high - low, so one comparison covers both bounds.
+    mask = None
+    for channel, (low, high) in enumerate(zip(lows, highs)):
+        channel_mask = (frame[:, :, channel] - np.uint8(low)) <= np.uint8(high - low)
+        mask = channel_mask if mask is None else np.logical_and(mask, channel_mask, out=mask)
+    return mask
+
+
+def _check_scan_order(scan_order: str):
+    if scan_order not in SCAN_ORDERS:
+        raise ValueError(f"Unknown scan_order '{scan_order}' (expected one of {', '.join(SCAN_ORDERS)})")
+
+
+def mask_hits(mask: np.ndarray, scan_order: str = 'row_major',
+              near: Optional[Point] = None, limit: Optional[int] = None) -> List[Point]:
+    """All True points of a mask in scan order, optionally only the first limit"""
+    _check_scan_order(scan_order)
+    ys, xs = np.nonzero(mask)
+    if scan_order == 'nearest':
+        order = np.argsort(_squared_distance(xs, ys, near), kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        xs, ys = xs[order], ys[order]
+    elif limit is not None:
+        xs, ys = xs[:limit], ys[:limit]
+    return [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+
+def first_hit(mask: np.ndarray, scan_order: str = 'row_major',
+              near: Optional[Point] = None) -> Optional[Point]:
+    """The first True point of a mask in scan order, or None"""
+    _check_scan_order(scan_order)
+    if scan_order == 'nearest':
+        ys, xs = np.nonzero(mask)
+        if not len(xs):
+            return None
+        i = int(np.argmin(_squared_distance(xs, ys, near)))
+        return int(xs[i]), int(ys[i])
+
+    # argmax on a boolean array stops at the first True
+    flat = np.argmax(mask)
+    y, x = divmod(int(flat), mask.shape[1])
+    if not mask[y, x]:
+        return None
+    return x, y
+
+
+def find_color(frame: np.ndarray, color: Sequence[int], tolerance: int = 10,
+               scan_order: str = 'row_major', near: Optional[Point] = None) -> Optional[Point]:
+    """First pixel matching color in scan order, or None"""
+    return first_hit(color_mask(frame, color, tolerance), scan_order, near)
+
+
+def find_all_colors(frame: np.ndarray, color: Sequence[int], tolerance: int = 10,
+                    scan_order: str = 'row_major', near: Optional[Point] = None,
+                    limit: Optional[int] = None) -> List[Point]:
+    """Every pixel matching color in scan order"""
+    return mask_hits(color_mask(frame, color, tolerance), scan_order, near, limit)
+
+
+class Blob(NamedTuple):
+    """A connected region of matching pixels"""
+    centroid: Tuple[float, float]
+    area: int
+    bbox: Tuple[int, int, int, int]  # x, y, width, height
+
+    @property
+    def point(self) -> Point:
+        """Centroid rounded to the nearest pixel"""
+        return int(round(self.centroid[0])), int(round(self.centroid[1]))
+
+
+def find_blobs(mask: np.ndarray, min_area: int = 1, connectivity: int = 8) -> List[Blob]:
+    """Connected regions of a mask, top to bottom then left to right"""
+    if not CV2_AVAILABLE:
+        raise RuntimeError("Blob detection requires opencv-python")
+    count, _, stats, centroids = cv2.connectedComponentsWithStats(
+        mask.astype(np.uint8, copy=False), connectivity=connectivity
+    )
+    blobs = []
+    # Label 0 is the background
+    for label in range(1, count):
+        x, y, width, height, area = (int(value) for value in stats[label])
+        if area < min_area:
+            continue
+        centroid = (float(centroids[label][0]), float(centroids[label][1]))
+        blobs.append(Blob(centroid, area, (x, y, width, height)))
+    blobs.sort(key=lambda blob: (blob.bbox[1], blob.bbox[0]))
+    return blobs
+
+
+def check_blob_selection(selection: Union[str, int]):
+    """Raise ValueError unless selection is a named selection or an index"""
+    if isinstance(selection, bool) or not isinstance(selection, (str, int)) or \
+            (isinstance(selection, str) and selection not in BLOB_SELECTIONS):
+        raise ValueError(f"Unknown blob selection '{selection}' "
+                         f"(expected {', '.join(BLOB_SELECTIONS)} or an index)")
+
+
+def select_blob(blobs: List[Blob], selection: Union[str, int] = 'largest',
+                near: Optional[Point] = None) -> Optional[Blob]:
+    """Pick the largest blob, the one nearest a point, or the nth in order"""
+    check_blob_selection(selection)
+    if not blobs:
+        return None
+    if selection == 'largest':
+        return max(blobs, key=lambda blob: blob.area)
+    if selection == 'nearest':
+        xs = np.array([blob.centroid[0] for blob in blobs])
+        ys = np.array([blob.centroid[1] for blob in blobs])
+        return blobs[int(np.argmin(_squared_distance(xs, ys, near)))]
+    if -len(blobs) <= selection < len(blobs):
+        return blobs[selection]
+    return None
+
+
+def check_downsample(factor: int):
+    """Raise ValueError unless factor is a supported subsampling step"""
+    if isinstance(factor, bool) or factor not in DOWNSAMPLE_FACTORS:
+        raise ValueError(f"Unknown downsample factor '{factor}' "
+                         f"(expected one of {', '.join(map(str, DOWNSAMPLE_FACTORS))})")
+
+
+def refine_hit(frame: np.ndarray, coarse: np.ndarray, factor: int, compute: MaskFunction,
+               scan_order: str = 'row_major', near: Optional[Point] = None) -> Optional[Point]:
+    """Full-resolution hit from coarse, a mask of frame[::factor, ::factor]
+
+    compute masks a part of frame. Only the rows between the coarse hit
+    and the sampled row above it (row_major), or the cells around the
+    coarse hit (nearest), are masked again at full resolution. For
+    targets at least factor points wide and tall, row_major gives the
+    same point as a full scan and nearest is within factor points of it.
+    """
+    coarse_near = (near[0] / factor, near[1] / factor) if near is not None else None
+    hit = first_hit(coarse, scan_order, coarse_near)
+    if hit is None:
+        return None
+
+    x, y = hit[0] * factor, hit[1] * factor
+    if scan_order == 'row_major':
+        # Every row from the previous sampled row down to the hit's row, full width
+        top = max(0, y - factor + 1)
+        band_hit = first_hit(compute(frame[top:y + 1]), 'row_major')
+        return band_hit[0], band_hit[1] + top
+
+    left, top = max(0, x - factor + 1), max(0, y - factor + 1)
+    window = compute(frame[top:y + factor, left:x + factor])
+    window_hit = first_hit(window, 'nearest', (near[0] - left, near[1] - top))
+    return window_hit[0] + left, window_hit[1] + top
+
+
+def refine_blob(frame: np.ndarray, blob: Blob, factor: int, compute: MaskFunction,
+                min_area: int = 1) -> Optional[Blob]:
+    """The full-resolution blob behind a blob found in frame[::factor, ::factor]"""
+    x, y, width, height = blob.bbox
+    # Pad by one sampling step on each side to catch edges between samples
+    left, top = max(0, (x - 1) * factor + 1), max(0, (y - 1) * factor + 1)
+    right, bottom = (x + width) * factor, (y + height) * factor
+    blobs = find_blobs(compute(frame[top:bottom, left:right]), min_area)
+    if not blobs:
+        return None
+    best = max(blobs, key=lambda candidate: candidate.area)
+    (cx, cy), (bx, by, bw, bh) = best.centroid, best.bbox
+    return Blob((cx + left, cy + top), best.area, (bx + left, by + top, bw, bh))
+
+
+def _squared_distance(xs: np.ndarray, ys: np.ndarray, near: Optional[Point]) -> np.ndarray:
+    if near is None:
+        raise ValueError("scan_order 'nearest' needs a point to measure from")
+    dx = xs - near[0]
+    dy = ys - near[1]
+    return dx * dx + dy * dy
+
+
+class Palette:
+    """Several target colors matched together in one pass over a frame
+
+    Each channel gets a 256-entry lookup table whose bit i is set when the
+    value is within tolerance of color i on that channel. ANDing the three
+    lookups gives every pixel a bitmask of the palette colors it matches,
+    with the same per-channel tolerance as color_mask.
+    """
+
+    MAX_COLORS = 64
+
+    def __init__(self, entries: Sequence[Dict[str, Any]], default_tolerance: int = 10):
+        if not entries:
+            raise ValueError("palette needs at least one color")
+        if len(entries) > self.MAX_COLORS:
+            raise ValueError(f"palette supports at most {self.MAX_COLORS} colors")
+
+        self.labels: List[str] = []
+        for i, entry in enumerate(entries):
+            label = str(entry.get('label', i))
+            if label in self.labels:
+                raise ValueError(f"Duplicate palette label '{label}'")
+            self.labels.append(label)
+
+        bits = 8
+        while bits < len(entries):
+            bits *= 2
+        self.luts = np.zeros((256, 3), dtype=np.dtype(f'uint{bits}'))
+        for i, entry in enumerate(entries):
+            tolerance = entry.get('tolerance', default_tolerance)
+            for channel, value in enumerate(entry['color'][:3]):
+                low = max(0, int(value) - tolerance)
+                high = min(255, int(value) + tolerance)
+                self.luts[low:high + 1, channel] |= self.luts.dtype.type(1 << i)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def label_bits(self, frame: np.ndarray) -> np.ndarray:
+        """HxW array whose bit i is set where palette color i matches"""
+        if CV2_AVAILABLE and self.luts.dtype == np.uint8 and frame.flags.c_contiguous:
+            planes = cv2.split(cv2.LUT(frame, self.luts.reshape(1, 256, 3)))
+        else:
+            planes = [np.take(self.luts[:, channel], frame[:, :, channel]) for channel in range(3)]
+        bits = np.bitwise_and(planes[0], planes[1], out=planes[0])
+        return np.bitwise_and(bits, planes[2], out=bits)
+
+    def find(self, frame: np.ndarray, scan_order: str = 'row_major',
+             near: Optional[Point] = None) -> Dict[str, Tuple[Point, int]]:
+        """First hit and hit count for every palette color present, in palette order"""
+        return self.find_in_bits(self.label_bits(frame), scan_order, near)
+
+    def find_in_bits(self, bits: np.ndarray, scan_order: str = 'row_major',
+                     near: Optional[Point] = None) -> Dict[str, Tuple[Point, int]]:
+        """find() over label bits that were already computed"""
+        # One reduction tells which colors are present at all
+        present = int(np.bitwise_or.reduce(bits, axis=None))
+        found = {}
+        for i, label in enumerate(self.labels):
+            if not present >> i & 1:
+                continue
+            mask = (bits & bits.dtype.type(1 << i)).astype(bool)
+            found[label] = (first_hit(mask, scan_order, near), int(np.count_nonzero(mask)))
+        return found
@@ -19,8 +19,10 @@ except ImportError:
     ImageTk = None
 import os
 import tempfile
+import numpy as np
 import Quartz
 from pynput import mouse, keyboard
+from .screen_capture import CaptureError, WindowCapture, create_capture
 
 class CoordinateRecorder:
     def __init__(self, window_name=None, fullscreen=False):
@@ -32,6 +34,7 @@ class CoordinateRecorder:
         self.target_window = None
         self.show_coordinates_in_terminal = False
         self.last_coordinates = None
+        self.capture = create_capture()
         
         if window_name:
             self.target_window = self._find_window(window_name)
@@ -71,8 +74,7 @@ class CoordinateRecorder:
     
     def _get_pixel_color(self, x, y):
         try:
-            screenshot = pyautogui.screenshot(region=(x, y, 1, 1))
-            return list(screenshot.getpixel((0, 0)))
+            return list(self.capture.pixel(x, y))
         except:
             return [0, 0, 0]
     
@@ -239,6 +241,7 @@ class CoordinateOverlay:
         self.target_window = target_window
         self.running = True
         self.root = None
+        self.capture = create_capture()
         
     def run(self):
         if not TKINTER_AVAILABLE:
@@ -285,7 +288,7 @@ class CoordinateOverlay:
                 text += f"\nWindow relative: ({rel_x}, {rel_y})"
         
         try:
-            color = pyautogui.screenshot(region=(x, y, 1, 1)).getpixel((0, 0))
+            color = self.capture.pixel(x, y)
             text += f"\nColor: RGB{color}"
         except:
             pass
@@ -323,7 +326,12 @@ class ScreenshotAnalyzer:
                     width = int(bounds.get('Width', 0))
                     height = int(bounds.get('Height', 0))
                     
-                    screenshot = pyautogui.screenshot(region=(x, y, width, height))
+                    try:
+                        # Only the window's own pixels, even when something covers it
+                        capture = WindowCapture(window['kCGWindowNumber'], (x, y, width, height))
+                        screenshot = Image.fromarray(np.ascontiguousarray(capture.grab()))
+                    except CaptureError:
+                        screenshot = pyautogui.screenshot(region=(x, y, width, height))
                     
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     filename = f"screenshot_{self.window_name}_{timestamp}.png"
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Compile run configuration actions into a pre-validated execution plan"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from .timing import scale_wait
+
+
+class PlanError(ValueError):
+    """Raised when a configuration cannot be compiled into a plan"""
+
+
+# Keys every action of a given type must define
+REQUIRED_KEYS: Dict[str, List[str]] = {
+    'type': ['text'],
+    'hotkey': ['keys'],
+    'wait_for_color': ['color'],
+    'wait_for_window': ['window_name'],
+    'loop_until': ['condition'],
+    'conditional': ['condition'],
+    'exit_if': ['condition'],
+    'click_on_color': ['color'],
+    'find_colors': ['palette'],
+    'click_on_any_color': ['palette'],
+    'click_on_image': ['image'],
+    'goto': ['screen'],
+}
+
+# Actions whose 'timeout' ends a wait normally instead of failing the run
+WAIT_TIMEOUT_TYPES = ('wait_for_color', 'wait_for_window', 'wait_for_change', 'wait_for_stable',
+                      'loop_until')
+
+# Condition types understood by wait_for_condition
+CONDITION_TYPES = ('color_match', 'window_exists', 'image_exists', 'time_elapsed', 'stored_result',
+                   'all_of', 'any_of', 'screen')
+
+
+def _not_compiled(*args: Any) -> None:
+    raise RuntimeError("Plan step was not compiled")
+
+
+class PlanStep:
+    """A single action with its handler prebound and defaults resolved"""
+
+    __slots__ = ('action_type', 'action', 'path', 'wait', 'timeout', 'run', 'message',
+                 'sends_input')
+
+    def __init__(self, action: Dict[str, Any], path: str, speed: float = 1.0):
+        self.action_type: str = action['type']
+        self.action = action
+        self.path = path
+        self.wait: Optional[float] = scale_wait(action.get('wait'), speed, action.get('min_wait'))
+        # Hard time budget for the step; the runner passes run() its deadline
+        self.timeout: Optional[float] = None
+        if self.action_type not in WAIT_TIMEOUT_TYPES:
+            self.timeout = action.get('timeout')
+        self.run: Callable[[Any], Any] = _not_compiled
+        self.message: Optional[str] = None
+        # Input actions are paced (action delay, window cooldown) by the runner
+        self.sends_input = False
+
+    def __repr__(self) -> str:
+        return f"PlanStep({self.path}: {self.action_type})"
+
+
+class ExecutionPlan:
+    """Top-level steps of a compiled configuration"""
+
+    def __init__(self, steps: List[PlanStep]):
+        self.steps = steps
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __iter__(self) -> Iterator[PlanStep]:
+        return iter(self.steps)
+
+
+# A compiler binds step.run (and optionally step.message) for one action type.
+# It receives a callback that compiles a nested action list by key name.
+ChildCompiler = Callable[[str], List[PlanStep]]
+StepCompiler = Callable[[PlanStep, ChildCompiler], None]
+
+
+def compile_actions(actions: Any, compilers: Dict[str, StepCompiler],
+                    path: str = 'actions', speed: float = 1.0) -> List[PlanStep]:
+    """Validate an action list and compile it into plan steps
+
+    speed compresses each step's recorded wait (see timing.scale_wait).
+    """
+    if speed <= 0:
+        raise PlanError(f"speed must be positive, got {speed}")
+    if not isinstance(actions, list):
+        raise PlanError(f"{path}: expected a list of actions")
+
+    steps = []
+    for i, action in enumerate(actions):
+        step_path = f"{path}[{i}]"
+        if not isinstance(action, dict) or 'type' not in action:
+            raise PlanError(f"{step_path}: action must be an object with a 'type'")
+
+        action_type = action['type']
+        compiler = compilers.get(action_type)
+        if compiler is None:
+            raise PlanError(f"{step_path}: Unknown action type '{action_type}'")
+
+        missing = [key for key in REQUIRED_KEYS.get(action_type, []) if key not in action]
+        if missing:
+            raise PlanError(f"{step_path}: '{action_type}' requires {', '.join(missing)}")
+
+        step = PlanStep(action, step_path, speed)
+
+        def compile_children(key: str, _action: Dict[str, Any] = action,
+                             _path: str = step_path) -> List[PlanStep]:
+            return compile_actions(_action.get(key, []), compilers, f"{_path}.{key}", speed)
+
+        try:
+            compiler(step, compile_children)
+        except PlanError:
+            raise
+        except (KeyError, ValueError, TypeError) as e:
+            raise PlanError(f"{step_path}: {e}") from e
+
+        steps.append(step)
+
+    return steps
+
+
+def stored_names(actions: Any) -> Set[str]:
+    """Every 'store_as' name declared in an action list, including nested lists"""
+    names = set()
+    if not isinstance(actions, list):
+        return names
+    for action in actions:
+        if not isinstance(action, dict):
+            continue
+        if 'store_as' in action:
+            names.add(action['store_as'])
+        for value in action.values():
+            if isinstance(value, list):
+                names |= stored_names(value)
+    return names
+
+
+def compile_plan(actions: Any, compilers: Dict[str, StepCompiler],
+                 speed: float = 1.0) -> ExecutionPlan:
+    """Compile the top-level action list of a configuration"""
+    return ExecutionPlan(compile_actions(actions, compilers, speed=speed))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Cheap frame fingerprints and changed-tile tracking between frames"""
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Side of the grayscale thumbnail a frame is reduced to
+FINGERPRINT_SIZE = 64
+# Mean absolute difference (gray levels, 0-255) below which two frames are the same
+DEFAULT_CHANGE_THRESHOLD = 1.0
+
+DIFF_METRICS = ('mean', 'max')
+
+
+def fingerprint(frame: np.ndarray, size: int = FINGERPRINT_SIZE) -> np.ndarray:
+    """Area-averaged grayscale thumbnail of an RGB frame
+
+    Each thumbnail pixel averages a block of the frame, so small
+    rendering noise cancels out while real redraws still move it.
+    """
+    width, height = min(size, frame.shape[1]), min(size, frame.shape[0])
+    small = cv2.resize(np.ascontiguousarray(frame), (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+
+def fingerprint_difference(a: np.ndarray, b: np.ndarray, metric: str = 'mean') -> float:
+    """How far apart two fingerprints are, in gray levels
+
+    'mean' averages over the whole region and ignores a blinking caret;
+    'max' reacts to a change confined to one small area such as a spinner.
+    """
+    if metric not in DIFF_METRICS:
+        raise ValueError(f"Unknown metric '{metric}' (expected one of {', '.join(DIFF_METRICS)})")
+    if a.shape != b.shape:
+        return float('inf')
+    difference = np.abs(a - b)
+    return float(difference.mean() if metric == 'mean' else difference.max())
+
+
+# Side of the square tiles changes are tracked in
+TILE_SIZE = 64
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray,
+                  tile_size: int = TILE_SIZE) -> np.ndarray:
+    """Boolean grid with one cell per tile that differs between two frames
+
+    Rows are compared as machine words a band of tiles at a time, which
+    is several times faster than a per-channel comparison and never
+    materialises a full-frame difference image.
+    """
+    height, width = current.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+    tile_bytes = tile_size * current.itemsize * (current.size // max(height * width, 1))
+    old, new = _row_bytes(previous), _row_bytes(current)
+
+    # Widest word that never straddles a tile boundary
+    word = next(size for size in (8, 4, 2, 1)
+                if tile_bytes % size == 0 and new.shape[1] % size == 0)
+    old, new = old.view(f'u{word}'), new.view(f'u{word}')
+    words_per_tile = tile_bytes // word
+
+    changed = np.zeros((rows, cols), dtype=bool)
+    padded = np.zeros(cols * words_per_tile, dtype=bool)
+    for row in range(rows):
+        band = slice(row * tile_size, (row + 1) * tile_size)
+        padded[:new.shape[1]] = (old[band] != new[band]).any(axis=0)
+        changed[row] = padded.reshape(cols, words_per_tile).any(axis=1)
+    return changed
+
+
+def _row_bytes(frame: np.ndarray) -> np.ndarray:
+    """A frame as a contiguous (height, row bytes) uint8 array"""
+    frame = np.ascontiguousarray(frame)
+    return frame.view(np.uint8).reshape(frame.shape[0], -1)
+
+
+def tile_runs(tiles: np.ndarray, tile_size: int = TILE_SIZE) -> List[Tuple[slice, slice]]:
+    """(rows, columns) slices covering the marked tiles, one per horizontal run"""
+    runs = []
+    for row in range(tiles.shape[0]):
+        columns = np.flatnonzero(tiles[row])
+        if not len(columns):
+            continue
+        # Split the marked columns wherever there is a gap
+        breaks = np.flatnonzero(np.diff(columns) > 1) + 1
+        for run in np.split(columns, breaks):
+            runs.append((slice(row * tile_size, (row + 1) * tile_size),
+                         slice(int(run[0]) * tile_size, (int(run[-1]) + 1) * tile_size)))
+    return runs
+
+
+class DirtyTracker:
+    """Which tiles of a region changed since the previous frame
+
+    Keeps a private copy of the last frame and refreshes only the tiles
+    that changed, so steady-state work beyond the comparison itself is
+    proportional to what moved on screen.
+    """
+
+    def __init__(self, tile_size: int = TILE_SIZE):
+        self.tile_size = tile_size
+        self._previous: Optional[np.ndarray] = None
+
+    def update(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Tile grid of changes, or None when everything must be rescanned"""
+        if self._previous is None or self._previous.shape != frame.shape:
+            self._previous = np.array(frame)
+            return None
+        tiles = changed_tiles(self._previous, frame, self.tile_size)
+        for rows, columns in tile_runs(tiles, self.tile_size):
+            self._previous[rows, columns] = frame[rows, columns]
+        return tiles
+
+
+class IncrementalMap:
+    """A per-pixel map of a region, recomputed only in tiles that changed
+
+    compute turns a frame (or a tile of one) into an HxW array, e.g. a
+    color tolerance mask. The returned map is reused between updates and
+    must not be modified by callers.
+    """
+
+    def __init__(self, compute: Callable[[np.ndarray], np.ndarray], tile_size: int = TILE_SIZE):
+        self.compute = compute
+        self.tracker = DirtyTracker(tile_size)
+        self.map: Optional[np.ndarray] = None
+        self.full_scans = 0
+        self.tiles_rescanned = 0
+
+    def update(self, frame: np.ndarray) -> np.ndarray:
+        tiles = self.tracker.update(frame)
+        if tiles is None or self.map is None:
+            self.map = np.array(self.compute(frame))
+            self.full_scans += 1
+            return self.map
+        for rows, columns in tile_runs(tiles, self.tracker.tile_size):
+            self.map[rows, columns] = self.compute(frame[rows, columns])
+        self.tiles_rescanned += int(tiles.sum())
+        return self.map
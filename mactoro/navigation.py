@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Shortest-path navigation between catalogued screens
+
+Transitions are edges of a directed graph whose nodes are screen names
+(see screen_catalog). A transition from ANY_SCREEN can be taken from
+every screen and from an unrecognised one, which makes it the natural
+place for recovery steps such as pressing Escape.
+"""
+from collections import deque
+from typing import Any, Container, Dict, List, NamedTuple, Optional, Tuple
+
+# Source of transitions that apply on every screen, including unknown ones
+ANY_SCREEN = '*'
+# Seconds to wait for the expected screen after a transition
+DEFAULT_HOP_TIMEOUT = 5.0
+
+
+class NavigationError(RuntimeError):
+    """Raised when goto cannot reach its target screen"""
+
+
+class Transition(NamedTuple):
+    """Steps that lead from one screen to another"""
+    source: str
+    target: str
+    steps: List[Any]  # compiled PlanSteps
+    timeout: float
+    path: str  # where the transition is declared, for messages
+
+
+class ScreenGraph:
+    """Transitions between screens, searched breadth first"""
+
+    def __init__(self, transitions: Optional[List[Transition]] = None):
+        self._edges: Dict[str, List[Transition]] = {}
+        for transition in transitions or []:
+            self._edges.setdefault(transition.source, []).append(transition)
+
+    def __len__(self) -> int:
+        return sum(len(edges) for edges in self._edges.values())
+
+    def edges(self, source: Optional[str]) -> List[Transition]:
+        """Transitions usable on source; specific ones come before ANY_SCREEN ones"""
+        specific = self._edges.get(source, []) if source is not None else []
+        return specific + self._edges.get(ANY_SCREEN, [])
+
+    def shortest_path(self, source: Optional[str], target: str) -> Optional[List[Transition]]:
+        """Fewest transitions from source (None if unrecognised) to target
+
+        Returns [] when already there and None when target is unreachable.
+        """
+        if source == target:
+            return []
+        # screen -> (screen it was reached from, transition taken)
+        reached: Dict[Optional[str], Tuple[Optional[str], Transition]] = {}
+        queue = deque([source])
+        while queue:
+            screen = queue.popleft()
+            for transition in self.edges(screen):
+                if transition.target == source or transition.target in reached:
+                    continue
+                reached[transition.target] = (screen, transition)
+                if transition.target == target:
+                    return self._route(reached, source, target)
+                queue.append(transition.target)
+        return None
+
+    @staticmethod
+    def _route(reached: Dict[Optional[str], Tuple[Optional[str], Transition]],
+               source: Optional[str], target: str) -> List[Transition]:
+        route = []
+        screen = target
+        while screen != source:
+            screen, transition = reached[screen]
+            route.append(transition)
+        route.reverse()
+        return route
+
+
+def check_transition(transition: Dict[str, Any], screens: Container[str], path: str):
+    """Raise ValueError unless transition names known screens and has actions"""
+    for key in ('from', 'to', 'actions'):
+        if key not in transition:
+            raise ValueError(f"{path}: transition requires '{key}'")
+    if transition['from'] != ANY_SCREEN and transition['from'] not in screens:
+        raise ValueError(f"{path}: unknown screen '{transition['from']}'")
+    if transition['to'] not in screens:
+        raise ValueError(f"{path}: unknown screen '{transition['to']}'")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Buffered run logging and background writers for run traces"""
+import json
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+# Log levels, ordered like the standard logging module
+ERROR = 40
+WARNING = 30
+INFO = 20
+DEBUG = 10
+
+LEVEL_NAMES = {'error': ERROR, 'warning': WARNING, 'info': INFO, 'debug': DEBUG}
+
+# Sentinel telling a writer thread to flush and exit
+_CLOSE = object()
+
+
+class BackgroundWriter:
+    """Format and write records to a stream from a background thread
+
+    write() only enqueues; the writer thread batches records and flushes
+    them every flush_interval seconds or every batch_size records. The
+    queue is bounded so a slow stream applies back-pressure instead of
+    growing memory.
+    """
+
+    def __init__(self, stream: TextIO, format_record: Callable[[Any], str],
+                 batch_size: int = 256, flush_interval: float = 1.0,
+                 max_queue: int = 10000, name: str = 'mactoro-writer'):
+        self.stream = stream
+        self.format_record = format_record
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records_written = 0
+        self.closed = False
+        self.failed = False
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, record: Any):
+        """Queue a record for writing"""
+        self._queue.put(record)
+
+    def _flush(self, pending: List[Any]):
+        if not pending or self.failed:
+            pending.clear()
+            return
+        lines = [self.format_record(record) for record in pending]
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Closed pipe or file: drop further output rather than kill the run
+            self.failed = True
+        else:
+            self.records_written += len(pending)
+        pending.clear()
+
+    def _run(self):
+        pending: List[Any] = []
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush(pending)
+                continue
+
+            if record is _CLOSE:
+                self._flush(pending)
+                return
+
+            pending.append(record)
+            if len(pending) >= self.batch_size or self._queue.empty():
+                self._flush(pending)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Flush outstanding records and stop the thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+
+class TraceWriter(BackgroundWriter):
+    """Stream records to a JSON lines file from a background thread"""
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 1.0,
+                 max_queue: int = 10000):
+        self.path = path
+        super().__init__(open(path, 'a', encoding='utf-8'), self._format,
+                         batch_size, flush_interval, max_queue, name='mactoro-trace')
+
+    @staticmethod
+    def _format(record: Dict[str, Any]) -> str:
+        # Epoch timestamps are rendered here, on the writer thread, not in the action loop
+        if isinstance(record.get('timestamp'), float):
+            record = dict(record, timestamp=datetime.fromtimestamp(record['timestamp']).isoformat())
+        return json.dumps(record, ensure_ascii=False, default=str)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Flush outstanding records and close the file"""
+        if self.closed:
+            return
+        super().close(timeout)
+        self.stream.close()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+
+class RunLogger:
+    """Leveled logger for automation runs
+
+    Records below the configured level are dropped before any formatting
+    happens. Timestamps and text are rendered on the writer thread when
+    background is True, so terminal I/O never blocks the action loop.
+    sample() lets loop bodies log only one in every sample_every steps.
+    """
+
+    def __init__(self, level: int = INFO, json_output: bool = False, sample_every: int = 1,
+                 stream: Optional[TextIO] = None, background: bool = False):
+        self.level = level
+        self.json_output = json_output
+        self.sample_every = max(1, int(sample_every))
+        self.stream = stream
+        self._sample_count = 0
+        self._writer: Optional[BackgroundWriter] = None
+        if background:
+            self._writer = BackgroundWriter(stream or sys.stdout, self.format,
+                                            batch_size=64, flush_interval=0.2,
+                                            name='mactoro-log')
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def sample(self) -> bool:
+        """True for the first of every sample_every calls"""
+        self._sample_count += 1
+        return (self._sample_count - 1) % self.sample_every == 0
+
+    def log(self, level: int, message: str, stamp: bool = False, **fields: Any):
+        """Record a message; stamp adds a [HH:MM:SS] prefix in text mode"""
+        if level < self.level:
+            return
+        record = (time.time(), level, message, stamp, fields)
+        if self._writer:
+            self._writer.write(record)
+        else:
+            stream = self.stream or sys.stdout
+            stream.write(self.format(record) + '\n')
+
+    def error(self, message: str, **fields: Any):
+        self.log(ERROR, message, **fields)
+
+    def warning(self, message: str, **fields: Any):
+        self.log(WARNING, message, **fields)
+
+    def info(self, message: str, **fields: Any):
+        self.log(INFO, message, **fields)
+
+    def debug(self, message: str, **fields: Any):
+        self.log(DEBUG, message, **fields)
+
+    def action(self, message: str, **fields: Any):
+        """Log an executed action with a timestamp"""
+        self.log(INFO, message, stamp=True, **fields)
+
+    def format(self, record: Any) -> str:
+        created, level, message, stamp, fields = record
+        if self.json_output:
+            data = {
+                'time': datetime.fromtimestamp(created).isoformat(),
+                'level': _level_name(level),
+                'message': message.strip(),
+            }
+            data.update((key, value) for key, value in fields.items() if value is not None)
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        text = message + _timing_suffix(fields)
+        if stamp:
+            text = f"[{datetime.fromtimestamp(created).strftime('%H:%M:%S')}] {text}"
+        return text
+
+    def close(self):
+        """Flush any buffered output"""
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+
+def _level_name(level: int) -> str:
+    for name, value in LEVEL_NAMES.items():
+        if value == level:
+            return name
+    return str(level)
+
+
+def _timing_suffix(fields: Dict[str, Any]) -> str:
+    """Render the wait/drift fields of an action record for text output"""
+    if fields.get('drift') is not None:
+        return f" (drift: {fields['drift'] * 1000:+.1f} ms)"
+    if fields.get('wait') is not None:
+        return f" (wait: {fields['wait']} seconds)"
+    if fields.get('default_wait'):
+        return f" (default_wait: {fields['default_wait']} seconds)"
+    return ""
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""Screen capture backends that return frames as NumPy arrays
+
+Every frame is an HxWx3 uint8 RGB array indexed [y, x] in screen points,
+the same coordinate space pyautogui clicks in.
+"""
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    import Quartz
+    QUARTZ_AVAILABLE = True
+except ImportError:
+    QUARTZ_AVAILABLE = False
+
+# x, y, width, height in screen points
+Region = Tuple[int, int, int, int]
+
+
+class CaptureError(RuntimeError):
+    """Raised when the screen cannot be captured"""
+
+
+class CaptureBackend:
+    """Grab screen regions as RGB arrays
+
+    Frames may be views into a buffer owned by the backend; copy() a frame
+    that has to outlive the next grab.
+    """
+
+    name = 'base'
+    # Screen point at the top-left corner of a grab(None) frame
+    origin: Tuple[int, int] = (0, 0)
+
+    def __init__(self):
+        self.grab_count = 0
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        """Capture region (or the whole screen) as an HxWx3 RGB array"""
+        raise NotImplementedError
+
+    def pixel(self, x: int, y: int) -> Tuple[int, int, int]:
+        """RGB color of a single screen point"""
+        r, g, b = self.grab((x, y, 1, 1))[0, 0]
+        return int(r), int(g), int(b)
+
+    def sample_pixels(self, points: np.ndarray) -> np.ndarray:
+        """RGB colors of several screen points from one capture
+
+        points is an Nx2 array of (x, y); the capture covers only their
+        bounding box. Returns an Nx3 uint8 array in the same order.
+        """
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        frame = self.grab((int(x0), int(y0), int(x1 - x0) + 1, int(y1 - y0) + 1))
+        return frame[points[:, 1] - y0, points[:, 0] - x0]
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class QuartzCapture(CaptureBackend):
+    """In-process capture through CGWindowListCreateImage
+
+    Skips the screencapture subprocess and temporary PNG that
+    pyautogui.screenshot uses on macOS. Every grab copies the CGImage
+    pixels once into a new CFData buffer, which the returned array views
+    in place; on Retina displays the view is strided down to one pixel
+    per screen point. CaptureService reuses preallocated frames instead.
+    """
+
+    name = 'quartz'
+
+    def __init__(self):
+        super().__init__()
+        if not QUARTZ_AVAILABLE:
+            raise CaptureError("Quartz is not available (install pyobjc)")
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        if region is None:
+            rect = Quartz.CGDisplayBounds(Quartz.CGMainDisplayID())
+            width, height = int(rect.size.width), int(rect.size.height)
+        else:
+            x, y, width, height = region
+            rect = Quartz.CGRectMake(x, y, width, height)
+
+        image = Quartz.CGWindowListCreateImage(
+            rect,
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID,
+            Quartz.kCGWindowImageDefault
+        )
+        if image is None:
+            raise CaptureError("Screen capture failed (check Screen Recording permission)")
+        self.grab_count += 1
+        return image_to_array(image, width, height)
+
+
+def image_to_array(image: Any, width: int, height: int) -> np.ndarray:
+    """Copy a 32-bit BGRA CGImage's pixels and view them as RGB width x height points"""
+    pixel_width = Quartz.CGImageGetWidth(image)
+    pixel_height = Quartz.CGImageGetHeight(image)
+    row_bytes = Quartz.CGImageGetBytesPerRow(image)
+    data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image))
+
+    # Rows are padded to row_bytes; the padding is sliced off below
+    buffer = np.frombuffer(data, dtype=np.uint8, count=pixel_height * row_bytes)
+    bgra = buffer.reshape(pixel_height, row_bytes // 4, 4)
+    scale = max(1, pixel_width // max(width, 1))
+    return bgra[:height * scale:scale, :width * scale:scale, 2::-1]
+
+
+class PyAutoGUICapture(CaptureBackend):
+    """Fallback through pyautogui.screenshot (slow on macOS)"""
+
+    name = 'pyautogui'
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        import pyautogui
+        screenshot = pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+        self.grab_count += 1
+        return np.asarray(screenshot.convert('RGB'))
+
+
+class FakeCapture(CaptureBackend):
+    """In-memory frame source for tests and benchmarks
+
+    Plays back a sequence of frames, advancing one frame per grab and
+    holding the last one. Grabs return views into the stored frames.
+    """
+
+    name = 'fake'
+
+    def __init__(self, frames: Union[np.ndarray, Sequence[np.ndarray]]):
+        super().__init__()
+        if isinstance(frames, np.ndarray) and frames.ndim == 3:
+            frames = [frames]
+        self.frames: List[np.ndarray] = [self._validate(frame) for frame in frames]
+        if not self.frames:
+            raise ValueError("FakeCapture needs at least one frame")
+        self.index = 0
+
+    @classmethod
+    def solid(cls, width: int, height: int,
+              color: Sequence[int] = (0, 0, 0)) -> "FakeCapture":
+        """A single frame filled with one color"""
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = color
+        return cls(frame)
+
+    @staticmethod
+    def _validate(frame: np.ndarray) -> np.ndarray:
+        frame = np.asarray(frame, dtype=np.uint8)
+        if frame.ndim != 3 or frame.shape[2] != 3:
+            raise ValueError(f"Frames must be HxWx3 RGB arrays, got shape {frame.shape}")
+        return frame
+
+    @property
+    def frame(self) -> np.ndarray:
+        """The frame the next grab returns"""
+        return self.frames[self.index]
+
+    def set_frame(self, frame: np.ndarray):
+        """Replace the playback with a single frame"""
+        self.frames = [self._validate(frame)]
+        self.index = 0
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        frame = self.frames[self.index]
+        if self.index < len(self.frames) - 1:
+            self.index += 1
+        self.grab_count += 1
+        if region is None:
+            return frame
+
+        x, y, width, height = region
+        height_px, width_px = frame.shape[:2]
+        if x < 0 or y < 0 or x + width > width_px or y + height > height_px:
+            raise CaptureError(f"Region {tuple(region)} is outside the {width_px}x{height_px} frame")
+        return frame[y:y + height, x:x + width]
+
+
+def _window_rect(bounds: Region, region: Optional[Region]) -> Region:
+    """region (or the whole window), checked to lie inside the window bounds"""
+    if region is None:
+        return bounds
+    x, y, width, height = region
+    left, top, window_width, window_height = bounds
+    if x < left or y < top or x + width > left + window_width or y + height > top + window_height:
+        raise CaptureError(f"Region {tuple(region)} is outside the window at {tuple(bounds)}")
+    return tuple(region)
+
+
+class WindowCapture(CaptureBackend):
+    """Capture only the pixels of one window, by its kCGWindowNumber
+
+    Other windows covering the target do not show up in its frames, and
+    each grab composites just the requested part of that window, so the
+    cost follows the region size rather than the display size. Regions
+    are in screen points and must lie inside bounds.
+    """
+
+    name = 'window'
+
+    def __init__(self, window_id: int, bounds: Region):
+        super().__init__()
+        if not QUARTZ_AVAILABLE:
+            raise CaptureError("Quartz is not available (install pyobjc)")
+        self.window_id = window_id
+        self.bounds = tuple(bounds)
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        return self.bounds[0], self.bounds[1]
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        x, y, width, height = _window_rect(self.bounds, region)
+        image = Quartz.CGWindowListCreateImage(
+            Quartz.CGRectMake(x, y, width, height),
+            Quartz.kCGWindowListOptionIncludingWindow,
+            self.window_id,
+            Quartz.kCGWindowImageBoundsIgnoreFraming | Quartz.kCGWindowImageNominalResolution
+        )
+        if image is None or Quartz.CGImageGetWidth(image) == 0:
+            raise CaptureError(f"Window {self.window_id} could not be captured (closed or minimized?)")
+        self.grab_count += 1
+        return image_to_array(image, width, height)
+
+
+class FakeWindowCapture(FakeCapture):
+    """FakeCapture whose frames are the contents of a window at bounds
+
+    Stands in for WindowCapture in tests: regions are given in screen
+    points and translated into the window's frames.
+    """
+
+    name = 'fake_window'
+
+    def __init__(self, frames: Union[np.ndarray, Sequence[np.ndarray]], bounds: Region,
+                 window_id: int = 1):
+        super().__init__(frames)
+        self.window_id = window_id
+        self.bounds = tuple(bounds)
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        return self.bounds[0], self.bounds[1]
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        if region is None:
+            return super().grab(None)
+        x, y, width, height = _window_rect(self.bounds, region)
+        return super().grab((x - self.bounds[0], y - self.bounds[1], width, height))
+
+
+def window_bounds_region(window: Dict[str, Any]) -> Region:
+    """A window's bounds dict as an (x, y, width, height) region"""
+    bounds = window['bounds']
+    return (int(bounds['x']), int(bounds['y']), int(bounds['width']), int(bounds['height']))
+
+
+class Frame(NamedTuple):
+    """A frame captured by CaptureService"""
+    image: np.ndarray
+    frame_id: int
+    timestamp: float  # time.monotonic() when the capture finished
+
+
+class CaptureService(CaptureBackend):
+    """Capture a region in the background and serve the latest frame
+
+    A thread grabs region from backend fps times a second into one of two
+    preallocated buffers and swaps it to the front. grab() copies the
+    requested crop out of the front buffer, so probes never wait for a
+    capture, their cost does not grow with the number of conditions
+    watched, and a slow search never sees the thread overwrite its frame.
+    latest() and wait_for_frame() return the shared buffer itself, which
+    stays valid only until the capture after the next one. Requests
+    outside region fall back to a direct grab from backend.
+    """
+
+    name = 'service'
+
+    def __init__(self, backend: CaptureBackend, fps: float = 10.0,
+                 region: Optional[Region] = None):
+        super().__init__()
+        if fps <= 0:
+            raise ValueError(f"fps must be positive, got {fps}")
+        self.backend = backend
+        self.fps = fps
+        self.region = tuple(region) if region else None
+        self.fallbacks = 0
+        self.error: Optional[Exception] = None
+        self._buffers: List[Optional[np.ndarray]] = [None, None]
+        self._front = 0
+        self._latest: Optional[Frame] = None
+        self._new_frame = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='mactoro-capture', daemon=True)
+
+    def start(self) -> "CaptureService":
+        """Capture the first frame, then keep capturing in the background"""
+        self._capture()
+        self._thread.start()
+        return self
+
+    def _capture(self):
+        image = self.backend.grab(self.region)
+        back = 1 - self._front
+        buffer = self._buffers[back]
+        if buffer is None or buffer.shape != image.shape:
+            buffer = self._buffers[back] = np.empty(image.shape, dtype=np.uint8)
+        np.copyto(buffer, image)
+        with self._new_frame:
+            self._front = back
+            frame_id = self._latest.frame_id + 1 if self._latest else 1
+            self._latest = Frame(buffer, frame_id, time.monotonic())
+            self._new_frame.notify_all()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_capture = time.monotonic() + interval
+        while not self._stop.wait(max(0.0, next_capture - time.monotonic())):
+            try:
+                self._capture()
+                self.error = None
+            except Exception as e:
+                # Keep serving the last good frame; retry on the next tick
+                self.error = e
+            next_capture += interval
+            if next_capture < time.monotonic():
+                # Running behind: skip the missed ticks instead of bursting
+                next_capture = time.monotonic() + interval
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        # grab(None) serves, or falls back to, the backend's whole frame
+        return self.backend.origin
+
+    def latest(self) -> Frame:
+        """The most recent frame"""
+        if self._latest is None:
+            raise CaptureError("Capture service has not been started")
+        return self._latest
+
+    def wait_for_frame(self, after_id: int, timeout: Optional[float] = None) -> Optional[Frame]:
+        """Block until a frame newer than after_id arrives; None on timeout"""
+        with self._new_frame:
+            if self._new_frame.wait_for(
+                    lambda: self._latest is not None and self._latest.frame_id > after_id, timeout):
+                return self._latest
+        return None
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        self.grab_count += 1
+        if region is None and self.region is not None:
+            self.fallbacks += 1
+            return self.backend.grab(None)
+
+        # The thread only writes into the front buffer after swapping twice,
+        # and swapping needs this lock, so the copy cannot be torn
+        with self._new_frame:
+            image = self.latest().image
+            if region is None:
+                return image.copy()
+            origin_x, origin_y = self.region[:2] if self.region else (0, 0)
+            x, y, width, height = region
+            x, y = x - origin_x, y - origin_y
+            if not (x < 0 or y < 0 or x + width > image.shape[1] or y + height > image.shape[0]):
+                return image[y:y + height, x:x + width].copy()
+        self.fallbacks += 1
+        return self.backend.grab(region)
+
+    def close(self):
+        """Stop the capture thread and release the backend"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        self.backend.close()
+
+
+CAPTURE_BACKENDS = {
+    'quartz': QuartzCapture,
+    'pyautogui': PyAutoGUICapture,
+}
+
+
+def create_capture(backend: str = 'auto') -> CaptureBackend:
+    """Build a capture backend by name; 'auto' prefers Quartz"""
+    if backend == 'auto':
+        backend = 'quartz' if QUARTZ_AVAILABLE else 'pyautogui'
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend '{backend}'")
+    return CAPTURE_BACKENDS[backend]()
+
+
+def capture_from_settings(settings: Dict[str, Any],
+                          window: Optional[Dict[str, Any]] = None) -> CaptureBackend:
+    """Build the backend named by settings.capture.backend
+
+    The 'window' backend captures only the target window (a window info
+    dict with window_id and bounds). With settings.capture.fps the
+    backend is wrapped in a started CaptureService over
+    settings.capture.region, which is either [x, y, width, height] or
+    "window" for the target window's bounds.
+    """
+    capture_settings = settings.get('capture', {})
+    backend_name = capture_settings.get('backend', 'auto')
+    if backend_name == 'window':
+        if not window or not window.get('bounds'):
+            raise ValueError("The window capture backend needs a target window")
+        backend = WindowCapture(window['window_id'], window_bounds_region(window))
+    else:
+        backend = create_capture(backend_name)
+    fps = capture_settings.get('fps')
+    if not fps:
+        return backend
+
+    region = capture_settings.get('region')
+    # Window frames start at the window origin, so the service must know it
+    if region == 'window' or (region is None and backend_name == 'window'):
+        region = window_bounds_region(window) if window and window.get('bounds') else None
+    return CaptureService(backend, fps, region).start()
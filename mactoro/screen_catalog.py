@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Recognise which known screen is showing from perceptual hashes
+
+Each named screen is a reference screenshot, optionally narrowed to a
+region that identifies it. Screens are hashed once when the catalogue is
+built; classifying a capture hashes it once per distinct region and
+compares against every screen with a vectorized Hamming distance.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# The hash keeps the lowest HASH_SIZE x HASH_SIZE DCT frequencies of a DCT_SIZE thumbnail
+HASH_SIZE = 8
+DCT_SIZE = 32
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# Hamming distance (out of HASH_BITS) up to which a capture counts as a screen
+DEFAULT_MAX_DISTANCE = 10
+# How many bits closer than the runner-up the best screen must be to count;
+# flat screens hash only a few bits apart, and a near tie is a guess
+DEFAULT_MIN_MARGIN = 3
+
+# x, y, width, height in points, relative to the captured frame
+Region = Tuple[int, int, int, int]
+
+
+class ScreenMatch(NamedTuple):
+    """A catalogued screen and how far a capture is from it"""
+    name: str
+    distance: int
+
+
+def phash(image: np.ndarray) -> int:
+    """64-bit perceptual hash of an RGB image
+
+    Bits mark which low DCT frequencies of a small grayscale thumbnail
+    are above their median, so the hash survives scaling, compression
+    and small rendering differences but not a different layout.
+    """
+    # Area-averaging a whole window is slow; subsample to about 4x4 points per cell first
+    step = max(1, min(image.shape[:2]) // (DCT_SIZE * 4))
+    image = np.ascontiguousarray(image[::step, ::step])
+    small = cv2.resize(image, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    low = cv2.dct(small.astype(np.float32))[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is the overall brightness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distances(value: int, hashes: np.ndarray) -> np.ndarray:
+    """Number of differing bits between value and each of hashes (uint64)"""
+    differing = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(differing.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def best_match(ranked: Sequence[ScreenMatch], max_distance: int = DEFAULT_MAX_DISTANCE,
+               min_margin: int = DEFAULT_MIN_MARGIN) -> Optional[ScreenMatch]:
+    """The closest of ranked if it is within max_distance and clear of the runner-up"""
+    if not ranked or ranked[0].distance > max_distance:
+        return None
+    if len(ranked) > 1 and ranked[1].distance - ranked[0].distance < min_margin:
+        return None
+    return ranked[0]
+
+
+def _crop(frame: np.ndarray, region: Optional[Region], scale: float = 1.0) -> np.ndarray:
+    if region is None:
+        return frame
+    x, y, width, height = (int(round(value * scale)) for value in region)
+    return frame[y:y + height, x:x + width]
+
+
+class ScreenCatalog:
+    """Named screens indexed by perceptual hash
+
+    Screens sharing a region are stored together, so a capture is
+    cropped and hashed once per region however many screens there are.
+    """
+
+    def __init__(self):
+        # region -> (names, hashes)
+        self._groups: "OrderedDict[Optional[Region], Tuple[List[str], List[int]]]" = OrderedDict()
+        self._arrays: Dict[Optional[Region], np.ndarray] = {}
+        self.names: List[str] = []
+
+    @classmethod
+    def from_config(cls, screens: Dict[str, Dict[str, Any]]) -> "ScreenCatalog":
+        """Build from the configuration's 'screens' block
+
+        Each screen names a reference 'image', an optional 'region' that
+        identifies it, and the image's 'scale' in pixels per point (2
+        for Retina screenshots).
+        """
+        catalog = cls()
+        for name, screen in screens.items():
+            if 'image' not in screen:
+                raise ValueError(f"Screen '{name}' has no 'image'")
+            catalog.add_file(name, screen['image'], screen.get('region'), screen.get('scale', 1.0))
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def add(self, name: str, image: np.ndarray, region: Optional[Sequence[int]] = None,
+            scale: float = 1.0):
+        """Catalogue name from a reference RGB image"""
+        if name in self.names:
+            raise ValueError(f"Duplicate screen name '{name}'")
+        region = tuple(int(value) for value in region) if region else None
+        reference = _crop(image, region, scale)
+        if not reference.size:
+            raise ValueError(f"Region {region} of screen '{name}' is outside its image")
+        names, hashes = self._groups.setdefault(region, ([], []))
+        names.append(name)
+        hashes.append(phash(reference))
+        self._arrays[region] = np.array(hashes, dtype=np.uint64)
+        self.names.append(name)
+
+    def add_file(self, name: str, path: str, region: Optional[Sequence[int]] = None,
+                 scale: float = 1.0):
+        """Catalogue name from a screenshot file"""
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Cannot read image '{path}'")
+        self.add(name, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), region, scale)
+
+    def close_pairs(self, within: int = DEFAULT_MAX_DISTANCE) -> List[Tuple[str, str, int]]:
+        """(name, name, distance) for screens sharing a region whose hashes are within bits"""
+        pairs = []
+        for region, (names, hashes) in self._groups.items():
+            for i, name in enumerate(names):
+                distances = hamming_distances(hashes[i], self._arrays[region][i + 1:])
+                for other, distance in zip(names[i + 1:], distances):
+                    if distance <= within:
+                        pairs.append((name, other, int(distance)))
+        return pairs
+
+    def classify(self, frame: np.ndarray, names: Optional[Sequence[str]] = None) -> List[ScreenMatch]:
+        """Every catalogued screen (or only names) ranked by distance to frame"""
+        ranked = []
+        for region, (group_names, _) in self._groups.items():
+            if names is not None and not any(name in names for name in group_names):
+                continue
+            crop = _crop(frame, region)
+            if not crop.size:
+                # The capture does not reach this region; none of its screens can match
+                distances = np.full(len(group_names), HASH_BITS)
+            else:
+                distances = hamming_distances(phash(crop), self._arrays[region])
+            ranked.extend(ScreenMatch(name, int(distance))
+                          for name, distance in zip(group_names, distances)
+                          if names is None or name in names)
+        ranked.sort(key=lambda match: match.distance)
+        return ranked
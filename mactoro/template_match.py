@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Template matching by normalized cross-correlation over image pyramids
+
+Frames and templates are matched in grayscale. The search runs on the
+coarsest pyramid level first and only refines a few candidates at each
+finer level, so most of the work happens on images a fraction of the
+size of the screen.
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Pyramid levels stop before the template's short side drops below this
+MIN_LEVEL_SIZE = 12
+MAX_LEVELS = 4
+# Coarse candidates scoring this far below the threshold are not refined
+COARSE_SLACK = 0.2
+# Coarse candidates refined per search
+CANDIDATES = 3
+# Pixels searched around a candidate when refining it one level down
+REFINE_MARGIN = 3
+
+
+class Match(NamedTuple):
+    """A template match in frame coordinates"""
+    x: int
+    y: int
+    width: int
+    height: int
+    score: float
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return self.x + self.width // 2, self.y + self.height // 2
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """Grayscale copy of an RGB frame (grayscale frames pass through)"""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_RGB2GRAY)
+
+
+def frame_pyramid(gray: np.ndarray, levels: int) -> List[np.ndarray]:
+    """The image followed by levels - 1 successive halvings"""
+    pyramid = [gray]
+    for _ in range(levels - 1):
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+class Template:
+    """A grayscale template with an optional mask and cached pyramid
+
+    Mask pixels that are zero are ignored when scoring, so transparent
+    corners of a PNG do not have to match the background.
+    """
+
+    def __init__(self, image: np.ndarray, mask: Optional[np.ndarray] = None,
+                 name: str = 'template'):
+        self.name = name
+        self.gray = to_gray(image)
+        if mask is not None:
+            mask = np.where(mask > 0, 255, 0).astype(np.uint8)
+            if mask.shape != self.gray.shape:
+                raise ValueError(f"Mask size {mask.shape[::-1]} does not match template "
+                                 f"{self.gray.shape[::-1]} ({name})")
+            if mask.all():
+                mask = None
+        self.mask = mask
+        self._pyramid: List[Tuple[np.ndarray, Optional[np.ndarray]]] = [(self.gray, self.mask)]
+
+    @classmethod
+    def load(cls, path: str, mask_path: Optional[str] = None, scale: float = 1.0) -> "Template":
+        """Read a template image; PNG transparency becomes the mask
+
+        scale resizes the template, e.g. 0.5 for an image captured at Retina
+        resolution, since frames are in screen points.
+        """
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Cannot read image '{path}'")
+
+        mask = None
+        if image.ndim == 3 and image.shape[2] == 4:
+            mask = image[:, :, 3]
+            image = image[:, :, :3]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        if mask_path:
+            mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(f"Cannot read mask '{mask_path}'")
+
+        if scale != 1.0:
+            size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            if mask is not None:
+                mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+        return cls(gray, mask, name=path)
+
+    @classmethod
+    def from_pyramid(cls, levels: List[Tuple[np.ndarray, Optional[np.ndarray]]],
+                     name: str = 'template') -> "Template":
+        """Rebuild a template from (template, mask) pairs saved by pyramid()"""
+        gray, mask = levels[0]
+        template = cls(gray, mask, name)
+        template._pyramid = list(levels)
+        return template
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Width and height"""
+        return self.gray.shape[1], self.gray.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by every pyramid level built so far"""
+        return sum(gray.nbytes + (mask.nbytes if mask is not None else 0)
+                   for gray, mask in self._pyramid)
+
+    def auto_levels(self) -> int:
+        """How many pyramid levels keep the template at least MIN_LEVEL_SIZE"""
+        levels = 1
+        short_side = min(self.gray.shape)
+        while levels < MAX_LEVELS and short_side >> levels >= MIN_LEVEL_SIZE:
+            levels += 1
+        return levels
+
+    def pyramid(self, levels: int) -> List[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """(template, mask) pairs for each level, built once"""
+        while len(self._pyramid) < levels:
+            gray, mask = self._pyramid[-1]
+            gray = cv2.pyrDown(gray)
+            if mask is not None:
+                mask = cv2.resize(mask, gray.shape[::-1], interpolation=cv2.INTER_NEAREST)
+            self._pyramid.append((gray, mask))
+        return self._pyramid[:levels]
+
+
+def _score_map(image: np.ndarray, template: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+    if mask is None:
+        scores = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    else:
+        scores = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    # Flat areas give 0/0; they are not matches
+    return np.nan_to_num(scores, nan=0.0, posinf=0.0, neginf=0.0, copy=False)
+
+
+def _peaks(scores: np.ndarray, floor: float, count: int,
+           size: Tuple[int, int]) -> List[Tuple[int, int, float]]:
+    """Up to count local maxima above floor, at least half a template apart"""
+    peaks = []
+    width, height = size
+    for _ in range(count):
+        _, score, _, (x, y) = cv2.minMaxLoc(scores)
+        if score < floor:
+            break
+        peaks.append((x, y, score))
+        scores[max(0, y - height // 2):y + height // 2 + 1,
+               max(0, x - width // 2):x + width // 2 + 1] = -1.0
+    return peaks
+
+
+def _refine(image: np.ndarray, template: np.ndarray, mask: Optional[np.ndarray],
+            x: int, y: int) -> Tuple[int, int, float]:
+    """Best position within REFINE_MARGIN of (x, y)"""
+    height, width = template.shape
+    x = min(max(x, 0), image.shape[1] - width)
+    y = min(max(y, 0), image.shape[0] - height)
+    x0, y0 = max(0, x - REFINE_MARGIN), max(0, y - REFINE_MARGIN)
+    x1 = min(image.shape[1], x + width + REFINE_MARGIN)
+    y1 = min(image.shape[0], y + height + REFINE_MARGIN)
+    scores = _score_map(image[y0:y1, x0:x1], template, mask)
+    _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+    return x0 + dx, y0 + dy, score
+
+
+def match_template(frame: np.ndarray, template: Template, threshold: float = 0.9,
+                   levels: Optional[int] = None) -> Optional[Match]:
+    """Best match of template in frame scoring at least threshold, or None"""
+    gray = to_gray(frame)
+    width, height = template.size
+    if gray.shape[0] < height or gray.shape[1] < width:
+        return None
+
+    frames = frame_pyramid(gray, levels or template.auto_levels())
+    templates = template.pyramid(len(frames))
+    # Every level searched must still fit the template inside the frame
+    top = len(frames) - 1
+    while top and (frames[top].shape[0] < templates[top][0].shape[0] or
+                   frames[top].shape[1] < templates[top][0].shape[1]):
+        top -= 1
+
+    coarse_template, coarse_mask = templates[top]
+    scores = _score_map(frames[top], coarse_template, coarse_mask)
+    floor = threshold - COARSE_SLACK if top else threshold
+    candidates = _peaks(scores, floor, CANDIDATES if top else 1, coarse_template.shape[::-1])
+
+    best = None
+    for x, y, score in candidates:
+        for level in range(top - 1, -1, -1):
+            level_template, level_mask = templates[level]
+            x, y, score = _refine(frames[level], level_template, level_mask, x * 2, y * 2)
+        if best is None or score > best.score:
+            best = Match(int(x), int(y), width, height, float(score))
+
+    if best is None or best.score < threshold:
+        return None
+    return best
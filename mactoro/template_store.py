@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Template cache shared by every image action in a run"""
+import hashlib
+import os
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .template_match import Template
+
+DEFAULT_MAX_MB = 64
+# Bump when the saved pyramid layout changes so stale cache files are ignored
+CACHE_VERSION = 1
+
+TemplateKey = Tuple[str, Optional[str], float]
+
+
+class TemplateStore:
+    """Decoded templates and their pyramids, kept under a byte budget
+
+    Templates are evicted least recently used first once max_bytes is
+    exceeded. With a cache_dir, preprocessed pyramids are also saved to
+    disk keyed by a hash of the image file, so later runs skip decoding
+    and downsampling.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._templates: "OrderedDict[TemplateKey, Template]" = OrderedDict()
+        # Bytes each template was last charged for; pyramids can grow after loading
+        self._sizes: Dict[TemplateKey, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "TemplateStore":
+        """Build from settings.templates (max_mb, cache_dir)"""
+        template_settings = settings.get('templates', {})
+        max_mb = template_settings.get('max_mb', DEFAULT_MAX_MB)
+        return cls(int(max_mb * 1024 * 1024), template_settings.get('cache_dir'))
+
+    @staticmethod
+    def key(path: str, mask_path: Optional[str] = None, scale: float = 1.0) -> TemplateKey:
+        return (os.path.abspath(path), os.path.abspath(mask_path) if mask_path else None,
+                float(scale))
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __contains__(self, key: TemplateKey) -> bool:
+        return key in self._templates
+
+    def get(self, key: TemplateKey, levels: Optional[int] = None) -> Template:
+        """The template for key with at least levels pyramid levels, loading it on a miss"""
+        template = self._templates.get(key)
+        if template is not None:
+            self._templates.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            template = self._load(*key)
+            self._templates[key] = template
+            self._sizes[key] = 0
+        if levels:
+            template.pyramid(levels)
+
+        # Charge whatever the pyramid has grown by since the last charge
+        size = template.nbytes
+        if size != self._sizes[key]:
+            self.bytes += size - self._sizes[key]
+            self._sizes[key] = size
+            self._evict()
+        return template
+
+    def _evict(self):
+        # The newest template stays even if it alone is over budget
+        while self.bytes > self.max_bytes and len(self._templates) > 1:
+            key, _ = self._templates.popitem(last=False)
+            self.bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def _load(self, path: str, mask_path: Optional[str], scale: float) -> Template:
+        cache_path = self._cache_path(path, mask_path, scale)
+        if cache_path and os.path.exists(cache_path):
+            template = _read_pyramid(cache_path, path)
+            if template is not None:
+                self.disk_hits += 1
+                return template
+
+        template = Template.load(path, mask_path, scale)
+        template.pyramid(template.auto_levels())
+        if cache_path:
+            _write_pyramid(cache_path, template)
+        return template
+
+    def _cache_path(self, path: str, mask_path: Optional[str], scale: float) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(f"v{CACHE_VERSION}:{scale!r}:".encode())
+        for file_path in (path, mask_path):
+            if file_path:
+                try:
+                    with open(file_path, 'rb') as f:
+                        digest.update(f.read())
+                except OSError:
+                    # Let Template.load report the missing file
+                    return None
+            digest.update(b'\0')
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.npz")
+
+    def summary(self) -> str:
+        """Human readable cache statistics"""
+        return (f"Templates: {len(self)} cached ({self.bytes / 1024 / 1024:.1f} MB), "
+                f"{self.hits} hits, {self.misses} misses ({self.disk_hits} from disk), "
+                f"{self.evictions} evictions")
+
+
+def _write_pyramid(cache_path: str, template: Template):
+    arrays = {}
+    for level, (gray, mask) in enumerate(template.pyramid(template.auto_levels())):
+        arrays[f'gray{level}'] = gray
+        if mask is not None:
+            arrays[f'mask{level}'] = mask
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, cache_path)
+    except OSError:
+        # The disk cache is an optimisation; a read-only directory is not an error
+        pass
+
+
+def _read_pyramid(cache_path: str, name: str) -> Optional[Template]:
+    try:
+        with np.load(cache_path) as data:
+            levels = []
+            while f'gray{len(levels)}' in data.files:
+                level = len(levels)
+                mask = data[f'mask{level}'] if f'mask{level}' in data.files else None
+                levels.append((data[f'gray{level}'], mask))
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        # Corrupt or partial cache file: rebuild from the image
+        return None
+    if not levels:
+        return None
+    return Template.from_pyramid(levels, name)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Search large frames in row bands on a thread pool
+
+NumPy and OpenCV release the GIL in their inner loops, so searching
+bands of a frame on several threads runs on several cores. Frames are
+split into full-width bands; searches that look for one match stop
+submitting work as soon as the answer can no longer change, and
+searches for the best-scoring match search every band so the answer
+does not depend on the thread count.
+"""
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+Point = Tuple[int, int]
+# (top, bottom) rows of a band
+Band = Tuple[int, int]
+
+# Bands shorter than this cost more to dispatch than they save
+MIN_BAND_ROWS = 64
+# Bands per thread: more bands let a first-match search stop sooner
+BANDS_PER_THREAD = 4
+
+
+class TiledSearch:
+    """Run searches over overlapping row bands of a frame in parallel
+
+    With one thread, or a frame too small to split, every method calls
+    the search once on the whole frame in the calling thread.
+    """
+
+    def __init__(self, threads: int = 1, min_band_rows: int = MIN_BAND_ROWS):
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1, got {threads}")
+        self.threads = threads
+        self.min_band_rows = min_band_rows
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if threads > 1:
+            self._pool = ThreadPoolExecutor(threads, thread_name_prefix='mactoro-search')
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "TiledSearch":
+        """Build from settings.search.threads ('auto' for one per core)"""
+        threads = settings.get('search', {}).get('threads', 1)
+        if threads == 'auto':
+            threads = os.cpu_count() or 1
+        return cls(int(threads))
+
+    def bands(self, height: int, overlap: int = 0) -> List[Band]:
+        """Row ranges covering height; neighbours share overlap rows"""
+        if self._pool is None:
+            return [(0, height)]
+        rows = max(self.min_band_rows, overlap * 2, -(-height // (self.threads * BANDS_PER_THREAD)))
+        if rows >= height:
+            return [(0, height)]
+        return [(top, min(height, top + rows + overlap)) for top in range(0, height, rows)]
+
+    def mask(self, frame: np.ndarray, compute: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """compute(frame) assembled from bands computed in parallel"""
+        bands = self.bands(frame.shape[0])
+        if len(bands) == 1:
+            return compute(frame)
+        parts = self._pool.map(lambda band: compute(frame[band[0]:band[1]]), bands)
+        return np.concatenate(list(parts))
+
+    def first(self, frame: np.ndarray, search: Callable[[np.ndarray], Any],
+              overlap: int = 0) -> Optional[Tuple[int, Any]]:
+        """(top, result) for the topmost band where search finds something
+
+        search returns None for no match. Bands further down are
+        cancelled once a band above them has matched.
+        """
+        bands = self.bands(frame.shape[0], overlap)
+        if len(bands) == 1:
+            result = search(frame)
+            return None if result is None else (0, result)
+
+        futures = [self._pool.submit(search, frame[top:bottom]) for top, bottom in bands]
+        try:
+            for (top, _), future in zip(bands, futures):
+                result = future.result()
+                if result is not None:
+                    return top, result
+            return None
+        finally:
+            _cancel(futures)
+
+    def best(self, frame: np.ndarray, search: Callable[[np.ndarray], Any],
+             score: Callable[[Any], float], overlap: int = 0) -> Optional[Tuple[int, Any]]:
+        """(top, result) for the band whose result scores highest
+
+        search returns None for no match. Every band is searched, so the
+        result is the one a single search of the whole frame would pick;
+        on a tie the upper band wins.
+        """
+        bands = self.bands(frame.shape[0], overlap)
+        if len(bands) == 1:
+            result = search(frame)
+            return None if result is None else (0, result)
+
+        futures = [self._pool.submit(search, frame[top:bottom]) for top, bottom in bands]
+        try:
+            best = None
+            for (top, _), future in zip(bands, futures):
+                result = future.result()
+                if result is not None and (best is None or score(result) > score(best[1])):
+                    best = (top, result)
+            return best
+        finally:
+            _cancel(futures)
+
+    def nearest(self, frame: np.ndarray, search: Callable[[np.ndarray, Tuple[float, float]], Optional[Point]],
+                near: Tuple[float, float]) -> Optional[Point]:
+        """The point nearest near found by search(band, band_near) in any band
+
+        Bands are collected closest first, and collection stops once no
+        remaining band can hold a nearer point.
+        """
+        bands = self.bands(frame.shape[0])
+        if len(bands) == 1:
+            return search(frame, near)
+
+        def row_gap(band: Band) -> float:
+            top, bottom = band
+            return max(0.0, top - near[1], near[1] - (bottom - 1))
+
+        bands.sort(key=row_gap)
+        futures = [self._pool.submit(search, frame[top:bottom], (near[0], near[1] - top))
+                   for top, bottom in bands]
+        best, best_distance = None, float('inf')
+        try:
+            for band, future in zip(bands, futures):
+                if row_gap(band) ** 2 >= best_distance:
+                    break
+                hit = future.result()
+                if hit is None:
+                    continue
+                point = (hit[0], hit[1] + band[0])
+                distance = (point[0] - near[0]) ** 2 + (point[1] - near[1]) ** 2
+                if distance < best_distance:
+                    best, best_distance = point, distance
+            return best
+        finally:
+            _cancel(futures)
+
+    def close(self):
+        """Shut the thread pool down"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def _cancel(futures: List[Future]):
+    for future in futures:
+        future.cancel()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Timing helpers: replay timelines, input pacing, polling and deadlines"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Below this many seconds a timed wait is too coarse; spin on the clock instead
+SPIN_THRESHOLD = 0.002
+
+
+def scale_wait(seconds: Optional[float], speed: float = 1.0,
+               min_wait: Optional[float] = None) -> Optional[float]:
+    """Compress a recorded wait by speed, never below min_wait
+
+    The floor only protects the original value; it never makes a wait
+    longer than it was recorded.
+    """
+    if seconds is None:
+        return None
+    scaled = seconds / speed if speed != 1 else seconds
+    if min_wait:
+        scaled = max(scaled, min(min_wait, seconds))
+    return scaled
+
+
+def timeline_offsets(actions: List[Dict[str, Any]], speed: float = 1.0) -> List[float]:
+    """Absolute start offsets for actions, from 'offset' or accumulated 'wait'"""
+    offsets = []
+    recorded = 0.0
+    previous_recorded = 0.0
+    current = 0.0
+    for action in actions:
+        if 'offset' in action:
+            recorded = float(action['offset'])
+        else:
+            # Recorded waits are the gap since the previous action
+            recorded += float(action.get('wait') or 0)
+        gap = scale_wait(max(recorded - previous_recorded, 0.0), speed, action.get('min_wait'))
+        current += gap
+        previous_recorded = recorded
+        offsets.append(current)
+    return offsets
+
+
+class Timeline:
+    """Schedule actions at absolute offsets from a single monotonic start"""
+
+    def __init__(self, stop_event: Optional[threading.Event] = None,
+                 spin_threshold: float = SPIN_THRESHOLD):
+        self.stop_event = stop_event or threading.Event()
+        self.spin_threshold = spin_threshold
+        self.start_time: Optional[float] = None
+        self.drifts: List[float] = []
+
+    def start(self):
+        """Anchor offset zero at the current time"""
+        self.start_time = time.monotonic()
+        self.drifts = []
+
+    def elapsed(self) -> float:
+        """Seconds since the timeline started"""
+        if self.start_time is None:
+            return 0.0
+        return time.monotonic() - self.start_time
+
+    def wait_until(self, offset: float) -> Optional[float]:
+        """Block until offset seconds after start and return the drift
+
+        Sleeps on the stop event for the bulk of the wait and spins for the
+        last few milliseconds. Returns None if the stop event was set.
+        """
+        if self.start_time is None:
+            self.start()
+        target = self.start_time + offset
+
+        remaining = target - time.monotonic()
+        if remaining > self.spin_threshold:
+            if self.stop_event.wait(remaining - self.spin_threshold):
+                return None
+        while time.monotonic() < target:
+            if self.stop_event.is_set():
+                return None
+
+        drift = time.monotonic() - target
+        self.drifts.append(drift)
+        return drift
+
+    def summary(self) -> str:
+        """Human readable drift statistics"""
+        if not self.drifts:
+            return "Timeline drift: no actions scheduled"
+        mean = sum(self.drifts) / len(self.drifts)
+        worst = max(self.drifts)
+        return (f"Timeline drift: mean {mean * 1000:+.2f} ms, "
+                f"max {worst * 1000:+.2f} ms over {len(self.drifts)} actions")
+
+
+class Pacer:
+    """Input pacing applied once per logical action
+
+    action_delay is the pause after an input action that has no explicit
+    'wait'; event_delay is the pause between the low-level events of a
+    composite action such as a drag or hotkey (None keeps each action's
+    own default); window_cooldown is the minimum gap between two input
+    actions sent to the same window.
+    """
+
+    def __init__(self, action_delay: float = 0.0, event_delay: Optional[float] = None,
+                 window_cooldown: float = 0.0):
+        self.action_delay = action_delay
+        self.event_delay = event_delay
+        self.window_cooldown = window_cooldown
+        self._last_input: Dict[Any, float] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "Pacer":
+        """Build from settings.pacing, falling back to default_wait for action_delay"""
+        pacing = settings.get('pacing', {})
+        return cls(
+            action_delay=pacing.get('action_delay', settings.get('default_wait', 0)),
+            event_delay=pacing.get('event_delay'),
+            window_cooldown=pacing.get('window_cooldown', 0),
+        )
+
+    def cooldown_remaining(self, window_key: Any) -> float:
+        """Seconds to wait before the next input to window_key"""
+        if not self.window_cooldown or window_key not in self._last_input:
+            return 0.0
+        elapsed = time.monotonic() - self._last_input[window_key]
+        return max(0.0, self.window_cooldown - elapsed)
+
+    def mark_input(self, window_key: Any):
+        """Record that an input action just finished on window_key"""
+        self._last_input[window_key] = time.monotonic()
+
+
+POLL_STRATEGIES = ('fixed', 'backoff', 'adaptive')
+
+
+class ProbeBudgetExceeded(RuntimeError):
+    """Raised when a run has used up its condition probes"""
+
+    def __init__(self, budget: int):
+        super().__init__(f"Probe budget exceeded ({budget} probes)")
+        self.budget = budget
+
+
+class Poller:
+    """How often waits probe their condition, and how many probes a run may use
+
+    'fixed' probes every interval. 'backoff' multiplies the interval by
+    factor after every miss, up to max_interval. 'adaptive' backs off
+    the same way while what the probe sees stays the same and drops
+    back to interval as soon as it changes, so a busy screen is watched
+    closely and a static one costs a few probes a second. budget caps
+    the probes of the whole run (None for no limit).
+    """
+
+    def __init__(self, strategy: str = 'fixed', interval: float = 0.01,
+                 max_interval: float = 0.5, factor: float = 2.0,
+                 budget: Optional[int] = None):
+        if strategy not in POLL_STRATEGIES:
+            raise ValueError(f"Unknown poll strategy '{strategy}' "
+                             f"(expected one of {', '.join(POLL_STRATEGIES)})")
+        self.strategy = strategy
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.factor = factor
+        self.budget = budget
+        self.probes = 0
+        self.waits = 0
+        self.max_probes = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "Poller":
+        """Build from settings.poll (strategy, interval, max_interval, factor, budget)"""
+        poll = settings.get('poll', {})
+        return cls(
+            strategy=poll.get('strategy', 'fixed'),
+            interval=poll.get('interval', 0.01),
+            max_interval=poll.get('max_interval', 0.5),
+            factor=poll.get('factor', 2.0),
+            budget=poll.get('budget'),
+        )
+
+    def count_probe(self):
+        """Charge one probe to the run, raising once the budget is spent"""
+        if self.budget is not None and self.probes >= self.budget:
+            raise ProbeBudgetExceeded(self.budget)
+        self.probes += 1
+
+    def next_interval(self, interval: float, changed: bool = False) -> float:
+        """The pause after a miss that followed a pause of interval"""
+        if self.strategy == 'fixed' or (self.strategy == 'adaptive' and changed):
+            return self.interval
+        return min(interval * self.factor, self.max_interval)
+
+    def record_wait(self, probes: int):
+        """Add the probes of one finished wait to the statistics"""
+        self.waits += 1
+        self.max_probes = max(self.max_probes, probes)
+
+    def summary(self) -> str:
+        """Human readable probe statistics"""
+        budget = f" of {self.budget}" if self.budget is not None else ""
+        return (f"Polling ({self.strategy}): {self.probes}{budget} probes over {self.waits} waits, "
+                f"at most {self.max_probes} in one wait")
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a run or action overruns its time budget"""
+
+    def __init__(self, deadline: "Deadline"):
+        super().__init__(f"Deadline exceeded: {deadline.label} ({deadline.budget:g} seconds)")
+        self.deadline = deadline
+
+
+class Deadline:
+    """A hard time budget on the monotonic clock
+
+    Child deadlines never outlive their parent, so a per-action timeout
+    inside a loop is still bounded by the run's max_runtime.
+    """
+
+    def __init__(self, seconds: Optional[float], label: str = 'run',
+                 parent: Optional["Deadline"] = None):
+        self.label = label
+        self.budget = float('inf') if seconds is None else float(seconds)
+        self.parent = parent
+        expires_at = time.monotonic() + self.budget
+        if parent is not None and parent.expires_at < expires_at:
+            expires_at = parent.expires_at
+        self.expires_at = expires_at
+
+    def child(self, seconds: Optional[float], label: str) -> "Deadline":
+        """A nested budget that also respects this one"""
+        return Deadline(seconds, label, parent=self)
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def exceeded(self) -> "Deadline":
+        """The outermost expired deadline in the chain (the one to report)"""
+        expired = self
+        parent = self.parent
+        while parent is not None:
+            if parent.expired():
+                expired = parent
+            parent = parent.parent
+        return expired
+
+    def check(self):
+        """Raise DeadlineExceeded if the budget has run out"""
+        if self.expired():
+            raise DeadlineExceeded(self.exceeded())
+
+
+class Watchdog:
+    """Background thread that fires a callback when a watched deadline expires
+
+    Cooperative checks in the runner raise DeadlineExceeded; the watchdog
+    covers steps blocked inside a single call (a long drag or typewrite)
+    so the failure is captured at the moment the budget runs out.
+    """
+
+    def __init__(self, on_expire: Callable[[Deadline], None], interval: float = 0.05):
+        self.on_expire = on_expire
+        self.interval = interval
+        self._watched: List[Deadline] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='mactoro-watchdog', daemon=True)
+
+    def start(self) -> "Watchdog":
+        self._thread.start()
+        return self
+
+    def watch(self, deadline: Deadline):
+        with self._lock:
+            self._watched.append(deadline)
+
+    def unwatch(self, deadline: Deadline):
+        with self._lock:
+            if deadline in self._watched:
+                self._watched.remove(deadline)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                expired = [deadline for deadline in self._watched if deadline.expired()]
+                for deadline in expired:
+                    self._watched.remove(deadline)
+            for deadline in expired:
+                self.on_expire(deadline.exceeded())
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
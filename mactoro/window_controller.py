@@ -11,7 +11,37 @@ import AppKit
 from typing import Dict, List, Any, Optional, Tuple
 import threading
 import signal
+from collections import deque
+import numpy as np
+from PIL import Image
 from pynput import keyboard
+from .color_search import (
+    SCAN_ORDERS, Palette, check_blob_selection, check_downsample, color_mask, find_blobs, first_hit,
+    mask_hits, refine_blob, refine_hit, select_blob
+)
+from .execution_plan import (
+    CONDITION_TYPES, ChildCompiler, ExecutionPlan, PlanError, PlanStep, StepCompiler, compile_actions,
+    compile_plan, stored_names
+)
+from .frame_diff import (
+    DEFAULT_CHANGE_THRESHOLD, DIFF_METRICS, DirtyTracker, IncrementalMap, fingerprint,
+    fingerprint_difference
+)
+from .navigation import (
+    DEFAULT_HOP_TIMEOUT, NavigationError, ScreenGraph, Transition, check_transition
+)
+from .run_log import DEBUG, INFO, LEVEL_NAMES, RunLogger, TraceWriter
+from .screen_capture import (
+    CaptureBackend, CaptureError, CaptureService, WindowCapture, capture_from_settings,
+    create_capture, window_bounds_region
+)
+from .screen_catalog import DEFAULT_MAX_DISTANCE, DEFAULT_MIN_MARGIN, ScreenCatalog, best_match
+from .template_match import Match, Template, match_template
+from .template_store import TemplateStore
+from .tiled_search import TiledSearch
+from .timing import (
+    Deadline, DeadlineExceeded, Pacer, Poller, Timeline, Watchdog, scale_wait, timeline_offsets
+)
 # Remove coordinate_helper import - use lazy import when needed
 
 pyautogui.FAILSAFE = True
@@ -19,31 +49,102 @@ pyautogui.PAUSE = 0
 # macOS specific settings for better drag support
 pyautogui.DARWIN_CATCH_UP_TIME = 0.01
 
+# Number of recent actions kept in memory for error context
+DEFAULT_HISTORY_SIZE = 100
+
+# Click-like action types: (log label, pyautogui function)
+CLICK_ACTIONS = {
+    'click': ('Click', 'click'),
+    'double_click': ('Double click', 'doubleClick'),
+    'right_click': ('Right click', 'rightClick'),
+}
+
 class WindowController:
     def __init__(self):
-        self.running = True
+        # Set when the run is interrupted; every wait in the runner blocks on it
+        self._stop_event = threading.Event()
         self.recorded_coordinates = {}
         self.current_window = None
         self.debug = False
         self.screenshot_on_error = True
-        self.action_history = []
+        # Recent actions only; the full history goes to the trace file if enabled
+        self.action_history = deque(maxlen=DEFAULT_HISTORY_SIZE)
+        self.executed_count = 0
+        # Step results saved with 'store_as', for later clicks and conditions
+        self.results: Dict[str, Any] = {}
+        self._declared_results = set()
+        self.trace: Optional[TraceWriter] = None
+        # Synchronous until run_automation configures a buffered logger
+        self.log = RunLogger()
+        self._loop_depth = 0
+        # Deadline enforcement for scheduled runs (see run_automation)
+        self.watchdog: Optional[Watchdog] = None
+        self._expired_deadline: Optional[Deadline] = None
+        self._deadline_lock = threading.Lock()
+        self._reported_error: Optional[BaseException] = None
         self.keyboard_listener = None
         self.target_window = None
         self.window_focused = False
+        self.pacer = Pacer()
+        # Probe interval strategy and budget for every polling wait
+        self.poller = Poller()
+        # Pixel checks read frames from here instead of pyautogui.screenshot
+        self.capture: CaptureBackend = create_capture()
+        # Decoded templates and pyramids shared by every image action
+        self.templates = TemplateStore()
+        # Thread pool that color and image searches split large frames across
+        self.tiles = TiledSearch()
+        # Named reference screens for classify_screen
+        self.screens = ScreenCatalog()
+        # Transitions between those screens, for goto
+        self.navigation = ScreenGraph()
+        # Replay speed multiplier for recorded waits and drag durations
+        self.speed = 1.0
         
         signal.signal(signal.SIGINT, self._signal_handler)
     
+    @property
+    def running(self) -> bool:
+        return not self._stop_event.is_set()
+    
+    @running.setter
+    def running(self, value: bool):
+        if value:
+            self._stop_event.clear()
+        else:
+            self._stop_event.set()
+    
+    def stop(self):
+        """Interrupt the run, waking any wait in progress"""
+        self._stop_event.set()
+    
+    def sleep(self, seconds: float, deadline: Optional[Deadline] = None) -> bool:
+        """Sleep unless interrupted; returns False if the run was stopped
+
+        Raises DeadlineExceeded if deadline runs out before the sleep ends.
+        """
+        cut_short = deadline is not None and deadline.remaining() < seconds
+        if cut_short:
+            seconds = max(deadline.remaining(), 0)
+        if seconds > 0 and self._stop_event.wait(seconds):
+            if deadline is not None:
+                deadline.check()
+            return False
+        if cut_short:
+            raise DeadlineExceeded(deadline.exceeded())
+        return self.running
+    
     def _signal_handler(self, signum, frame):
-        print("\n\nInterrupted")
-        self.running = False
+        self.log.warning("\n\nInterrupted")
+        self.stop()
         sys.exit(0)
     
     def _on_key_press(self, key):
         """Keyboard event handler"""
         try:
             if key == keyboard.Key.esc:
-                print("\n\nESC key pressed - interrupting process")
-                self.running = False
+                self.log.warning("\n\nESC key pressed - interrupting process")
+                self.stop()
                 return False  # Stop listener
         except AttributeError:
             pass
@@ -117,27 +218,31 @@ class WindowController:
             filename = f"screenshot_{timestamp}.png"
         
         if window and window.get('bounds'):
-            # Take screenshot of specific window
-            bounds = window['bounds']
-            x = int(bounds['x'])
-            y = int(bounds['y']) 
-            width = int(bounds['width'])
-            height = int(bounds['height'])
-            
-            # Take screenshot of the window region
-            screenshot = pyautogui.screenshot(region=(x, y, width, height))
-            screenshot.save(filename)
-            if self.debug:
-                print(f"Window screenshot saved: {filename} (region: {x},{y} {width}x{height})")
+            region = window_bounds_region(window)
+            try:
+                # Only the window's own pixels, even when something covers it
+                frame = self._window_capture(window).grab()
+                Image.fromarray(np.ascontiguousarray(frame)).save(filename)
+            except CaptureError as e:
+                self.log.debug(f"Window capture failed ({e}); capturing the screen region instead")
+                pyautogui.screenshot(region=region).save(filename)
+            x, y, width, height = region
+            self.log.debug(f"Window screenshot saved: {filename} (region: {x},{y} {width}x{height})")
         else:
             # Take full screen screenshot if no window specified
             screenshot = pyautogui.screenshot()
             screenshot.save(filename)
-            if self.debug:
-                print(f"Full screen screenshot saved: {filename}")
+            self.log.debug(f"Full screen screenshot saved: {filename}")
         
         return filename
     
+    def _window_capture(self, window: Dict[str, Any]) -> CaptureBackend:
+        """A backend that captures only window, reusing the run's if it already does"""
+        backend = getattr(self.capture, 'backend', self.capture)
+        if getattr(backend, 'window_id', None) == window['window_id']:
+            return backend
+        return WindowCapture(window['window_id'], window_bounds_region(window))
+    
     def focus_window(self, window: Dict[str, Any]) -> bool:
         """Move focus to specified window"""
         try:
@@ -149,8 +254,7 @@ class WindowController:
                 # Don't wait here as JSON's default_wait will be used
                 return True
         except Exception as e:
-            if self.debug:
-                print(f"Window focus error: {e}")
+            self.log.debug(f"Window focus error: {e}")
         return False
     
     def load_config(self, config_path: str) -> Dict[str, Any]:
@@ -194,371 +298,1227 @@ class WindowController:
         
         return x, y
     
-    def wait_for_condition(self, condition: Dict[str, Any], timeout: float = 10) -> bool:
-        """Wait until condition is met"""
-        start_time = time.time()
+    def probe_condition(self, condition: Dict[str, Any], started_at: Optional[float] = None) -> bool:
+        """Evaluate a condition once against a single capture"""
+        return self._counted_probe(condition, started_at)[0]
+    
+    def _counted_probe(self, condition: Dict[str, Any],
+                       started_at: Optional[float] = None) -> Tuple[bool, Any]:
+        """_probe, charged to the run's probe budget"""
+        self.poller.count_probe()
+        return self._probe(condition, started_at)
+    
+    def _probe(self, condition: Dict[str, Any], started_at: Optional[float] = None) -> Tuple[bool, Any]:
+        """Evaluate a condition and report what it saw, for adaptive polling"""
         condition_type = condition['type']
         
-        while time.time() - start_time < timeout:
-            if not self.running:
-                return False
-            
-            if condition_type == 'color_match':
-                x, y = self.resolve_coordinates(condition)
-                expected_color = condition['color']
-                tolerance = condition.get('tolerance', 10)
-                
-                screenshot = pyautogui.screenshot(region=(x, y, 1, 1))
-                actual_color = list(screenshot.getpixel((0, 0)))
-                
-                if all(abs(a - e) <= tolerance for a, e in zip(actual_color, expected_color)):
-                    return True
+        if condition_type == 'color_match':
+            x, y = self.resolve_coordinates(condition)
+            expected_color = condition['color']
+            tolerance = condition.get('tolerance', 10)
             
-            elif condition_type == 'window_exists':
-                window_name = condition['window_name']
-                if self.find_window(window_name):
-                    return True
+            actual_color = self.capture.pixel(x, y)
             
-            elif condition_type == 'image_exists':
-                pass
-            
-            elif condition_type == 'time_elapsed':
-                elapsed = condition['seconds']
-                if time.time() - start_time >= elapsed:
-                    return True
-            
-            time.sleep(0.01)  # Shorter polling interval
+            met = all(abs(a - e) <= tolerance for a, e in zip(actual_color, expected_color))
+            return met, actual_color
         
-        return False
-    
-    def execute_action(self, action: Dict[str, Any]) -> Any:
-        """Execute a single action"""
-        if not self.running:
-            return None
+        elif condition_type == 'window_exists':
+            window = self.find_window(condition['window_name'])
+            return window is not None, window and window.get('bounds')
         
-        action_type = action['type']
+        elif condition_type == 'image_exists':
+            if 'template' not in condition:
+                condition = self._compile_condition(condition)
+            result = self.find_image(condition)
+            return result is not None, result and result['point']
         
-        # Get timestamp
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        elif condition_type == 'time_elapsed':
+            if started_at is None:
+                return condition['seconds'] <= 0, None
+            return time.time() - started_at >= condition['seconds'], None
         
-        if self.debug:
-            print(f"Executing: {action_type} - {action}")
+        elif condition_type in ('all_of', 'any_of'):
+            if 'points' not in condition:
+                condition = self._compile_condition(condition)
+            samples = self.capture.sample_pixels(condition['points']).astype(np.int16)
+            matches = (np.abs(samples - condition['colors']) <= condition['tolerances']).all(axis=1)
+            met = matches.all() if condition_type == 'all_of' else matches.any()
+            return bool(met), samples.tobytes()
         
-        result = None
+        elif condition_type == 'stored_result':
+            result = self.results.get(condition['name'])
+            if 'label' in condition:
+                return isinstance(result, dict) and result.get('matched') == condition['label'], None
+            return bool(result), None
+        
+        elif condition_type == 'screen':
+            result = self.classify_screen(self._watch_region({}), max_distance=condition.get(
+                'max_distance', DEFAULT_MAX_DISTANCE))
+            return result['matched'] == condition['name'], result['distance']
+        
+        return False, None
+    
+    def wait_for_condition(self, condition: Dict[str, Any], timeout: float = 10,
+                           deadline: Optional[Deadline] = None) -> bool:
+        """Wait until condition is met, probing as often as self.poller allows"""
+        start_time = time.time()
+        interval = self.poller.interval
+        previous = None
+        probes = 0
+        met = False
         
         try:
-            if action_type == 'click':
-                x, y = self.resolve_coordinates(action)
-                pyautogui.click(x, y)
-                # Build action info
-                action_info = f"Click: ({x}, {y})"
-                if 'comment' in action:
-                    action_info += f" - {action['comment']}"
-            
-            elif action_type == 'double_click':
-                x, y = self.resolve_coordinates(action)
-                pyautogui.doubleClick(x, y)
-                # Build action info
-                action_info = f"Double click: ({x}, {y})"
-                if 'comment' in action:
-                    action_info += f" - {action['comment']}"
-            
-            elif action_type == 'right_click':
-                x, y = self.resolve_coordinates(action)
-                pyautogui.rightClick(x, y)
-                # Build action info
-                action_info = f"Right click: ({x}, {y})"
-                if 'comment' in action:
-                    action_info += f" - {action['comment']}"
-            
-            elif action_type == 'type':
-                text = action['text']
-                interval = action.get('interval', 0)
-                pyautogui.typewrite(text, interval=interval)
-            
-            elif action_type == 'hotkey':
-                keys = action['keys']
-                pyautogui.hotkey(*keys)
-            
-            elif action_type == 'drag':
-                # For drag operations, we need to handle start and end coordinates separately
-                # Create temporary action objects for coordinate resolution
-                start_action = {'x': action.get('start_x', 0), 'y': action.get('start_y', 0)}
-                if action.get('relative_to') == 'window':
-                    start_action['relative_to'] = 'window'
-                
-                start_x, start_y = self.resolve_coordinates(start_action)
-                
-                # Resolve end coordinates
-                end_action = {'x': action.get('end_x', start_x + 100), 'y': action.get('end_y', start_y)}
-                if action.get('relative_to') == 'window':
-                    end_action['relative_to'] = 'window'
-                    
-                end_x, end_y = self.resolve_coordinates(end_action)
-                
-                duration = action.get('duration', 1.0)
-                button = action.get('button', 'left')  # Default to left button
-                comment = action.get('comment', '')
-                
-                action_info = f"Drag from ({start_x:.0f}, {start_y:.0f}) to ({end_x:.0f}, {end_y:.0f})"
-                if comment:
-                    action_info += f" - {comment}"
-                    
-                print(f"[{timestamp}] {action_info} (wait: {action.get('wait', 0)} seconds)")
-                
-                if self.debug:
-                    print(f"[DEBUG] Drag: ({start_x}, {start_y}) → ({end_x}, {end_y}), {duration}s")
-                    
-                # Quick validation only
-                if self.target_window and action.get('window_relative') and action.get('start_y', start_y) < 50:
-                    print("  ⚠️  WARNING: Drag near window top!")
-                
-                # Ensure window is active before drag (only if needed)
-                if self.current_window and not self.window_focused:
-                    self.focus_window(self.current_window)
-                    time.sleep(0.1)  # Minimal delay for focus
-                    self.window_focused = True
-                
-                # Scale delays based on duration
-                move_duration = min(0.1, duration * 0.1)  # 10% of duration, max 0.1s
-                delay = min(0.05, duration * 0.05)  # 5% of duration, max 0.05s
-                
-                # Move to start position
-                pyautogui.moveTo(start_x, start_y, duration=move_duration)
-                time.sleep(delay)
-                
-                # Click to ensure focus on element
-                pyautogui.click(start_x, start_y, button=button)
-                time.sleep(delay)
+            while time.time() - start_time < timeout:
+                if deadline is not None:
+                    deadline.check()
+                if not self.running:
+                    break
                 
-                # Perform drag
-                try:
-                    pyautogui.dragTo(end_x, end_y, duration=duration, button=button)
-                except Exception as e:
-                    print(f"  dragTo failed: {e}, using fallback...")
-                    pyautogui.mouseDown(start_x, start_y, button=button)
-                    time.sleep(delay)
-                    pyautogui.moveTo(end_x, end_y, duration=duration)
-                    time.sleep(delay)
-                    pyautogui.mouseUp(end_x, end_y, button=button)
+                probes += 1
+                met, observed = self._counted_probe(condition, start_time)
+                if met:
+                    break
                 
-                print(f"  Drag completed")
-            
-            elif action_type == 'scroll':
-                clicks = action.get('clicks', 1)
-                x, y = self.resolve_coordinates(action) if 'x' in action else pyautogui.position()
+                if probes > 1:
+                    interval = self.poller.next_interval(interval, observed != previous)
+                previous = observed
+                remaining = timeout - (time.time() - start_time)
+                if remaining > 0:
+                    self.sleep(min(interval, remaining), deadline)
+        finally:
+            self.poller.record_wait(probes)
+            if self.log.is_enabled(DEBUG):
+                self.log.debug(f"{condition['type']} {'met' if met else 'not met'} "
+                               f"after {probes} probes in {time.time() - start_time:.2f}s")
+        
+        return met
+    
+    def check_condition(self, condition: Dict[str, Any], started_at: Optional[float] = None,
+                        deadline: Optional[Deadline] = None) -> bool:
+        """Probe a condition once, or poll it when it sets poll_timeout"""
+        poll_timeout = condition.get('poll_timeout')
+        if poll_timeout:
+            return self.wait_for_condition(condition, poll_timeout, deadline)
+        return self.probe_condition(condition, started_at)
+    
+    def _step_compilers(self) -> Dict[str, StepCompiler]:
+        """Map each action type to the method that compiles it"""
+        return {
+            'click': self._compile_click,
+            'double_click': self._compile_click,
+            'right_click': self._compile_click,
+            'type': self._compile_type,
+            'hotkey': self._compile_hotkey,
+            'drag': self._compile_drag,
+            'scroll': self._compile_scroll,
+            'wait': self._compile_wait,
+            'wait_for_color': self._compile_wait_for_color,
+            'wait_for_window': self._compile_wait_for_window,
+            'wait_for_change': self._compile_wait_for_change,
+            'wait_for_stable': self._compile_wait_for_change,
+            'screenshot': self._compile_screenshot,
+            'log': self._compile_log,
+            'loop': self._compile_loop,
+            'loop_until': self._compile_loop_until,
+            'conditional': self._compile_conditional,
+            'exit_if': self._compile_exit_if,
+            'click_on_color': self._compile_click_on_color,
+            'find_colors': self._compile_find_colors,
+            'click_on_any_color': self._compile_find_colors,
+            'click_on_image': self._compile_click_on_image,
+            'classify_screen': self._compile_classify_screen,
+            'goto': self._compile_goto,
+        }
+    
+    def compile_plan(self, actions: List[Dict[str, Any]]) -> ExecutionPlan:
+        """Validate actions and compile them into an execution plan"""
+        # Names saved with 'store_as' may be clicked by later actions
+        self._declared_results = stored_names(actions)
+        return compile_plan(actions, self._step_compilers(), speed=self.speed)
+    
+    def apply_settings(self, settings: Dict[str, Any], speed: Optional[float] = None):
+        """Set up replay speed, template cache, polling and search threads from settings
+        
+        Raises ValueError for settings a run cannot use; dry runs call this
+        too, so they reject exactly what a real run rejects.
+        """
+        # Command line speed takes precedence over the config file
+        speed = speed if speed is not None else settings.get('speed', 1.0)
+        if not isinstance(speed, (int, float)) or speed <= 0:
+            raise ValueError(f"speed must be a positive number, got {speed!r}")
+        self.speed = speed
+        # Compiling preloads every template the config references
+        self.templates = TemplateStore.from_settings(settings)
+        self.poller = Poller.from_settings(settings)
+        self.tiles.close()
+        self.tiles = TiledSearch.from_settings(settings)
+    
+    def compile_config(self, config: Dict[str, Any]) -> ExecutionPlan:
+        """Catalogue the configuration's screens, then compile its transitions and actions"""
+        self.screens = ScreenCatalog.from_config(config.get('screens', {}))
+        for name, other, distance in self.screens.close_pairs():
+            self.log.warning(f"Screens '{name}' and '{other}' are only {distance} bits apart; "
+                             f"give them a 'region' that tells them apart")
+        transitions = config.get('transitions', [])
+        actions = config.get('actions', [])
+        # Transitions and top-level actions may click each other's stored results
+        self._declared_results = stored_names(actions) | stored_names(transitions)
+        self._compile_transitions(transitions)
+        return compile_plan(actions, self._step_compilers(), speed=self.speed)
+    
+    def compile_navigation(self, transitions: List[Dict[str, Any]]) -> ScreenGraph:
+        """Validate the configuration's transitions and compile their actions"""
+        self._declared_results = stored_names(transitions)
+        return self._compile_transitions(transitions)
+    
+    def _compile_transitions(self, transitions: List[Dict[str, Any]]) -> ScreenGraph:
+        compilers = self._step_compilers()
+        edges = []
+        for i, transition in enumerate(transitions):
+            path = f"transitions[{i}]"
+            try:
+                check_transition(transition, self.screens, path)
+            except ValueError as e:
+                raise PlanError(str(e)) from e
+            steps = compile_actions(transition['actions'], compilers, f"{path}.actions", self.speed)
+            edges.append(Transition(transition['from'], transition['to'], steps,
+                                    transition.get('timeout', DEFAULT_HOP_TIMEOUT), path))
+        self.navigation = ScreenGraph(edges)
+        return self.navigation
+    
+    def _compile_condition(self, condition: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a condition and resolve its coordinates up front"""
+        condition_type = condition.get('type')
+        if condition_type not in CONDITION_TYPES:
+            raise ValueError(f"Unknown condition type '{condition_type}'")
+        
+        if condition_type == 'color_match':
+            x, y = self.resolve_coordinates(condition)
+            compiled = {
+                'type': 'color_match',
+                'x': x,
+                'y': y,
+                'color': condition['color'],
+                'tolerance': condition.get('tolerance', 10),
+            }
+        elif condition_type == 'window_exists':
+            compiled = {'type': 'window_exists', 'window_name': condition['window_name']}
+        elif condition_type == 'time_elapsed':
+            compiled = {'type': 'time_elapsed', 'seconds': condition['seconds']}
+        elif condition_type == 'image_exists':
+            compiled = self._compile_image_search(condition)
+            compiled['type'] = 'image_exists'
+        elif condition_type in ('all_of', 'any_of'):
+            compiled = self._compile_pixel_set(condition)
+        elif condition_type == 'stored_result':
+            compiled = {'type': 'stored_result', 'name': condition['name']}
+            if 'label' in condition:
+                compiled['label'] = condition['label']
+        elif condition_type == 'screen':
+            if condition['name'] not in self.screens:
+                raise ValueError(f"Unknown screen '{condition['name']}'")
+            compiled = {'type': 'screen', 'name': condition['name'],
+                        'max_distance': condition.get('max_distance', DEFAULT_MAX_DISTANCE)}
+        else:
+            compiled = dict(condition)
+        
+        # Conditions are probed once unless they explicitly ask to block
+        if condition.get('poll_timeout'):
+            compiled['poll_timeout'] = condition['poll_timeout']
+        return compiled
+    
+    def _compile_pixel_set(self, condition: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve every probe of an all_of/any_of condition into arrays"""
+        pixels = condition['pixels']
+        if not pixels:
+            raise ValueError(f"'{condition['type']}' needs at least one pixel")
+        default_tolerance = condition.get('tolerance', 10)
+        points = [self.resolve_coordinates(pixel) for pixel in pixels]
+        return {
+            'type': condition['type'],
+            'points': np.array(points, dtype=np.int64),
+            'colors': np.array([pixel['color'][:3] for pixel in pixels], dtype=np.int16),
+            'tolerances': np.array([[pixel.get('tolerance', default_tolerance)] for pixel in pixels],
+                                   dtype=np.int16),
+        }
+    
+    def _compile_click(self, step: PlanStep, compile_children: ChildCompiler):
+        label, function_name = CLICK_ACTIONS[step.action_type]
+        name = step.action.get('coordinate')
+        if name in self._declared_results and name not in self.recorded_coordinates:
+            # A point found earlier in the run; looked up when the click happens
+            step.run = lambda deadline: getattr(pyautogui, function_name)(*self._stored_point(name))
+            step.message = f"{label}: {name}"
+        else:
+            x, y = self.resolve_coordinates(step.action)
+            step.run = lambda deadline: getattr(pyautogui, function_name)(x, y)
+            step.message = f"{label}: ({x}, {y})"
+        step.sends_input = True
+        if 'comment' in step.action:
+            step.message += f" - {step.action['comment']}"
+    
+    def _stored_point(self, name: str) -> Tuple[int, int]:
+        """Screen point of a result saved with store_as"""
+        result = self.results.get(name)
+        if isinstance(result, dict):
+            result = result.get('point')
+        if not result:
+            raise ValueError(f"Stored result '{name}' has no match")
+        return int(result[0]), int(result[1])
+    
+    def _compile_type(self, step: PlanStep, compile_children: ChildCompiler):
+        text = step.action['text']
+        interval = step.action.get('interval', 0)
+        step.run = lambda deadline: pyautogui.typewrite(text, interval=interval)
+        step.sends_input = True
+    
+    def _compile_hotkey(self, step: PlanStep, compile_children: ChildCompiler):
+        keys = list(step.action['keys'])
+        
+        def hotkey(deadline):
+            # Without an event delay pyautogui keeps its own spacing between keys
+            if self.pacer.event_delay is None:
+                pyautogui.hotkey(*keys)
+            else:
+                pyautogui.hotkey(*keys, interval=self.pacer.event_delay)
+        step.run = hotkey
+        step.sends_input = True
+    
+    def _compile_drag(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        # Resolve start and end through temporary actions so both honour relative_to
+        start_action = {'x': action.get('start_x', 0), 'y': action.get('start_y', 0)}
+        if action.get('relative_to') == 'window':
+            start_action['relative_to'] = 'window'
+        start_x, start_y = self.resolve_coordinates(start_action)
+        
+        end_action = {'x': action.get('end_x', start_x + 100), 'y': action.get('end_y', start_y)}
+        if action.get('relative_to') == 'window':
+            end_action['relative_to'] = 'window'
+        end_x, end_y = self.resolve_coordinates(end_action)
+        
+        duration = scale_wait(action.get('duration', 1.0), self.speed)
+        button = action.get('button', 'left')  # Default to left button
+        near_top = bool(action.get('window_relative')) and action.get('start_y', start_y) < 50
+        
+        step.run = lambda deadline: self._drag(start_x, start_y, end_x, end_y, duration, button,
+                                               near_top, deadline)
+        step.sends_input = True
+        step.message = f"Drag from ({start_x:.0f}, {start_y:.0f}) to ({end_x:.0f}, {end_y:.0f})"
+        if action.get('comment'):
+            step.message += f" - {action['comment']}"
+    
+    def _drag(self, start_x: int, start_y: int, end_x: int, end_y: int,
+              duration: float, button: str, near_top: bool = False,
+              deadline: Optional[Deadline] = None):
+        """Drag between two absolute screen positions"""
+        if self.log.is_enabled(DEBUG):
+            self.log.debug(f"[DEBUG] Drag: ({start_x}, {start_y}) → ({end_x}, {end_y}), {duration}s")
+        
+        # Quick validation only
+        if self.target_window and near_top:
+            self.log.warning("  ⚠️  WARNING: Drag near window top!")
+        
+        # Ensure window is active before drag (only if needed)
+        if self.current_window and not self.window_focused:
+            self.focus_window(self.current_window)
+            self.sleep(0.1, deadline)  # Minimal delay for focus
+            self.window_focused = True
+        
+        # Scale delays based on duration
+        move_duration = min(0.1, duration * 0.1)  # 10% of duration, max 0.1s
+        delay = min(0.05, duration * 0.05)  # 5% of duration, max 0.05s
+        if self.pacer.event_delay is not None:
+            delay = self.pacer.event_delay
+        
+        # Move to start position
+        pyautogui.moveTo(start_x, start_y, duration=move_duration)
+        if not self.sleep(delay, deadline):
+            return
+        
+        # Click to ensure focus on element
+        pyautogui.click(start_x, start_y, button=button)
+        if not self.sleep(delay, deadline):
+            return
+        
+        # Perform drag
+        try:
+            pyautogui.dragTo(end_x, end_y, duration=duration, button=button)
+        except Exception as e:
+            self.log.warning(f"  dragTo failed: {e}, using fallback...")
+            pyautogui.mouseDown(start_x, start_y, button=button)
+            self.sleep(delay)
+            pyautogui.moveTo(end_x, end_y, duration=duration)
+            # Always release the button, even when interrupted
+            self.sleep(delay)
+            pyautogui.mouseUp(end_x, end_y, button=button)
+    
+    def _compile_scroll(self, step: PlanStep, compile_children: ChildCompiler):
+        clicks = step.action.get('clicks', 1)
+        if 'x' in step.action:
+            x, y = self.resolve_coordinates(step.action)
+            step.run = lambda deadline: pyautogui.scroll(clicks, x=x, y=y)
+        else:
+            def scroll_at_pointer(deadline):
+                x, y = pyautogui.position()
                 pyautogui.scroll(clicks, x=x, y=y)
+            step.run = scroll_at_pointer
+        step.sends_input = True
+    
+    def _compile_wait(self, step: PlanStep, compile_children: ChildCompiler):
+        seconds = scale_wait(step.action.get('seconds', 1), self.speed, step.action.get('min_wait'))
+        step.run = lambda deadline: self.sleep(seconds, deadline)
+        step.message = f"Wait {seconds} seconds"
+        if 'comment' in step.action:
+            step.message += f" - {step.action['comment']}"
+    
+    def _compile_wait_for_color(self, step: PlanStep, compile_children: ChildCompiler):
+        condition = self._compile_condition(dict(step.action, type='color_match'))
+        timeout = step.action.get('timeout', 10)
+        step.run = lambda deadline: self.wait_for_condition(condition, timeout, deadline)
+    
+    def _compile_wait_for_window(self, step: PlanStep, compile_children: ChildCompiler):
+        condition = {'type': 'window_exists', 'window_name': step.action['window_name']}
+        timeout = step.action.get('timeout', 10)
+        step.run = lambda deadline: self.wait_for_condition(condition, timeout, deadline)
+    
+    def _watch_region(self, action: Dict[str, Any]) -> Optional[Tuple[int, int, int, int]]:
+        """The action's region, else the target window, else the whole screen"""
+        if action.get('region'):
+            return tuple(action['region'])
+        if self.current_window and self.current_window.get('bounds'):
+            bounds = self.current_window['bounds']
+            return bounds['x'], bounds['y'], bounds['width'], bounds['height']
+        return None
+    
+    def _compile_wait_for_change(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        region = self._watch_region(action)
+        timeout = action.get('timeout', 10)
+        threshold = action.get('threshold', DEFAULT_CHANGE_THRESHOLD)
+        interval = action.get('interval', 0.05)
+        metric = action.get('metric', 'mean')
+        if metric not in DIFF_METRICS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        
+        if step.action_type == 'wait_for_change':
+            step.run = lambda deadline: self.wait_for_change(
+                region, timeout, threshold, interval, metric, deadline)
+        else:
+            stable_for = action.get('stable_ms', 500) / 1000
+            step.run = lambda deadline: self.wait_for_stable(
+                region, stable_for, timeout, threshold, interval, metric, deadline)
+    
+    def wait_for_change(self, region: Optional[Tuple[int, int, int, int]], timeout: float = 10,
+                        threshold: float = DEFAULT_CHANGE_THRESHOLD, interval: float = 0.05,
+                        metric: str = 'mean', deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Wait until region differs from how it looked when the wait began"""
+        started = time.monotonic()
+        reference = fingerprint(self.capture.grab(region))
+        while time.monotonic() - started < timeout:
+            if not self.sleep(interval, deadline):
+                break
+            self.poller.count_probe()
+            current = fingerprint(self.capture.grab(region))
+            if fingerprint_difference(reference, current, metric) > threshold:
+                return {'changed': True, 'elapsed': round(time.monotonic() - started, 3)}
+        return {'changed': False, 'elapsed': round(time.monotonic() - started, 3)}
+    
+    def wait_for_stable(self, region: Optional[Tuple[int, int, int, int]], stable_for: float = 0.5,
+                        timeout: float = 10, threshold: float = DEFAULT_CHANGE_THRESHOLD,
+                        interval: float = 0.05, metric: str = 'mean',
+                        deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Wait until region has not changed for stable_for seconds
+        
+        Frames are compared with the first frame of the current quiet period
+        rather than with their predecessor, so a slow fade still counts as
+        change.
+        """
+        started = time.monotonic()
+        anchor = fingerprint(self.capture.grab(region))
+        quiet_since = started
+        while True:
+            now = time.monotonic()
+            if now - quiet_since >= stable_for:
+                return {'stable': True, 'elapsed': round(now - started, 3)}
+            if now - started >= timeout or not self.sleep(interval, deadline):
+                return {'stable': False, 'elapsed': round(now - started, 3)}
             
-            elif action_type == 'wait':
-                seconds = action.get('seconds', 1)
-                action_info = f"Wait {seconds} seconds"
-                if 'comment' in action:
-                    action_info += f" - {action['comment']}"
-                time.sleep(seconds)
-            
-            elif action_type == 'wait_for_color':
-                timeout = action.get('timeout', 10)
-                self.wait_for_condition(action, timeout)
-            
-            elif action_type == 'wait_for_window':
-                window_name = action['window_name']
-                timeout = action.get('timeout', 10)
-                self.wait_for_condition({'type': 'window_exists', 'window_name': window_name}, timeout)
-            
-            elif action_type == 'screenshot':
-                filename = action.get('filename', f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-                screenshot = pyautogui.screenshot()
-                screenshot.save(filename)
-                print(f"Screenshot saved: {filename}")
-            
-            elif action_type == 'log':
-                message = action.get('message', '')
-                print(f"[LOG] {message}")
-            
-            elif action_type == 'loop':
-                max_iterations = action.get('max_iterations', 10)
-                actions = action.get('actions', [])
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                print(f"[{timestamp}] Loop started (max {max_iterations} times)")
-                
+            self.poller.count_probe()
+            current = fingerprint(self.capture.grab(region))
+            if fingerprint_difference(anchor, current, metric) > threshold:
+                anchor = current
+                quiet_since = time.monotonic()
+    
+    def _compile_screenshot(self, step: PlanStep, compile_children: ChildCompiler):
+        filename = step.action.get('filename')
+        
+        def screenshot(deadline):
+            path = filename or f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+            pyautogui.screenshot().save(path)
+            self.log.info(f"Screenshot saved: {path}")
+        step.run = screenshot
+    
+    def _compile_log(self, step: PlanStep, compile_children: ChildCompiler):
+        message = step.action.get('message', '')
+        step.run = lambda deadline: self.log.info(f"[LOG] {message}")
+    
+    def _compile_loop(self, step: PlanStep, compile_children: ChildCompiler):
+        max_iterations = step.action.get('max_iterations', 10)
+        body = compile_children('actions')
+        
+        def loop(deadline):
+            # Progress lines are only built when they will be written
+            if self.log.is_enabled(INFO) and (not self._loop_depth or self.log.sample()):
+                self.log.action(f"Loop started (max {max_iterations} times)")
+            self._loop_depth += 1
+            try:
                 for i in range(max_iterations):
+                    if deadline is not None:
+                        deadline.check()
                     if not self.running:
                         break
-                    if i % 10 == 0 or self.debug:  # Show progress every 10 iterations or in debug mode
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        print(f"[{timestamp}] Loop {i + 1}/{max_iterations}")
-                    for sub_action in actions:
-                        self.execute_action(sub_action)
-            
-            elif action_type == 'loop_until':
-                condition = action['condition']
-                timeout = action.get('timeout', 30)
-                actions = action.get('actions', [])
-                start_time = time.time()
-                
-                while not self.wait_for_condition(condition, 0.1):
+                    # Show progress every 10 iterations, or every iteration at debug level
+                    if (self.log.is_enabled(INFO) and (i % 10 == 0 or self.log.is_enabled(DEBUG))
+                            and self.log.sample()):
+                        self.log.action(f"Loop {i + 1}/{max_iterations}")
+                    self.run_steps(body, deadline)
+            finally:
+                self._loop_depth -= 1
+        step.run = loop
+    
+    def _compile_loop_until(self, step: PlanStep, compile_children: ChildCompiler):
+        condition = self._compile_condition(step.action['condition'])
+        timeout = step.action.get('timeout', 30)
+        body = compile_children('actions')
+        
+        def loop_until(deadline):
+            start_time = time.time()
+            interval = self.poller.interval
+            previous = None
+            probes = 0
+            self._loop_depth += 1
+            try:
+                while True:
+                    iteration_started = time.time()
+                    probes += 1
+                    if condition.get('poll_timeout'):
+                        met, observed = self.wait_for_condition(
+                            condition, condition['poll_timeout'], deadline), None
+                    else:
+                        met, observed = self._counted_probe(condition, start_time)
+                    if met:
+                        break
+                    if deadline is not None:
+                        deadline.check()
                     if not self.running or time.time() - start_time > timeout:
                         break
-                    for sub_action in actions:
-                        self.execute_action(sub_action)
+                    
+                    self.run_steps(body, deadline)
+                    # Iterations are paced like probes; a body slower than the interval paces itself
+                    if probes > 1:
+                        interval = self.poller.next_interval(interval, observed != previous)
+                    previous = observed
+                    pause = min(interval - (time.time() - iteration_started),
+                                timeout - (time.time() - start_time))
+                    if pause > 0:
+                        self.sleep(pause, deadline)
+            finally:
+                self._loop_depth -= 1
+                self.poller.record_wait(probes)
+        step.run = loop_until
+    
+    def _compile_conditional(self, step: PlanStep, compile_children: ChildCompiler):
+        condition = self._compile_condition(step.action['condition'])
+        if_true = compile_children('if_true')
+        if_false = compile_children('if_false')
+        
+        def conditional(deadline):
+            if self.check_condition(condition, deadline=deadline):
+                self.run_steps(if_true, deadline)
+            else:
+                self.run_steps(if_false, deadline)
+        step.run = conditional
+    
+    def _compile_exit_if(self, step: PlanStep, compile_children: ChildCompiler):
+        condition = self._compile_condition(step.action['condition'])
+        exit_code = step.action.get('exit_code', 0)
+        message = step.action.get('message', 'Exit condition met')
+        
+        def exit_if(deadline):
+            if self.check_condition(condition, deadline=deadline):
+                self.log.info(f"\n{message}")
+                sys.exit(exit_code)
+        step.run = exit_if
+    
+    def _search_options(self, action: Dict[str, Any]):
+        """Resolve search_region and scan_order of a color search action
+        
+        Returns the capture region, the scan order and the screen point
+        'nearest' (scan order or blob) measures from (None for the centre
+        of the frame).
+        """
+        search_region = action.get('search_region')
+        region = tuple(search_region) if search_region else None
+        
+        scan_order = action.get('scan_order', 'row_major')
+        if scan_order not in SCAN_ORDERS:
+            raise ValueError(f"Unknown scan_order '{scan_order}'")
+        near = None
+        measures_distance = scan_order == 'nearest' or action.get('blob') == 'nearest'
+        if measures_distance and ('x' in action or 'coordinate' in action):
+            near = self.resolve_coordinates(action)
+        return region, scan_order, near
+    
+    def _frame_offset(self, region: Optional[Tuple[int, int, int, int]]) -> Tuple[int, int]:
+        """Screen point of the top-left corner of a frame grabbed for region
+        
+        Without a region this is wherever the capture backend's frames
+        start: the window corner for window capture, else the screen's.
+        """
+        if region:
+            return region[0], region[1]
+        return self.capture.origin
+    
+    @staticmethod
+    def _search_origin(frame, offset: Tuple[int, int],
+                       near: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+        """near in frame coordinates, defaulting to the frame's centre"""
+        if near is None:
+            return frame.shape[1] // 2, frame.shape[0] // 2
+        return near[0] - offset[0], near[1] - offset[1]
+    
+    def _compile_click_on_color(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        color = action['color']
+        tolerance = action.get('tolerance', 10)
+        region, scan_order, near = self._search_options(action)
+        return_all = action.get('return_all', False)
+        max_hits = action.get('max_hits', 1000)
+        # Blob mode clicks the centroid of a connected region instead of its first pixel
+        blob_selection = action.get('blob')
+        if blob_selection is not None:
+            check_blob_selection(blob_selection)
+        min_area = action.get('min_area', 1)
+        # Scan every nth point first, then refine at full resolution around the hit
+        downsample = action.get('downsample', 1)
+        check_downsample(downsample)
+        if downsample > 1 and return_all:
+            raise ValueError("return_all cannot be combined with downsample")
+        coarse_min_area = max(1, min_area // (downsample * downsample))
+        
+        def compute(frame):
+            return color_mask(frame, color, tolerance)
+        
+        # Rescan only the tiles that changed since this step last ran
+        masks = IncrementalMap(compute) if action.get('track_changes', False) else None
+        
+        def search_band(band, band_near=None):
+            return first_hit(compute(band), scan_order, band_near)
+        
+        def click_on_color(deadline):
+            frame = self.capture.grab(region)
+            offset_x, offset_y = offset = self._frame_offset(region)
+            origin = self._search_origin(frame, offset, near)
             
-            elif action_type == 'conditional':
-                condition = action['condition']
-                if self.wait_for_condition(condition, 0.1):
-                    for sub_action in action.get('if_true', []):
-                        self.execute_action(sub_action)
+            if blob_selection is None and not return_all and downsample == 1 and masks is None:
+                # Plain first-hit search: bands in parallel, stopping at the first answer
+                if scan_order == 'nearest':
+                    hit = self.tiles.nearest(frame, search_band, origin)
                 else:
-                    for sub_action in action.get('if_false', []):
-                        self.execute_action(sub_action)
+                    found = self.tiles.first(frame, search_band)
+                    hit = (found[1][0], found[1][1] + found[0]) if found else None
+            else:
+                searched = frame[::downsample, ::downsample] if downsample > 1 else frame
+                mask = masks.update(searched) if masks else self.tiles.mask(searched, compute)
+                if blob_selection is not None:
+                    return click_blob(frame, mask, origin, offset)
+                if return_all:
+                    hits = mask_hits(mask, scan_order, origin, max_hits)
+                    hit = hits[0] if hits else None
+                else:
+                    hit = refine_hit(frame, mask, downsample, compute, scan_order, origin)
             
-            elif action_type == 'exit_if':
-                condition = action['condition']
-                if self.wait_for_condition(condition, 0.1):
-                    exit_code = action.get('exit_code', 0)
-                    message = action.get('message', 'Exit condition met')
-                    print(f"\n{message}")
-                    sys.exit(exit_code)
+            if hit is None:
+                if self.log.is_enabled(DEBUG):
+                    self.log.debug(f"Color {color} not found")
+                return [] if return_all else None
             
-            elif action_type == 'click_on_color':
-                color = action['color']
-                tolerance = action.get('tolerance', 10)
-                search_region = action.get('search_region')
-                
-                if search_region:
-                    screenshot = pyautogui.screenshot(region=tuple(search_region))
-                    offset_x, offset_y = search_region[0], search_region[1]
-                else:
-                    screenshot = pyautogui.screenshot()
-                    offset_x, offset_y = 0, 0
-                
-                width, height = screenshot.size
-                found = False
-                
-                for y in range(height):
-                    for x in range(width):
-                        pixel_color = list(screenshot.getpixel((x, y)))
-                        if all(abs(p - c) <= tolerance for p, c in zip(pixel_color, color)):
-                            pyautogui.click(x + offset_x, y + offset_y)
-                            found = True
-                            break
-                    if found:
-                        break
-                
-                if not found and self.debug:
-                    print(f"Color {color} not found")
+            x, y = hit[0] + offset_x, hit[1] + offset_y
+            pyautogui.click(x, y)
+            if return_all:
+                return [[hit_x + offset_x, hit_y + offset_y] for hit_x, hit_y in hits]
+            return [x, y]
+        
+        def click_blob(frame, mask, origin, offset):
+            offset_x, offset_y = offset
+            if downsample > 1:
+                blobs = find_blobs(mask, coarse_min_area)
+                coarse_origin = (origin[0] / downsample, origin[1] / downsample) if origin else None
+                blob = select_blob(blobs, blob_selection, coarse_origin)
+                if blob is not None:
+                    blob = refine_blob(frame, blob, downsample, compute, min_area)
+            else:
+                blobs = find_blobs(mask, min_area)
+                blob = select_blob(blobs, blob_selection, origin)
+            if blob is None:
+                if self.log.is_enabled(DEBUG):
+                    self.log.debug(f"No blob of color {color} found ({len(blobs)} blobs)")
+                return [] if return_all else None
             
-            # Add wait info
-            wait_info = ""
-            wait_time = action.get('wait', None)
-            if wait_time is not None:
-                if wait_time > 0:
-                    wait_info = f" (wait: {wait_time} seconds)"
-                    time.sleep(wait_time)
+            x, y = blob.point[0] + offset_x, blob.point[1] + offset_y
+            pyautogui.click(x, y)
+            if return_all:
+                return [{
+                    'point': [b.point[0] + offset_x, b.point[1] + offset_y],
+                    'area': b.area,
+                    'bbox': [b.bbox[0] + offset_x, b.bbox[1] + offset_y, b.bbox[2], b.bbox[3]],
+                } for b in blobs[:max_hits]]
+            return [x, y]
+        step.run = click_on_color
+        step.sends_input = True
+    
+    def _compile_find_colors(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        palette = Palette(action['palette'], action.get('tolerance', 10))
+        region, scan_order, near = self._search_options(action)
+        should_click = step.action_type == 'click_on_any_color'
+        label_bits = IncrementalMap(palette.label_bits) if action.get('track_changes', False) else None
+        
+        def find_colors(deadline):
+            frame = self.capture.grab(region)
+            offset_x, offset_y = offset = self._frame_offset(region)
+            bits = label_bits.update(frame) if label_bits else self.tiles.mask(frame, palette.label_bits)
+            found = palette.find_in_bits(bits, scan_order, self._search_origin(frame, offset, near))
+            matches = {
+                label: {'point': [x + offset_x, y + offset_y], 'count': count}
+                for label, ((x, y), count) in found.items()
+            }
+            # Palette order is priority order when several colors are visible
+            matched = next(iter(matches), None)
+            result = {
+                'matched': matched,
+                'point': matches[matched]['point'] if matched else None,
+                'matches': matches,
+            }
+            
+            if self.log.is_enabled(DEBUG):
+                if matched is None:
+                    self.log.debug(f"No palette color found ({', '.join(palette.labels)})")
                 else:
-                    wait_info = " (wait: 0 seconds)"
-            elif hasattr(self, '_default_wait') and self._default_wait > 0:
-                wait_info = f" (default_wait: {self._default_wait} seconds)"
+                    self.log.debug(f"Palette matches: {matches}")
+            if matched is not None and should_click:
+                pyautogui.click(*result['point'])
+            return result
+        step.run = find_colors
+        step.sends_input = should_click
+    
+    def _compile_image_search(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Preload the template and resolve the search options of an image action"""
+        key = TemplateStore.key(spec['image'], spec.get('mask'), spec.get('template_scale', 1.0))
+        # Pyramid depth: 'downsample': 8 starts matching at 1/8 scale; 1 scans full resolution
+        levels = self._pyramid_levels(spec.get('downsample'))
+        self.templates.get(key, levels)
+        search_region = spec.get('search_region')
+        return {
+            'template': key,
+            'threshold': spec.get('threshold', 0.9),
+            'region': tuple(search_region) if search_region else None,
+            'levels': levels,
+            # Reuse the previous result while nothing in the region changes
+            'tracker': DirtyTracker() if spec.get('track_changes', False) else None,
+            'last': None,
+        }
+    
+    @staticmethod
+    def _pyramid_levels(downsample: Optional[int]) -> Optional[int]:
+        """Pyramid levels whose coarsest is 1/downsample scale (None keeps the default)"""
+        if downsample is None:
+            return None
+        check_downsample(downsample)
+        return downsample.bit_length()
+    
+    def find_image(self, search: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Locate a compiled image search on screen
+        
+        Returns the match centre and bounding box in screen coordinates, the
+        centre relative to the target window, and the match score.
+        """
+        region = search['region']
+        frame = self.capture.grab(region)
+        tracker = search.get('tracker')
+        if tracker is not None:
+            tiles = tracker.update(frame)
+            if tiles is not None and not tiles.any():
+                return search['last']
+        
+        search['last'] = None
+        levels = search.get('levels')
+        match = self._match_template(frame, self.templates.get(search['template'], levels),
+                                     search['threshold'], levels)
+        if match is None:
+            return None
+        
+        offset_x, offset_y = self._frame_offset(region)
+        center_x, center_y = match.center
+        point = [center_x + offset_x, center_y + offset_y]
+        result = {
+            'point': point,
+            'bbox': [match.x + offset_x, match.y + offset_y, match.width, match.height],
+            'score': round(match.score, 4),
+        }
+        if self.current_window and self.current_window.get('bounds'):
+            bounds = self.current_window['bounds']
+            result['window_point'] = [point[0] - bounds['x'], point[1] - bounds['y']]
+        search['last'] = result
+        return result
+    
+    def _match_template(self, frame: np.ndarray, template: Template, threshold: float,
+                        levels: Optional[int]) -> Optional[Match]:
+        """match_template over overlapping bands; the best score in any band wins"""
+        levels = levels or template.auto_levels()
+        # Build the shared pyramid before threads read it
+        template.pyramid(levels)
+        height = template.size[1]
+        found = self.tiles.best(frame, lambda band: match_template(band, template, threshold, levels),
+                                lambda match: match.score, overlap=height - 1)
+        if found is None:
+            return None
+        top, match = found
+        return match._replace(y=match.y + top)
+    
+    def _compile_click_on_image(self, step: PlanStep, compile_children: ChildCompiler):
+        search = self._compile_image_search(step.action)
+        image = step.action['image']
+        
+        def click_on_image(deadline):
+            result = self.find_image(search)
+            if result is None:
+                if self.log.is_enabled(DEBUG):
+                    self.log.debug(f"Image {image} not found")
+                return None
+            pyautogui.click(*result['point'])
+            return result
+        step.run = click_on_image
+        step.sends_input = True
+    
+    def _compile_classify_screen(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        if not len(self.screens):
+            raise ValueError("classify_screen needs a 'screens' catalogue in the configuration")
+        names = action.get('screens')
+        if names is not None:
+            unknown = [name for name in names if name not in self.screens]
+            if unknown:
+                raise ValueError(f"Unknown screens: {', '.join(unknown)}")
+        max_distance = action.get('max_distance', DEFAULT_MAX_DISTANCE)
+        min_margin = action.get('min_margin', DEFAULT_MIN_MARGIN)
+        region = self._watch_region(action)
+        
+        def classify_screen(deadline):
+            return self.classify_screen(region, names, max_distance, min_margin)
+        step.run = classify_screen
+    
+    def classify_screen(self, region: Optional[Tuple[int, int, int, int]] = None,
+                        names: Optional[List[str]] = None,
+                        max_distance: int = DEFAULT_MAX_DISTANCE,
+                        min_margin: int = DEFAULT_MIN_MARGIN) -> Dict[str, Any]:
+        """Name the catalogued screen region shows, from one capture
+        
+        'matched' is None when no screen is within max_distance bits, or
+        when the runner-up is less than min_margin bits further away.
+        """
+        ranked = self.screens.classify(self.capture.grab(region), names)
+        best = ranked[0] if ranked else None
+        match = best_match(ranked, max_distance, min_margin)
+        matched = match.name if match else None
+        if self.log.is_enabled(DEBUG):
+            self.log.debug(f"Screen: {matched or 'unknown'} "
+                           f"({', '.join(f'{m.name}={m.distance}' for m in ranked[:3])})")
+        return {
+            'matched': matched,
+            'distance': best.distance if best else None,
+            'distances': {m.name: m.distance for m in ranked},
+        }
+    
+    def _compile_goto(self, step: PlanStep, compile_children: ChildCompiler):
+        action = step.action
+        target = action['screen']
+        if target not in self.screens:
+            raise ValueError(f"Unknown screen '{target}'")
+        max_hops = action.get('max_hops', 10)
+        max_distance = action.get('max_distance', DEFAULT_MAX_DISTANCE)
+        step.run = lambda deadline: self.goto(target, max_hops, max_distance, deadline)
+    
+    def goto(self, target: str, max_hops: int = 10, max_distance: int = DEFAULT_MAX_DISTANCE,
+             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Walk the transition graph from the current screen to target
+        
+        The route is planned again from whatever screen is showing after
+        every hop, so a transition that lands somewhere unexpected is
+        recovered from instead of derailing the rest of the route.
+        """
+        region = self._watch_region({})
+        visited = []
+        while True:
+            current = self.classify_screen(region, max_distance=max_distance)['matched']
+            if current == target:
+                return {'matched': target, 'hops': len(visited), 'path': visited}
+            if len(visited) >= max_hops:
+                raise NavigationError(f"Could not reach screen '{target}' in {max_hops} hops "
+                                      f"(on {current or 'an unknown screen'})")
+            
+            route = self.navigation.shortest_path(current, target)
+            if not route:
+                raise NavigationError(f"No transitions lead from {current or 'an unknown screen'} "
+                                      f"to '{target}'")
+            hop = route[0]
+            if self.log.is_enabled(DEBUG):
+                self.log.debug(f"goto {target}: {current or 'unknown'} -> {hop.target} "
+                               f"({len(route)} hops left)")
+            self._loop_depth += 1
+            try:
+                self.run_steps(hop.steps, deadline)
+            finally:
+                self._loop_depth -= 1
+            visited.append(hop.target)
+            if not self.running:
+                return {'matched': None, 'hops': len(visited), 'path': visited}
+            
+            arrived = self.wait_for_condition(
+                {'type': 'screen', 'name': hop.target, 'max_distance': max_distance},
+                hop.timeout, deadline)
+            if not arrived:
+                self.log.warning(f"{hop.path} did not reach screen '{hop.target}'; re-planning")
+    
+    def run_steps(self, steps: List[PlanStep], deadline: Optional[Deadline] = None):
+        """Execute compiled steps in order"""
+        for step in steps:
+            if not self.running:
+                break
+            self.run_step(step, deadline=deadline)
+    
+    def run_step(self, step: PlanStep, drift: Optional[float] = None,
+                 deadline: Optional[Deadline] = None) -> Any:
+        """Execute a single compiled step with its wait, logging and history
+
+        drift is set when the step was scheduled on a timeline; the schedule
+        then replaces the step's own wait. deadline bounds the step and
+        everything nested in it; a step's own timeout narrows it further.
+        """
+        if not self.running:
+            return None
+        
+        if self.log.is_enabled(DEBUG):
+            self.log.debug(f"Executing: {step.action_type} - {step.action}")
+        
+        step_deadline = deadline
+        if step.timeout is not None:
+            step_deadline = Deadline(step.timeout, step.path, parent=deadline)
+            if self.watchdog:
+                self.watchdog.watch(step_deadline)
+        
+        try:
+            window_key = self.current_window['window_id'] if self.current_window else None
+            if step.sends_input:
+                cooldown = self.pacer.cooldown_remaining(window_key)
+                if cooldown:
+                    self.sleep(cooldown, step_deadline)
+            
+            result = step.run(step_deadline)
+            if 'store_as' in step.action:
+                self.results[step.action['store_as']] = result
+            
+            # Catch overruns of steps that blocked inside a single call
+            if step_deadline is not None:
+                step_deadline.check()
             
-            # Final output (only if action exists)
-            if 'action_info' in locals():
-                print(f"[{timestamp}] {action_info}{wait_info}")
-            elif 'comment' in action and action_type not in ['click', 'double_click', 'right_click']:
-                # For non-click actions with comments
-                print(f"[{timestamp}] {action['comment']}{wait_info}")
+            # An explicit wait replaces the pacing delay; timelines replace both
+            default_wait = None
+            if step.sends_input:
+                self.pacer.mark_input(window_key)
+            if drift is None:
+                if step.wait is not None:
+                    self.sleep(step.wait, deadline)
+                elif step.sends_input and self.pacer.action_delay:
+                    default_wait = self.pacer.action_delay
+                    self.sleep(default_wait, deadline)
             
-            self.action_history.append({
-                'action': action,
-                'timestamp': datetime.now().isoformat(),
+            # Inside loops only one in every log.sample_every steps is logged
+            message = step.message or step.action.get('comment')
+            if message and self.log.level <= INFO and (not self._loop_depth or self.log.sample()):
+                self.log.action(message, path=step.path, type=step.action_type,
+                                wait=step.wait, default_wait=default_wait, drift=drift)
+            
+            # A float is cheap to record; it is formatted only when history or trace is printed
+            entry = {
+                'action': step.action,
+                'timestamp': time.time(),
                 'result': result
-            })
+            }
+            if drift is not None:
+                entry['drift'] = drift
+            self.action_history.append(entry)
+            self.executed_count += 1
+            
+            if self.trace:
+                record = {
+                    'timestamp': entry['timestamp'],
+                    'path': step.path,
+                    'type': step.action_type,
+                    'result': result
+                }
+                if drift is not None:
+                    record['drift'] = drift
+                self.trace.write(record)
             
         except Exception as e:
-            print(f"Action error: {action_type} - {e}")
-            if self.screenshot_on_error:
-                error_screenshot = f"error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                self.take_window_screenshot(self.target_window, error_screenshot)
-                print(f"Error screenshot saved: {error_screenshot}")
-                if self.target_window:
-                    print(f"  Window: {self.target_window.get('owner_name', 'Unknown')} - {self.target_window.get('window_name', 'Unknown')}")
+            # Report once, at the innermost step, even though every enclosing step re-raises
+            if e is not self._reported_error:
+                self._reported_error = e
+                self.log.error(f"Action error: {step.action_type} - {e}", path=step.path)
+                # An expired deadline is captured once, here or by the watchdog
+                first_report = not isinstance(e, DeadlineExceeded) or self._claim_deadline(e.deadline)
+                if first_report and self.screenshot_on_error:
+                    self._save_error_screenshot()
             raise
+        finally:
+            if step_deadline is not deadline and self.watchdog:
+                self.watchdog.unwatch(step_deadline)
         
         return result
     
+    def _save_error_screenshot(self):
+        """Capture the target window (or screen) for error context"""
+        error_screenshot = f"error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        self.take_window_screenshot(self.target_window, error_screenshot)
+        self.log.error(f"Error screenshot saved: {error_screenshot}")
+        if self.target_window:
+            self.log.error(f"  Window: {self.target_window.get('owner_name', 'Unknown')} - {self.target_window.get('window_name', 'Unknown')}")
+    
+    def _claim_deadline(self, deadline: Deadline) -> bool:
+        """Record the expired deadline; False if it was already reported"""
+        with self._deadline_lock:
+            if self._expired_deadline is not None:
+                return False
+            self._expired_deadline = deadline
+            return True
+    
+    def _on_deadline_expired(self, deadline: Deadline):
+        """Watchdog callback: capture the stuck step and wake every wait"""
+        if not self._claim_deadline(deadline):
+            return
+        self.log.error(f"Deadline exceeded: {deadline.label} ({deadline.budget:g} seconds)")
+        if self.screenshot_on_error:
+            self._save_error_screenshot()
+        self._stop_event.set()
+    
+    def _print_recent_actions(self, count: int = 5):
+        """Show the last few completed actions for error context"""
+        recent = list(self.action_history)[-count:]
+        if not recent:
+            return
+        self.log.error("Recent actions:")
+        for entry in recent:
+            action = entry['action']
+            line = f"  {datetime.fromtimestamp(entry['timestamp']).isoformat()} {action['type']}"
+            if 'comment' in action:
+                line += f" - {action['comment']}"
+            self.log.error(line)
+    
+    def execute_action(self, action: Dict[str, Any], deadline: Optional[Deadline] = None) -> Any:
+        """Compile and execute a single action"""
+        if not self.running:
+            return None
+        
+        step = self.compile_plan([action]).steps[0]
+        return self.run_step(step, deadline=deadline)
+    
+    def configure_logging(self, settings: Dict[str, Any], level: Optional[str] = None,
+                          log_format: Optional[str] = None, sample_every: Optional[int] = None):
+        """Create the run logger from settings.log, with command line overrides"""
+        log_settings = settings.get('log', {})
+        level_name = level or log_settings.get('level') or ('debug' if self.debug else 'info')
+        if level_name not in LEVEL_NAMES:
+            raise ValueError(f"Unknown log level '{level_name}'")
+        log_format = log_format or log_settings.get('format', 'text')
+        sample_every = sample_every or log_settings.get('sample_every', 1)
+        
+        self.log.close()
+        self.log = RunLogger(
+            level=LEVEL_NAMES[level_name],
+            json_output=log_format == 'json',
+            sample_every=sample_every,
+            background=True
+        )
+    
     def run_automation(self, window_name: str = None, window_id: int = None, 
                       config_path: str = None, coordinates_path: str = None,
-                      debug: bool = False):
+                      debug: bool = False, timeline: bool = False,
+                      speed: Optional[float] = None, trace_path: Optional[str] = None,
+                      log_level: Optional[str] = None, log_format: Optional[str] = None,
+                      log_sample: Optional[int] = None):
         """Execute automation"""
         self.debug = debug
         
+        config = self.load_config(config_path)
+        settings = config.get('settings', {})
+        try:
+            self.configure_logging(settings, log_level, log_format, log_sample)
+        except ValueError as e:
+            self.log.error(f"Invalid configuration: {e}")
+            sys.exit(1)
+        
+        try:
+            self._run_config(config, window_name, window_id, coordinates_path,
+                             timeline, speed, trace_path)
+        finally:
+            self.log.close()
+            self.log = RunLogger()
+    
+    def _run_config(self, config: Dict[str, Any], window_name: Optional[str],
+                    window_id: Optional[int], coordinates_path: Optional[str],
+                    timeline: bool, speed: Optional[float], trace_path: Optional[str]):
+        settings = config.get('settings', {})
+        
         # Start ESC key monitoring listener
         self.keyboard_listener = keyboard.Listener(on_press=self._on_key_press)
         self.keyboard_listener.start()
-        print("Press ESC to interrupt")
+        self.log.info("Press ESC to interrupt")
         
         if window_name or window_id:
             self.current_window = self.find_window(window_name, window_id)
             if not self.current_window:
-                print(f"Window not found")
+                self.log.error(f"Window not found")
                 self.keyboard_listener.stop()
                 sys.exit(1)
             
             # Set target window for screenshot on error
             self.target_window = self.current_window
             
-            print(f"Target window: {self.current_window['owner_name']} - {self.current_window['window_name']}")
+            self.log.info(f"Target window: {self.current_window['owner_name']} - {self.current_window['window_name']}")
             bounds = self.current_window.get('bounds')
             if bounds:
-                print(f"Window position: ({bounds['x']}, {bounds['y']}) Size: {bounds['width']}x{bounds['height']}")
+                self.log.info(f"Window position: ({bounds['x']}, {bounds['y']}) Size: {bounds['width']}x{bounds['height']}")
             
             if not self.focus_window(self.current_window):
-                print("Could not focus on window")
+                self.log.warning("Could not focus on window")
         
         if coordinates_path and os.path.exists(coordinates_path):
             self.recorded_coordinates = self.load_coordinates(coordinates_path)
-            print(f"Loaded coordinate definitions: {len(self.recorded_coordinates)} items")
-        
-        config = self.load_config(config_path)
+            self.log.info(f"Loaded coordinate definitions: {len(self.recorded_coordinates)} items")
         
-        settings = config.get('settings', {})
         self.screenshot_on_error = settings.get('screenshot_on_error', True)
+        self.results = {}
         default_wait = settings.get('default_wait', 0)
         max_runtime = settings.get('max_runtime', 3600)
         
-        # Save default_wait as instance variable
-        self._default_wait = default_wait
+        # Recorded replays run on an absolute timeline instead of relative waits
+        use_timeline = timeline or settings.get('timeline', False)
         
-        pyautogui.PAUSE = default_wait
+        # Delays are applied once per logical action, never per pyautogui call
+        self.pacer = Pacer.from_settings(settings)
+        if use_timeline:
+            self.pacer.action_delay = 0
+        pyautogui.PAUSE = 0
         
-        actions = config.get('actions', [])
+        history_size = settings.get('history_size', DEFAULT_HISTORY_SIZE)
+        self.action_history = deque(maxlen=history_size)
         
-        print(f"\ndefault_wait: {default_wait} seconds")
-        print(f"Executing {len(actions)} actions...")
+        try:
+            self.apply_settings(settings, speed)
+            plan = self.compile_config(config)
+        except (PlanError, ValueError) as e:
+            self.log.error(f"Invalid configuration: {e}")
+            self.keyboard_listener.stop()
+            sys.exit(1)
+        if len(self.templates):
+            self.log.info(f"Preloaded {len(self.templates)} templates")
+        if len(self.screens):
+            self.log.info(f"Catalogued {len(self.screens)} screens, {len(self.navigation)} transitions")
         
-        start_time = time.time()
+        self.log.info(f"\ndefault_wait: {default_wait} seconds")
+        if self.speed != 1.0:
+            self.log.info(f"Replay speed: {self.speed}x")
+        self.log.info(f"Executing {len(plan)} actions...")
+        
+        try:
+            self.capture = capture_from_settings(settings, self.current_window)
+        except (CaptureError, ValueError) as e:
+            self.log.error(f"Screen capture unavailable: {e}")
+            self.keyboard_listener.stop()
+            sys.exit(1)
+        if isinstance(self.capture, CaptureService):
+            self.log.info(f"Capturing in the background at {self.capture.fps:g} fps")
+        if isinstance(getattr(self.capture, 'backend', self.capture), WindowCapture):
+            self.log.info("Capturing the target window only")
+        
+        trace_path = trace_path or settings.get('trace_file')
+        if trace_path:
+            self.trace = TraceWriter(trace_path)
+            self.log.info(f"Writing action trace to: {trace_path}")
+        
+        # max_runtime is a hard budget for the whole run, enforced inside nested steps too
+        run_deadline = Deadline(max_runtime, 'max_runtime')
+        self._expired_deadline = None
+        self.watchdog = Watchdog(self._on_deadline_expired).start()
+        self.watchdog.watch(run_deadline)
+        
+        schedule = None
+        if use_timeline:
+            schedule = Timeline(self._stop_event)
+            offsets = timeline_offsets([step.action for step in plan], self.speed)
+            self.log.info("Replaying on recorded timeline")
+            schedule.start()
         
         try:
-            for i, action in enumerate(actions):
+            for i, step in enumerate(plan):
                 if not self.running:
                     break
                 
-                if time.time() - start_time > max_runtime:
-                    print(f"\nExceeded maximum runtime ({max_runtime} seconds)")
-                    break
+                run_deadline.check()
+                
+                if self.log.is_enabled(DEBUG):
+                    self.log.debug(f"\nAction {i + 1}/{len(plan)}")
                 
-                if self.debug:
-                    print(f"\nAction {i + 1}/{len(actions)}")
+                drift = None
+                if schedule:
+                    drift = schedule.wait_until(offsets[i])
+                    if drift is None:
+                        break
                 
-                self.execute_action(action)
+                self.run_step(step, drift=drift, deadline=run_deadline)
+            
+            # A deadline may expire after its step returned but before anything checked it
+            if self._expired_deadline is not None:
+                raise DeadlineExceeded(self._expired_deadline)
+            
+            if schedule:
+                self.log.info(f"\n{schedule.summary()}")
+            if self.templates.misses:
+                self.log.debug(self.templates.summary())
+            if self.poller.probes:
+                self.log.debug(self.poller.summary())
             
             if self.running:
-                print(f"\nCompleted: Executed {len(self.action_history)} actions")
+                self.log.info(f"\nCompleted: Executed {self.executed_count} actions")
             else:
-                print(f"\nInterrupted: Executed {len(self.action_history)} actions")
+                self.log.warning(f"\nInterrupted: Executed {self.executed_count} actions")
             
         except Exception as e:
-            print(f"\nError occurred: {e}")
+            self.log.error(f"\nError occurred: {e}")
+            self._print_recent_actions()
             sys.exit(1)
         finally:
+            self.watchdog.stop()
+            self.watchdog = None
+            self.capture.close()
+            self.tiles.close()
+            
+            if self.trace:
+                self.trace.close()
+                self.trace = None
+            
             # Stop listener
             if self.keyboard_listener and self.keyboard_listener.is_alive():
                 self.keyboard_listener.stop()
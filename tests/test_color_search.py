@@ -0,0 +1,191 @@
+"""Tests for vectorized color search."""
+
+import numpy as np
+import pytest
+
+from mactoro.color_search import (
+    Palette, check_downsample, color_mask, find_all_colors, find_blobs, find_color, first_hit,
+    refine_blob, refine_hit, select_blob
+)
+
+
+class TestColorSearch:
+    """Test cases for color masks and hit ordering."""
+
+    @pytest.fixture
+    def frame(self):
+        """A black 10x8 frame with three red pixels."""
+        frame = np.zeros((8, 10, 3), dtype=np.uint8)
+        frame[2, 7] = (250, 5, 0)
+        frame[5, 1] = (255, 0, 0)
+        frame[6, 8] = (255, 0, 0)
+        return frame
+
+    def test_mask_honours_tolerance(self, frame):
+        """Test that every channel must be within tolerance."""
+        assert color_mask(frame, [255, 0, 0], 10).sum() == 3
+        assert color_mask(frame, [255, 0, 0], 2).sum() == 2
+
+    def test_mask_clamps_bounds(self):
+        """Test that tolerance near 0 and 255 does not wrap around."""
+        frame = np.array([[[0, 255, 128]]], dtype=np.uint8)
+        assert color_mask(frame, [3, 250, 128], 10)[0, 0]
+        assert not color_mask(frame, [200, 250, 128], 10)[0, 0]
+
+    def test_row_major_first_hit(self, frame):
+        """Test that row-major search returns the top-most, then left-most hit."""
+        assert find_color(frame, [255, 0, 0]) == (7, 2)
+
+    def test_nearest_first_hit(self, frame):
+        """Test that nearest search measures from the given point."""
+        assert find_color(frame, [255, 0, 0], scan_order='nearest', near=(9, 7)) == (8, 6)
+        assert find_color(frame, [255, 0, 0], scan_order='nearest', near=(0, 5)) == (1, 5)
+
+    def test_no_hit(self, frame):
+        """Test that a missing color returns None for both scan orders."""
+        assert find_color(frame, [0, 0, 255]) is None
+        assert find_color(frame, [0, 0, 255], scan_order='nearest', near=(0, 0)) is None
+
+    def test_all_hits_in_order(self, frame):
+        """Test returning every hit, in scan order and limited."""
+        assert find_all_colors(frame, [255, 0, 0]) == [(7, 2), (1, 5), (8, 6)]
+        assert find_all_colors(frame, [255, 0, 0], scan_order='nearest',
+                               near=(9, 7), limit=2) == [(8, 6), (7, 2)]
+
+    def test_unknown_scan_order(self, frame):
+        """Test that unknown scan orders are rejected."""
+        with pytest.raises(ValueError):
+            first_hit(color_mask(frame, [255, 0, 0]), scan_order='spiral')
+
+
+class TestPalette:
+    """Test cases for single-pass palette matching."""
+
+    @pytest.fixture
+    def frame(self):
+        """A gray frame with a red, a green and a near-green pixel."""
+        frame = np.full((6, 8, 3), 128, dtype=np.uint8)
+        frame[1, 6] = (255, 0, 0)
+        frame[3, 2] = (0, 250, 0)
+        frame[4, 7] = (0, 255, 0)
+        return frame
+
+    def test_find_reports_each_color(self, frame):
+        """Test that every present color gets its first hit and count."""
+        palette = Palette([
+            {"label": "red", "color": [255, 0, 0]},
+            {"label": "green", "color": [0, 255, 0], "tolerance": 10},
+            {"label": "blue", "color": [0, 0, 255]},
+        ])
+        assert palette.find(frame) == {"red": ((6, 1), 1), "green": ((2, 3), 2)}
+
+    def test_matches_color_mask(self, frame):
+        """Test that palette bits agree with per-color masks, tolerance included."""
+        entries = [{"color": [0, 255, 0], "tolerance": 2}, {"color": [128, 128, 128], "tolerance": 0}]
+        bits = Palette(entries).label_bits(frame)
+        for i, entry in enumerate(entries):
+            expected = color_mask(frame, entry["color"], entry["tolerance"])
+            assert np.array_equal((bits >> i & 1).astype(bool), expected)
+
+    def test_wide_palette(self, frame):
+        """Test palettes larger than eight colors."""
+        entries = [{"color": [i, i, i], "tolerance": 0} for i in range(11)]
+        entries.append({"label": "red", "color": [255, 0, 0], "tolerance": 0})
+        assert Palette(entries).find(frame) == {"red": ((6, 1), 1)}
+
+    def test_nearest_scan_order(self, frame):
+        """Test that nearest ordering applies per color."""
+        palette = Palette([{"label": "green", "color": [0, 255, 0], "tolerance": 10}])
+        assert palette.find(frame, "nearest", (7, 5)) == {"green": ((7, 4), 2)}
+
+    def test_duplicate_labels(self):
+        """Test that labels must be unique."""
+        with pytest.raises(ValueError):
+            Palette([{"label": "a", "color": [0, 0, 0]}, {"label": "a", "color": [1, 1, 1]}])
+
+
+class TestBlobs:
+    """Test cases for connected-component blob detection."""
+
+    @pytest.fixture
+    def mask(self):
+        """A mask with a 3x3 square, a single pixel and a 2x4 bar."""
+        mask = np.zeros((12, 12), dtype=bool)
+        mask[1:4, 6:9] = True
+        mask[2, 1] = True
+        mask[8:10, 2:6] = True
+        return mask
+
+    def test_blobs_in_reading_order(self, mask):
+        """Test areas, centroids and top-to-bottom, left-to-right order."""
+        blobs = find_blobs(mask)
+        assert [blob.area for blob in blobs] == [9, 1, 8]
+        assert blobs[0].point == (7, 2)
+        assert blobs[0].bbox == (6, 1, 3, 3)
+        assert blobs[2].centroid == (3.5, 8.5)
+
+    def test_min_area(self, mask):
+        """Test that small blobs such as anti-aliasing specks are dropped."""
+        assert [blob.area for blob in find_blobs(mask, min_area=2)] == [9, 8]
+
+    def test_select_blob(self, mask):
+        """Test the largest, nearest and nth selections."""
+        blobs = find_blobs(mask)
+        assert select_blob(blobs, 'largest').area == 9
+        assert select_blob(blobs, 'nearest', (0, 0)).area == 1
+        assert select_blob(blobs, 2).area == 8
+        assert select_blob(blobs, -1).area == 8
+        assert select_blob(blobs, 3) is None
+        assert select_blob([], 'largest') is None
+
+    def test_unknown_selection(self, mask):
+        """Test that unknown selections are rejected."""
+        with pytest.raises(ValueError):
+            select_blob(find_blobs(mask), 'smallest')
+
+
+class TestDownsample:
+    """Test cases for the coarse-to-fine search."""
+
+    @pytest.fixture
+    def frame(self):
+        """A 120x80 noise frame with a 10x9 magenta target at (53, 31)."""
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 200, (80, 120, 3), dtype=np.uint8)
+        frame[31:40, 53:63] = (250, 10, 250)
+        return frame
+
+    @staticmethod
+    def compute(frame):
+        return color_mask(frame, (250, 10, 250), 5)
+
+    @pytest.mark.parametrize("factor", [2, 4, 8])
+    def test_row_major_matches_full_scan(self, frame, factor):
+        """Test that refining a coarse hit gives the full-resolution first hit."""
+        coarse = self.compute(frame[::factor, ::factor])
+        assert refine_hit(frame, coarse, factor, self.compute) == (53, 31)
+
+    @pytest.mark.parametrize("factor", [2, 4, 8])
+    def test_nearest_within_factor(self, frame, factor):
+        """Test that the nearest refined hit is within one sampling step of the true one."""
+        coarse = self.compute(frame[::factor, ::factor])
+        x, y = refine_hit(frame, coarse, factor, self.compute, 'nearest', (100, 70))
+        assert abs(x - 62) < factor and abs(y - 39) < factor
+
+    def test_refine_blob(self, frame):
+        """Test that a coarse blob is measured again at full resolution."""
+        coarse = find_blobs(self.compute(frame[::4, ::4]))
+        blob = refine_blob(frame, coarse[0], 4, self.compute)
+        assert blob.area == 90
+        assert blob.bbox == (53, 31, 10, 9)
+        assert blob.centroid == (57.5, 35.0)
+
+    def test_no_hit(self, frame):
+        """Test that an empty coarse mask finds nothing."""
+        coarse = np.zeros((20, 30), dtype=bool)
+        assert refine_hit(frame, coarse, 4, self.compute) is None
+
+    def test_unknown_factor(self):
+        """Test that unsupported factors are rejected."""
+        with pytest.raises(ValueError):
+            check_downsample(3)
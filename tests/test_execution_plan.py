@@ -0,0 +1,105 @@
+"""Tests for execution plan compilation."""
+
+import pytest
+from mactoro.execution_plan import (
+    ExecutionPlan, PlanError, compile_actions, compile_plan, stored_names
+)
+
+
+def make_compilers(calls):
+    """Build compilers that record what they compiled."""
+    def compile_click(step, compile_children):
+        x, y = step.action.get('x', 0), step.action.get('y', 0)
+        step.run = lambda: calls.append(('click', x, y))
+        step.message = f"Click: ({x}, {y})"
+
+    def compile_loop(step, compile_children):
+        body = compile_children('actions')
+        count = step.action.get('max_iterations', 10)
+
+        def loop():
+            for _ in range(count):
+                for child in body:
+                    child.run()
+        step.run = loop
+
+    def compile_bad(step, compile_children):
+        raise ValueError("Coordinate 'missing' not found")
+
+    return {'click': compile_click, 'loop': compile_loop, 'bad': compile_bad}
+
+
+class TestCompileActions:
+    """Test cases for compile_actions."""
+
+    def test_compiles_prebound_steps(self):
+        """Test that compiled steps run without re-reading the action."""
+        calls = []
+        steps = compile_actions([{"type": "click", "x": 1, "y": 2, "wait": 0.5}], make_compilers(calls))
+
+        assert len(steps) == 1
+        assert steps[0].action_type == "click"
+        assert steps[0].wait == 0.5
+        assert steps[0].message == "Click: (1, 2)"
+        steps[0].action['x'] = 99
+        steps[0].run()
+        assert calls == [('click', 1, 2)]
+
+    def test_nested_actions_are_compiled(self):
+        """Test that loop bodies are compiled once up front."""
+        calls = []
+        plan = compile_plan(
+            [{"type": "loop", "max_iterations": 3, "actions": [{"type": "click", "x": 5, "y": 6}]}],
+            make_compilers(calls),
+        )
+
+        assert isinstance(plan, ExecutionPlan)
+        assert len(plan) == 1
+        plan.steps[0].run()
+        assert calls == [('click', 5, 6)] * 3
+
+    def test_unknown_action_type(self):
+        """Test that unknown types are rejected with their path."""
+        with pytest.raises(PlanError, match=r"actions\[0\].actions\[1\]: Unknown action type 'fly'"):
+            compile_actions(
+                [{"type": "loop", "actions": [{"type": "click"}, {"type": "fly"}]}],
+                make_compilers([]),
+            )
+
+    def test_missing_required_key(self):
+        """Test that required keys are validated before compiling."""
+        compilers = {'type': lambda step, compile_children: None}
+        with pytest.raises(PlanError, match="requires text"):
+            compile_actions([{"type": "type"}], compilers)
+
+    def test_compiler_errors_are_wrapped(self):
+        """Test that compiler errors surface as PlanError with the action path."""
+        with pytest.raises(PlanError, match=r"actions\[1\]: Coordinate 'missing' not found"):
+            compile_actions([{"type": "click"}, {"type": "bad"}], make_compilers([]))
+
+    def test_invalid_action_list(self):
+        """Test that non-list actions and untyped entries are rejected."""
+        with pytest.raises(PlanError, match="expected a list"):
+            compile_actions({"type": "click"}, make_compilers([]))
+        with pytest.raises(PlanError, match="must be an object"):
+            compile_actions([{"x": 1}], make_compilers([]))
+
+    def test_speed_scales_waits(self):
+        """Test that compiling with a speed compresses step waits."""
+        steps = compile_actions(
+            [{"type": "click", "wait": 2.0}, {"type": "click", "wait": 2.0, "min_wait": 1.0}],
+            make_compilers([]),
+            speed=4,
+        )
+        assert [step.wait for step in steps] == [0.5, 1.0]
+
+        with pytest.raises(PlanError, match="speed must be positive"):
+            compile_actions([], make_compilers([]), speed=0)
+
+    def test_stored_names_include_nested_actions(self):
+        """Test that store_as names are collected from nested action lists."""
+        actions = [
+            {"type": "find_colors", "palette": [], "store_as": "button"},
+            {"type": "loop", "actions": [{"type": "click_on_color", "store_as": "icon"}]},
+        ]
+        assert stored_names(actions) == {"button", "icon"}
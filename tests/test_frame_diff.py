@@ -0,0 +1,96 @@
+"""Tests for frame fingerprints and changed-tile tracking."""
+
+import numpy as np
+import pytest
+
+from mactoro.frame_diff import (
+    DirtyTracker, IncrementalMap, changed_tiles, fingerprint, fingerprint_difference, tile_runs
+)
+
+
+@pytest.fixture
+def frame():
+    """A 200x120 gradient frame."""
+    row = np.linspace(0, 255, 200, dtype=np.uint8)
+    return np.repeat(np.repeat(row[None, :, None], 120, axis=0), 3, axis=2)
+
+
+class TestFingerprint:
+    """Test cases for fingerprint and fingerprint_difference."""
+
+    def test_identical_frames(self, frame):
+        """Test that identical frames have no difference."""
+        assert fingerprint_difference(fingerprint(frame), fingerprint(frame.copy())) == 0
+
+    def test_small_change_metrics(self, frame):
+        """Test that a small redraw barely moves the mean but shows in the max."""
+        changed = frame.copy()
+        changed[10:14, 10:14] = 255
+        a, b = fingerprint(frame), fingerprint(changed)
+        assert fingerprint_difference(a, b, 'mean') < 1.0
+        assert fingerprint_difference(a, b, 'max') > 20
+
+    def test_large_change(self, frame):
+        """Test that a redrawn region is detected by the mean."""
+        changed = frame.copy()
+        changed[:, :100] = 0
+        assert fingerprint_difference(fingerprint(frame), fingerprint(changed)) > 10
+
+    def test_thumbnail_size(self, frame):
+        """Test that thumbnails are bounded and never upscaled."""
+        assert fingerprint(frame).shape == (64, 64)
+        assert fingerprint(frame[:10, :20]).shape == (10, 20)
+
+    def test_unknown_metric(self, frame):
+        """Test that unknown metrics are rejected."""
+        with pytest.raises(ValueError):
+            fingerprint_difference(fingerprint(frame), fingerprint(frame), 'median')
+
+
+class TestChangedTiles:
+    """Test cases for changed-tile tracking."""
+
+    def test_changed_tiles(self, frame):
+        """Test that only tiles containing a changed pixel are marked, including edge tiles."""
+        changed = frame.copy()
+        changed[5, 70, 1] += 1
+        changed[119, 199] = 0
+        tiles = changed_tiles(frame, changed, 32)
+        assert tiles.shape == (4, 7)
+        assert sorted(zip(*np.nonzero(tiles))) == [(0, 2), (3, 6)]
+        assert not changed_tiles(frame, frame.copy(), 32).any()
+
+    def test_odd_sized_strided_frames(self):
+        """Test frames whose rows do not pack into whole words, and strided views."""
+        rng = np.random.default_rng(0)
+        a = rng.integers(0, 256, (37, 106, 3), dtype=np.uint8)
+        b = a.copy()
+        b[20, 52, 2] ^= 1
+        tiles = changed_tiles(a[:, ::2], b[:, ::2], 16)
+        assert sorted(zip(*np.nonzero(tiles))) == [(1, 1)]
+
+    def test_tile_runs(self):
+        """Test that neighbouring marked tiles merge into one horizontal run."""
+        tiles = np.array([[True, True, False, True], [False, False, False, False]])
+        assert tile_runs(tiles, 10) == [(slice(0, 10), slice(0, 20)), (slice(0, 10), slice(30, 40))]
+
+    def test_tracker_first_frame(self, frame):
+        """Test that the first frame and size changes ask for a full rescan."""
+        tracker = DirtyTracker(32)
+        assert tracker.update(frame) is None
+        assert not tracker.update(frame).any()
+        assert tracker.update(frame[:50]) is None
+
+    def test_incremental_map(self, frame):
+        """Test that only dirty tiles are recomputed and the map matches a full pass."""
+        def compute(image):
+            return image[:, :, 0] > 128
+
+        incremental = IncrementalMap(compute, 32)
+        incremental.update(frame)
+        changed = frame.copy()
+        changed[40:45, 10:20] = 255
+        result = incremental.update(changed)
+        assert np.array_equal(result, compute(changed))
+        assert incremental.full_scans == 1
+        assert incremental.tiles_rescanned == 1
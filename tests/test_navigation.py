@@ -0,0 +1,54 @@
+"""Tests for shortest-path screen navigation."""
+
+import pytest
+
+from mactoro.navigation import ANY_SCREEN, ScreenGraph, Transition, check_transition
+
+
+def edge(source, target):
+    return Transition(source, target, [], 1.0, f"{source}->{target}")
+
+
+@pytest.fixture
+def graph():
+    """menu -> settings -> audio, menu -> game, game -> menu, and Escape from anywhere."""
+    return ScreenGraph([
+        edge("menu", "settings"),
+        edge("settings", "audio"),
+        edge("menu", "game"),
+        edge("game", "menu"),
+        edge(ANY_SCREEN, "menu"),
+    ])
+
+
+class TestScreenGraph:
+    """Test cases for ScreenGraph."""
+
+    def test_shortest_path(self, graph):
+        """Test that the route with the fewest transitions is found."""
+        route = graph.shortest_path("game", "audio")
+        assert [(t.source, t.target) for t in route] == [
+            ("game", "menu"), ("menu", "settings"), ("settings", "audio")]
+
+    def test_already_there(self, graph):
+        """Test that no transitions are needed to stay put."""
+        assert graph.shortest_path("menu", "menu") == []
+
+    def test_wildcard_recovery(self, graph):
+        """Test that an unrecognised screen routes through ANY_SCREEN transitions."""
+        route = graph.shortest_path(None, "settings")
+        assert [(t.source, t.target) for t in route] == [(ANY_SCREEN, "menu"), ("menu", "settings")]
+        route = graph.shortest_path("audio", "game")
+        assert [t.target for t in route] == ["menu", "game"]
+
+    def test_unreachable(self):
+        """Test that a target with no incoming route gives None."""
+        assert ScreenGraph([edge("menu", "settings")]).shortest_path("settings", "menu") is None
+
+    def test_check_transition(self):
+        """Test that transitions must name catalogued screens and list actions."""
+        check_transition({"from": "*", "to": "menu", "actions": []}, ["menu"], "t")
+        with pytest.raises(ValueError):
+            check_transition({"from": "menu", "to": "nowhere", "actions": []}, ["menu"], "t")
+        with pytest.raises(ValueError):
+            check_transition({"from": "menu", "to": "menu"}, ["menu"], "t")
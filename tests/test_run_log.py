@@ -0,0 +1,110 @@
+"""Tests for run logging and tracing."""
+
+import io
+import json
+from datetime import datetime
+
+from mactoro.run_log import DEBUG, INFO, WARNING, RunLogger, TraceWriter
+
+
+class TestTraceWriter:
+    """Test cases for TraceWriter."""
+
+    def test_writes_json_lines(self, tmp_path):
+        """Test that every record is written as one JSON line on close."""
+        path = tmp_path / "trace.jsonl"
+        writer = TraceWriter(str(path), batch_size=4)
+        for i in range(10):
+            writer.write({"path": f"actions[{i}]", "type": "click"})
+        writer.close()
+
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 10
+        assert json.loads(lines[3]) == {"path": "actions[3]", "type": "click"}
+        assert writer.records_written == 10
+
+    def test_unserializable_values(self, tmp_path):
+        """Test that non-JSON results are stringified instead of failing."""
+        path = tmp_path / "trace.jsonl"
+        with TraceWriter(str(path)) as writer:
+            writer.write({"result": object})
+
+        record = json.loads(path.read_text(encoding='utf-8'))
+        assert "object" in record["result"]
+
+    def test_epoch_timestamps_rendered_iso(self, tmp_path):
+        """Test that float timestamps are written as ISO times."""
+        path = tmp_path / "trace.jsonl"
+        with TraceWriter(str(path)) as writer:
+            writer.write({"timestamp": 1700000000.5, "type": "click"})
+
+        record = json.loads(path.read_text(encoding='utf-8'))
+        assert record["timestamp"] == datetime.fromtimestamp(1700000000.5).isoformat()
+
+    def test_appends_and_close_is_idempotent(self, tmp_path):
+        """Test that traces append to existing files and close can be repeated."""
+        path = tmp_path / "trace.jsonl"
+        path.write_text('{"existing": true}\n', encoding='utf-8')
+        writer = TraceWriter(str(path))
+        writer.write({"type": "wait"})
+        writer.close()
+        writer.close()
+
+        assert len(path.read_text(encoding='utf-8').splitlines()) == 2
+
+
+class TestRunLogger:
+    """Test cases for RunLogger."""
+
+    def test_level_filtering(self):
+        """Test that records below the level are dropped."""
+        stream = io.StringIO()
+        log = RunLogger(level=WARNING, stream=stream)
+        log.info("hidden")
+        log.debug("hidden")
+        log.warning("shown")
+        log.error("also shown")
+
+        assert stream.getvalue() == "shown\nalso shown\n"
+        assert log.is_enabled(WARNING) and not log.is_enabled(INFO)
+
+    def test_action_text_format(self):
+        """Test that action records get a timestamp and timing suffix."""
+        stream = io.StringIO()
+        log = RunLogger(level=DEBUG, stream=stream)
+        log.action("Click: (1, 2)", wait=0.5)
+        log.action("Click: (3, 4)", drift=0.0012)
+        log.action("Wait 1 seconds", default_wait=0.2)
+
+        lines = stream.getvalue().splitlines()
+        assert lines[0].startswith("[") and lines[0].endswith("] Click: (1, 2) (wait: 0.5 seconds)")
+        assert lines[1].endswith("Click: (3, 4) (drift: +1.2 ms)")
+        assert lines[2].endswith("Wait 1 seconds (default_wait: 0.2 seconds)")
+
+    def test_json_format(self):
+        """Test that JSON mode emits one object per record without empty fields."""
+        stream = io.StringIO()
+        log = RunLogger(json_output=True, stream=stream)
+        log.action("Click: (1, 2)", path="actions[0]", type="click", wait=None)
+
+        record = json.loads(stream.getvalue())
+        assert record["level"] == "info"
+        assert record["message"] == "Click: (1, 2)"
+        assert record["path"] == "actions[0]"
+        assert "wait" not in record
+
+    def test_sampling(self):
+        """Test that sample() passes one in every sample_every calls."""
+        log = RunLogger(sample_every=3)
+        assert [log.sample() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+    def test_background_writer_flushes_on_close(self):
+        """Test that buffered output is written in order when closed."""
+        stream = io.StringIO()
+        log = RunLogger(stream=stream, background=True)
+        for i in range(100):
+            log.info(f"line {i}")
+        log.close()
+
+        lines = stream.getvalue().splitlines()
+        assert lines == [f"line {i}" for i in range(100)]
@@ -0,0 +1,184 @@
+"""Tests for screen capture backends."""
+
+import time
+
+import numpy as np
+import pytest
+
+from mactoro.screen_capture import (
+    CaptureError, CaptureService, FakeCapture, FakeWindowCapture, capture_from_settings,
+    create_capture
+)
+
+
+class TestFakeCapture:
+    """Test cases for the in-memory frame source."""
+
+    @pytest.fixture
+    def frame(self):
+        """A 4x6 frame with a distinct color at (5, 3)."""
+        frame = np.zeros((4, 6, 3), dtype=np.uint8)
+        frame[3, 5] = (10, 20, 30)
+        return frame
+
+    def test_grab_full_frame(self, frame):
+        """Test that grabbing without a region returns the whole frame."""
+        capture = FakeCapture(frame)
+        assert capture.grab().shape == (4, 6, 3)
+        assert capture.grab_count == 1
+
+    def test_grab_region_is_view(self, frame):
+        """Test that regions are zero-copy views indexed [y, x]."""
+        capture = FakeCapture(frame)
+        region = capture.grab((4, 2, 2, 2))
+        assert region.shape == (2, 2, 3)
+        assert tuple(region[1, 1]) == (10, 20, 30)
+        assert np.shares_memory(region, frame)
+
+    def test_pixel(self, frame):
+        """Test reading a single point."""
+        capture = FakeCapture(frame)
+        assert capture.pixel(5, 3) == (10, 20, 30)
+        assert capture.pixel(0, 0) == (0, 0, 0)
+
+    def test_sample_pixels_single_capture(self, frame):
+        """Test that several points are read from one bounding-box capture."""
+        capture = FakeCapture(frame)
+        samples = capture.sample_pixels([(5, 3), (0, 0), (4, 1)])
+        assert samples.tolist() == [[10, 20, 30], [0, 0, 0], [0, 0, 0]]
+        assert capture.grab_count == 1
+
+    def test_region_outside_frame(self, frame):
+        """Test that regions past the frame edge are rejected."""
+        capture = FakeCapture(frame)
+        with pytest.raises(CaptureError):
+            capture.grab((5, 3, 2, 2))
+
+    def test_sequence_advances_and_holds(self):
+        """Test that each grab advances one frame and the last frame is held."""
+        capture = FakeCapture([
+            FakeCapture.solid(2, 2, (255, 0, 0)).frame,
+            FakeCapture.solid(2, 2, (0, 255, 0)).frame,
+        ])
+        assert capture.pixel(0, 0) == (255, 0, 0)
+        assert capture.pixel(0, 0) == (0, 255, 0)
+        assert capture.pixel(0, 0) == (0, 255, 0)
+
+    def test_rejects_non_rgb_frames(self):
+        """Test that frames must be HxWx3."""
+        with pytest.raises(ValueError):
+            FakeCapture(np.zeros((2, 2, 4), dtype=np.uint8))
+
+
+class TestCaptureService:
+    """Test cases for the background capture service."""
+
+    @pytest.fixture
+    def frames(self):
+        """Three solid 20x10 frames: red, green, blue."""
+        return [FakeCapture.solid(20, 10, color).frame
+                for color in [(255, 0, 0), (0, 255, 0), (0, 0, 255)]]
+
+    def test_latest_frame_advances(self, frames):
+        """Test that frames arrive in the background with increasing ids."""
+        service = CaptureService(FakeCapture(frames), fps=200).start()
+        try:
+            first = service.latest()
+            assert first.frame_id == 1
+            frame = service.wait_for_frame(first.frame_id, timeout=2)
+            assert frame.frame_id > first.frame_id
+            assert frame.timestamp >= first.timestamp
+        finally:
+            service.close()
+
+    def test_grab_reads_cached_frame(self, frames):
+        """Test that consumers crop the latest frame instead of capturing."""
+        backend = FakeCapture(frames)
+        service = CaptureService(backend, fps=1, region=(5, 2, 10, 6)).start()
+        try:
+            assert service.pixel(6, 3) == (255, 0, 0)
+            assert service.sample_pixels([(5, 2), (14, 7)]).shape == (2, 3)
+            assert backend.grab_count == 1
+            assert service.fallbacks == 0
+        finally:
+            service.close()
+
+    def test_outside_region_falls_back(self, frames):
+        """Test that requests outside the service region grab directly."""
+        backend = FakeCapture(frames)
+        service = CaptureService(backend, fps=1, region=(5, 2, 10, 6)).start()
+        try:
+            assert service.grab((0, 0, 3, 3)).shape == (3, 3, 3)
+            assert service.fallbacks == 1
+            assert backend.grab_count == 2
+        finally:
+            service.close()
+
+    def test_slow_reader_keeps_its_frame(self):
+        """Test that a fast capture thread never rewrites a frame a reader holds."""
+        class Counting(FakeCapture):
+            def grab(self, region=None):
+                self.set_frame(np.full((200, 300, 3), self.grab_count % 256, dtype=np.uint8))
+                return super().grab(region)
+
+        service = CaptureService(Counting(np.zeros((1, 1, 3))), fps=1000).start()
+        try:
+            for _ in range(5):
+                frame = service.grab()
+                first = int(frame[0, 0, 0])
+                time.sleep(0.02)
+                assert frame.min() == frame.max() == first
+            assert service.latest().frame_id > 5
+        finally:
+            service.close()
+
+    def test_not_started(self, frames):
+        """Test that grabbing before start is an error."""
+        with pytest.raises(CaptureError):
+            CaptureService(FakeCapture(frames)).grab()
+
+
+class TestCreateCapture:
+    """Test cases for backend selection."""
+
+    def test_unknown_backend(self):
+        """Test that unknown backend names are rejected."""
+        with pytest.raises(ValueError):
+            create_capture('vnc')
+
+
+class TestWindowCapture:
+    """Test cases for capturing a single window."""
+
+    @pytest.fixture
+    def window(self):
+        """A 30x20 window at (100, 50) with a marker at window pixel (4, 3)."""
+        frame = FakeCapture.solid(30, 20, (255, 255, 255)).frame
+        frame[3, 4] = (0, 0, 255)
+        return FakeWindowCapture(frame, (100, 50, 30, 20), window_id=42)
+
+    def test_screen_coordinates(self, window):
+        """Test that screen points are translated into the window's frame."""
+        assert window.pixel(104, 53) == (0, 0, 255)
+        assert window.grab((100, 50, 10, 5)).shape == (5, 10, 3)
+        assert window.grab().shape == (20, 30, 3)
+
+    def test_origin(self, window):
+        """Test that whole-window frames report the window corner as their origin."""
+        assert window.origin == (100, 50)
+        assert FakeCapture.solid(10, 10).origin == (0, 0)
+        service = CaptureService(window, fps=50).start()
+        try:
+            assert service.origin == (100, 50)
+        finally:
+            service.close()
+
+    def test_outside_window(self, window):
+        """Test that regions past the window edge are rejected."""
+        with pytest.raises(CaptureError):
+            window.grab((95, 50, 10, 10))
+
+    def test_settings_need_target_window(self):
+        """Test that the window backend cannot be built without a window."""
+        with pytest.raises(ValueError):
+            capture_from_settings({"capture": {"backend": "window"}})
@@ -0,0 +1,122 @@
+"""Tests for the perceptual-hash screen catalogue."""
+
+import cv2
+import numpy as np
+import pytest
+
+from mactoro.screen_catalog import (
+    HASH_BITS, ScreenCatalog, ScreenMatch, best_match, hamming_distances, phash
+)
+
+
+def layout(seed, width=320, height=200):
+    """A smooth random 'screen' whose layout depends on seed."""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return cv2.resize(blocks, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def plain(split):
+    """A flat white screen with its bottom ('rows') or right ('columns') half black."""
+    screen = np.full((200, 320, 3), 255, dtype=np.uint8)
+    if split == 'rows':
+        screen[100:] = 0
+    else:
+        screen[:, 160:] = 0
+    return screen
+
+
+@pytest.fixture
+def catalog():
+    """Three whole screens and one identified by a region."""
+    catalog = ScreenCatalog()
+    for name, seed in [("menu", 1), ("settings", 2), ("game", 3)]:
+        catalog.add(name, layout(seed))
+    catalog.add("dialog", layout(4), region=(40, 40, 120, 80))
+    return catalog
+
+
+class TestPhash:
+    """Test cases for phash and hamming_distances."""
+
+    def test_stable_under_scaling_and_noise(self):
+        """Test that a rescaled, noisy copy keeps nearly the same hash."""
+        screen = layout(1)
+        noisy = cv2.resize(screen, (640, 400)).astype(np.int16)
+        noisy += np.random.default_rng(0).integers(-6, 7, noisy.shape, dtype=np.int16)
+        noisy = np.clip(noisy, 0, 255).astype(np.uint8)
+        assert hamming_distances(phash(screen), np.array([phash(noisy)], dtype=np.uint64))[0] <= 4
+
+    def test_different_layouts(self):
+        """Test that different screens are far apart."""
+        distance = hamming_distances(phash(layout(1)), np.array([phash(layout(2))], dtype=np.uint64))
+        assert distance[0] > 16
+
+    def test_hamming_distances(self):
+        """Test bit counting against several hashes at once."""
+        hashes = np.array([0, 0b1011, 2 ** 64 - 1], dtype=np.uint64)
+        assert hamming_distances(0b1, hashes).tolist() == [1, 2, HASH_BITS - 1]
+
+
+class TestScreenCatalog:
+    """Test cases for ScreenCatalog."""
+
+    def test_classify_whole_screens(self, catalog):
+        """Test that a capture is ranked closest to its own screen."""
+        ranked = catalog.classify(layout(2))
+        assert ranked[0] == ("settings", 0)
+        assert len(ranked) == 4
+
+    def test_classify_region(self, catalog):
+        """Test that a screen identified by a region ignores the rest of the frame."""
+        frame = layout(3)
+        frame[40:120, 40:160] = layout(4)[40:120, 40:160]
+        assert catalog.classify(frame)[0] == ("dialog", 0)
+
+    def test_restrict_names(self, catalog):
+        """Test that classification can be limited to some screens."""
+        assert {match.name for match in catalog.classify(layout(2), ["menu", "game"])} == {"menu", "game"}
+
+    def test_region_outside_capture(self, catalog):
+        """Test that a capture too small for a region cannot match it."""
+        ranked = dict(catalog.classify(layout(4)[:30, :30]))
+        assert ranked["dialog"] == HASH_BITS
+
+    def test_duplicate_name(self, catalog):
+        """Test that screen names are unique."""
+        with pytest.raises(ValueError):
+            catalog.add("menu", layout(9))
+
+    def test_from_config(self, tmp_path):
+        """Test building from the configuration's screens block."""
+        path = tmp_path / "menu.png"
+        cv2.imwrite(str(path), cv2.cvtColor(layout(1, 640, 400), cv2.COLOR_RGB2BGR))
+        catalog = ScreenCatalog.from_config({
+            "menu": {"image": str(path), "region": [0, 0, 160, 100], "scale": 2}
+        })
+        best = catalog.classify(layout(1))[0]
+        assert best.name == "menu" and best.distance <= 4
+        with pytest.raises(ValueError):
+            ScreenCatalog.from_config({"missing": {"image": str(tmp_path / "none.png")}})
+
+    def test_similar_plain_screens(self):
+        """Test that two flat screens a capture sits between are not guessed at."""
+        catalog = ScreenCatalog()
+        catalog.add("rows", plain('rows'))
+        catalog.add("columns", plain('columns'))
+        assert [pair[:2] for pair in catalog.close_pairs()] == [("rows", "columns")]
+
+        between = ((plain('rows').astype(int) + plain('columns')) // 2).astype(np.uint8)
+        ranked = catalog.classify(between)
+        assert ranked[0].distance <= 10
+        assert best_match(ranked) is None
+        assert best_match(catalog.classify(plain('rows'))).name == "rows"
+
+    def test_best_match(self):
+        """Test the distance limit and the margin over the runner-up."""
+        assert best_match([ScreenMatch("a", 2), ScreenMatch("b", 9)]) == ("a", 2)
+        assert best_match([ScreenMatch("a", 2), ScreenMatch("b", 3)]) is None
+        assert best_match([ScreenMatch("a", 2), ScreenMatch("b", 3)], min_margin=1) == ("a", 2)
+        assert best_match([ScreenMatch("a", 11)]) is None
+        assert best_match([]) is None
+        assert not ScreenCatalog().close_pairs()
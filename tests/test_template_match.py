@@ -0,0 +1,83 @@
+"""Tests for pyramid template matching."""
+
+import cv2
+import numpy as np
+import pytest
+
+from mactoro.template_match import Template, match_template
+
+
+@pytest.fixture
+def screen():
+    """A 640x400 textured RGB frame."""
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 256, (50, 80, 3), dtype=np.uint8)
+    return cv2.resize(noise, (640, 400), interpolation=cv2.INTER_LINEAR)
+
+
+class TestMatchTemplate:
+    """Test cases for match_template."""
+
+    def test_finds_template_with_pyramid(self, screen):
+        """Test that the coarse-to-fine search lands on the exact position."""
+        template = Template(screen[220:268, 300:380])
+        assert template.auto_levels() > 1
+
+        match = match_template(screen, template, threshold=0.9)
+        assert (match.x, match.y, match.width, match.height) == (300, 220, 80, 48)
+        assert match.center == (340, 244)
+        assert match.score > 0.99
+
+    def test_single_level_agrees(self, screen):
+        """Test that a full-resolution search finds the same match."""
+        template = Template(screen[40:80, 500:560])
+        assert match_template(screen, template, levels=1)[:2] == (500, 40)
+        assert match_template(screen, template)[:2] == (500, 40)
+
+    def test_absent_template(self, screen):
+        """Test that a template from another image is not matched."""
+        rng = np.random.default_rng(1)
+        other = rng.integers(0, 256, (48, 80, 3), dtype=np.uint8)
+        assert match_template(screen, Template(other), threshold=0.9) is None
+
+    def test_template_larger_than_frame(self, screen):
+        """Test that an oversized template is simply not found."""
+        assert match_template(screen[:20, :20], Template(screen[:40, :40])) is None
+
+    def test_mask_ignores_covered_pixels(self, screen):
+        """Test that masked-out pixels do not lower the score."""
+        template_image = screen[100:160, 100:200].copy()
+        mask = np.full(template_image.shape[:2], 255, dtype=np.uint8)
+        mask[:20, :20] = 0
+        changed = screen.copy()
+        changed[100:120, 100:120] = 0
+
+        assert match_template(changed, Template(template_image), threshold=0.99) is None
+        match = match_template(changed, Template(template_image, mask), threshold=0.99)
+        assert match[:2] == (100, 100)
+
+
+class TestTemplateLoad:
+    """Test cases for loading templates from disk."""
+
+    def test_alpha_channel_becomes_mask(self, screen, tmp_path):
+        """Test that transparent pixels of a PNG are masked out."""
+        bgra = cv2.cvtColor(np.ascontiguousarray(screen[:40, :60]), cv2.COLOR_RGB2BGRA)
+        bgra[:10, :10, 3] = 0
+        path = tmp_path / "button.png"
+        cv2.imwrite(str(path), bgra)
+
+        template = Template.load(str(path))
+        assert template.size == (60, 40)
+        assert template.mask is not None and template.mask[0, 0] == 0
+
+    def test_scale(self, screen, tmp_path):
+        """Test that Retina captures can be scaled to screen points."""
+        path = tmp_path / "retina.png"
+        cv2.imwrite(str(path), screen[:80, :120])
+        assert Template.load(str(path), scale=0.5).size == (60, 40)
+
+    def test_missing_file(self, tmp_path):
+        """Test that unreadable images raise ValueError."""
+        with pytest.raises(ValueError, match="Cannot read image"):
+            Template.load(str(tmp_path / "missing.png"))
@@ -0,0 +1,97 @@
+"""Tests for the template store."""
+
+import cv2
+import numpy as np
+import pytest
+
+from mactoro.template_store import TemplateStore
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Three 64x64 template images on disk."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"template{i}.png"
+        cv2.imwrite(str(path), rng.integers(0, 256, (64, 64, 3), dtype=np.uint8))
+        paths.append(str(path))
+    return paths
+
+
+class TestTemplateStore:
+    """Test cases for TemplateStore."""
+
+    def test_hits_skip_loading(self, images):
+        """Test that a template is decoded once and then served from memory."""
+        store = TemplateStore()
+        key = TemplateStore.key(images[0])
+        first = store.get(key)
+        assert store.get(key) is first
+        assert (store.hits, store.misses) == (1, 1)
+        assert len(first.pyramid(first.auto_levels())) == first.auto_levels()
+
+    def test_lru_eviction(self, images):
+        """Test that the least recently used template is evicted over budget."""
+        store = TemplateStore()
+        keys = [TemplateStore.key(path) for path in images]
+        store.get(keys[0])
+        store.max_bytes = store.bytes * 2
+
+        store.get(keys[1])
+        store.get(keys[0])
+        store.get(keys[2])
+        assert keys[1] not in store
+        assert keys[0] in store and keys[2] in store
+        assert store.evictions == 1
+        assert store.bytes <= store.max_bytes
+
+    def test_pyramid_growth_is_charged(self, images):
+        """Test that deeper pyramids built after loading count against the budget."""
+        store = TemplateStore()
+        keys = [TemplateStore.key(path) for path in images]
+        first = store.get(keys[0])
+        loaded = store.bytes
+
+        deeper = first.auto_levels() + 2
+        assert len(store.get(keys[0], deeper).pyramid(deeper)) == deeper
+        assert store.bytes == first.nbytes > loaded
+
+        second = store.get(keys[1])
+        second.pyramid(second.auto_levels() + 2)
+        store.max_bytes = first.nbytes + second.nbytes - 1
+        store.get(keys[1])
+        assert keys[0] not in store
+        assert store.bytes == second.nbytes
+
+    def test_disk_cache(self, images, tmp_path):
+        """Test that preprocessed pyramids are reused by a later store."""
+        cache_dir = tmp_path / "cache"
+        key = TemplateStore.key(images[0])
+        original = TemplateStore(cache_dir=str(cache_dir)).get(key)
+
+        store = TemplateStore(cache_dir=str(cache_dir))
+        cached = store.get(key)
+        assert store.disk_hits == 1
+        levels = original.auto_levels()
+        for (gray, _), (cached_gray, cached_mask) in zip(original.pyramid(levels), cached.pyramid(levels)):
+            assert np.array_equal(gray, cached_gray)
+            assert cached_mask is None
+
+    def test_corrupt_cache_file(self, images, tmp_path):
+        """Test that an unreadable cache file falls back to the image."""
+        cache_dir = tmp_path / "cache"
+        key = TemplateStore.key(images[0])
+        TemplateStore(cache_dir=str(cache_dir)).get(key)
+        for cached in cache_dir.iterdir():
+            cached.write_bytes(b"not a zip")
+
+        store = TemplateStore(cache_dir=str(cache_dir))
+        assert store.get(key).size == (64, 64)
+        assert store.disk_hits == 0
+
+    def test_missing_image(self, tmp_path):
+        """Test that missing images raise even with a disk cache."""
+        store = TemplateStore(cache_dir=str(tmp_path))
+        with pytest.raises(ValueError, match="Cannot read image"):
+            store.get(TemplateStore.key(str(tmp_path / "missing.png")))
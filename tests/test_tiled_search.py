@@ -0,0 +1,102 @@
+"""Tests for banded parallel search."""
+
+import numpy as np
+import pytest
+
+from mactoro.color_search import color_mask, first_hit
+from mactoro.template_match import Template, match_template
+from mactoro.tiled_search import TiledSearch
+
+
+@pytest.fixture
+def tiles():
+    """Four threads with bands as short as 8 rows."""
+    tiles = TiledSearch(4, min_band_rows=8)
+    yield tiles
+    tiles.close()
+
+
+@pytest.fixture
+def frame():
+    """A 100x160 noise frame with three magenta targets."""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 200, (100, 160, 3), dtype=np.uint8)
+    for x, y in [(120, 30), (10, 31), (70, 90)]:
+        frame[y:y + 3, x:x + 3] = (250, 10, 250)
+    return frame
+
+
+def compute(frame):
+    return color_mask(frame, (250, 10, 250), 5)
+
+
+class TestTiledSearch:
+    """Test cases for TiledSearch."""
+
+    def test_bands_overlap(self, tiles):
+        """Test that bands cover every row and neighbours share the overlap."""
+        bands = tiles.bands(100, overlap=5)
+        assert bands[0][0] == 0 and bands[-1][1] == 100
+        for (_, bottom), (top, _) in zip(bands, bands[1:]):
+            assert bottom - top == 5
+
+    def test_single_thread_is_inline(self):
+        """Test that one thread searches the whole frame at once."""
+        assert TiledSearch(1).bands(5000) == [(0, 5000)]
+
+    def test_mask_matches_whole_frame(self, tiles, frame):
+        """Test that a banded mask equals the mask of the whole frame."""
+        assert np.array_equal(tiles.mask(frame, compute), compute(frame))
+
+    def test_first_is_row_major(self, tiles, frame):
+        """Test that the topmost band's first hit is the frame's first hit."""
+        top, (x, y) = tiles.first(frame, lambda band: first_hit(compute(band)))
+        assert (x, y + top) == first_hit(compute(frame)) == (120, 30)
+
+    def test_nearest(self, tiles, frame):
+        """Test that the nearest hit across bands is the frame's nearest hit."""
+        def search(band, near):
+            return first_hit(compute(band), 'nearest', near)
+
+        for near in [(0, 0), (80, 80), (159, 99)]:
+            assert tiles.nearest(frame, search, near) == first_hit(compute(frame), 'nearest', near)
+
+    def test_no_match(self, tiles, frame):
+        """Test that a search matching nowhere returns None."""
+        assert tiles.first(frame, lambda band: None) is None
+
+    def test_template_across_band_edges(self, tiles, frame):
+        """Test that templates straddling a band boundary are still found."""
+        template = Template(frame[40:64, 50:80].copy())
+        template.pyramid(1)
+        found = tiles.first(frame, lambda band: match_template(band, template, 0.99, 1),
+                            overlap=template.size[1] - 1)
+        top, match = found
+        assert (match.x, match.y + top) == (50, 40)
+        assert match_template(frame, template, 0.99, 1)[:2] == (50, 40)
+
+    def test_best_template_score_wins(self, tiles):
+        """Test that a better match lower down beats a weaker one above it."""
+        rng = np.random.default_rng(1)
+        frame = rng.integers(0, 200, (120, 160, 3), dtype=np.uint8)
+        patch = rng.integers(0, 256, (16, 20, 3), dtype=np.uint8)
+        frame[10:26, 30:50] = np.clip(patch.astype(int) + rng.integers(-40, 40, patch.shape), 0, 255)
+        frame[90:106, 100:120] = patch
+        template = Template(patch)
+        template.pyramid(1)
+
+        def search(band):
+            return match_template(band, template, 0.5, 1)
+
+        single = TiledSearch(1)
+        whole_top, whole = single.best(frame, search, lambda match: match.score)
+        top, match = tiles.best(frame, search, lambda match: match.score, overlap=15)
+        assert (match.x, match.y + top) == (whole.x, whole.y + whole_top) == (100, 90)
+        assert tiles.first(frame, search, overlap=15)[0] < 90
+
+    def test_threads_from_settings(self):
+        """Test that the search block sets the thread count."""
+        tiles = TiledSearch.from_settings({"search": {"threads": 3}})
+        assert tiles.threads == 3
+        tiles.close()
+        assert TiledSearch.from_settings({}).threads == 1
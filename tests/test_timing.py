@@ -0,0 +1,211 @@
+"""Tests for timing helpers."""
+
+import threading
+import time
+
+import pytest
+
+from mactoro.timing import (
+    Deadline, DeadlineExceeded, Pacer, Poller, ProbeBudgetExceeded, Timeline, Watchdog, scale_wait,
+    timeline_offsets
+)
+
+
+class TestScaleWait:
+    """Test cases for scale_wait."""
+
+    def test_scales_by_speed(self):
+        """Test that waits are divided by the speed factor."""
+        assert scale_wait(2.0, 4) == 0.5
+        assert scale_wait(None, 4) is None
+
+    def test_min_wait_floor(self):
+        """Test that min_wait keeps fragile steps from being compressed too far."""
+        assert scale_wait(2.0, 10, min_wait=0.5) == 0.5
+        assert scale_wait(2.0, 2, min_wait=0.5) == 1.0
+
+    def test_min_wait_never_lengthens(self):
+        """Test that the floor never exceeds the recorded wait."""
+        assert scale_wait(0.2, 4, min_wait=1.0) == 0.2
+
+
+class TestTimelineOffsets:
+    """Test cases for timeline_offsets."""
+
+    def test_offsets_from_recorded_offset(self):
+        """Test that explicit offsets are used as-is."""
+        actions = [{"type": "click", "offset": 0.5}, {"type": "click", "offset": 2.25}]
+        assert timeline_offsets(actions) == [0.5, 2.25]
+
+    def test_offsets_from_waits(self):
+        """Test that older recordings accumulate their waits."""
+        actions = [{"type": "click"}, {"type": "click", "wait": 1.5}, {"type": "type", "wait": 0.5}]
+        assert timeline_offsets(actions) == [0.0, 1.5, 2.0]
+
+    def test_mixed_offsets_and_waits(self):
+        """Test that waits continue from the last explicit offset."""
+        actions = [{"type": "click", "offset": 3.0}, {"type": "click", "wait": 1.0}]
+        assert timeline_offsets(actions) == [3.0, 4.0]
+
+    def test_offsets_with_speed(self):
+        """Test that gaps are compressed by speed and honour min_wait."""
+        actions = [
+            {"type": "click", "offset": 1.0},
+            {"type": "click", "offset": 3.0, "min_wait": 1.5},
+            {"type": "click", "offset": 4.0},
+        ]
+        assert timeline_offsets(actions, speed=4) == [0.25, 1.75, 2.0]
+
+
+class TestTimeline:
+    """Test cases for Timeline."""
+
+    def test_wait_until_is_absolute(self):
+        """Test that time spent between waits is subtracted from the schedule."""
+        timeline = Timeline()
+        timeline.start()
+        timeline.wait_until(0.01)
+        time.sleep(0.02)  # An action that overruns the next slot
+        drift = timeline.wait_until(0.02)
+        assert drift > 0.005  # Already late, so no extra sleep
+
+        drift = timeline.wait_until(0.06)
+        assert 0 <= drift < 0.005
+        assert abs(timeline.elapsed() - 0.06) < 0.01
+        assert len(timeline.drifts) == 3
+
+    def test_wait_until_interrupted(self):
+        """Test that setting the stop event aborts the wait."""
+        stop_event = threading.Event()
+        timeline = Timeline(stop_event)
+        timeline.start()
+        threading.Timer(0.02, stop_event.set).start()
+
+        start = time.monotonic()
+        assert timeline.wait_until(10) is None
+        assert time.monotonic() - start < 1
+
+    def test_summary(self):
+        """Test drift summary formatting."""
+        timeline = Timeline()
+        assert "no actions" in timeline.summary()
+        timeline.drifts = [0.001, 0.003]
+        assert timeline.summary() == "Timeline drift: mean +2.00 ms, max +3.00 ms over 2 actions"
+
+
+class TestPacer:
+    """Test cases for Pacer."""
+
+    def test_from_settings_defaults_to_default_wait(self):
+        """Test that default_wait becomes the per-action delay."""
+        pacer = Pacer.from_settings({"default_wait": 0.5})
+        assert pacer.action_delay == 0.5
+        assert pacer.event_delay is None
+        assert pacer.window_cooldown == 0
+
+    def test_from_settings_pacing_block(self):
+        """Test that an explicit pacing block overrides default_wait."""
+        pacer = Pacer.from_settings({
+            "default_wait": 0.5,
+            "pacing": {"action_delay": 0.1, "event_delay": 0.02, "window_cooldown": 0.3}
+        })
+        assert (pacer.action_delay, pacer.event_delay, pacer.window_cooldown) == (0.1, 0.02, 0.3)
+
+    def test_window_cooldown(self):
+        """Test that cooldown is tracked per window."""
+        pacer = Pacer(window_cooldown=0.2)
+        assert pacer.cooldown_remaining(1) == 0
+        pacer.mark_input(1)
+
+        assert 0.1 < pacer.cooldown_remaining(1) <= 0.2
+        assert pacer.cooldown_remaining(2) == 0
+        time.sleep(0.2)
+        assert pacer.cooldown_remaining(1) == 0
+
+
+class TestPoller:
+    """Test cases for Poller."""
+
+    def test_from_settings(self):
+        """Test that the poll block configures the strategy and budget."""
+        poller = Poller.from_settings({"poll": {"strategy": "backoff", "interval": 0.02,
+                                                "max_interval": 0.1, "budget": 50}})
+        assert (poller.strategy, poller.interval, poller.max_interval, poller.budget) == \
+            ("backoff", 0.02, 0.1, 50)
+        assert Poller.from_settings({}).strategy == "fixed"
+
+    def test_unknown_strategy(self):
+        """Test that unknown strategies are rejected."""
+        with pytest.raises(ValueError):
+            Poller("random")
+
+    def test_intervals(self):
+        """Test fixed, capped exponential and change-resetting intervals."""
+        assert Poller("fixed", 0.01).next_interval(0.04) == 0.01
+        backoff = Poller("backoff", 0.01, max_interval=0.03)
+        assert backoff.next_interval(0.01) == 0.02
+        assert backoff.next_interval(0.02, changed=True) == 0.03
+        adaptive = Poller("adaptive", 0.01)
+        assert adaptive.next_interval(0.04) == 0.08
+        assert adaptive.next_interval(0.04, changed=True) == 0.01
+
+    def test_budget(self):
+        """Test that probes past the run budget raise."""
+        poller = Poller(budget=2)
+        poller.count_probe()
+        poller.count_probe()
+        with pytest.raises(ProbeBudgetExceeded):
+            poller.count_probe()
+        assert poller.probes == 2
+
+
+class TestDeadline:
+    """Test cases for Deadline and Watchdog."""
+
+    def test_unbounded_deadline(self):
+        """Test that a deadline without a budget never expires."""
+        deadline = Deadline(None)
+        assert not deadline.expired()
+        deadline.check()
+
+    def test_child_is_bounded_by_parent(self):
+        """Test that a nested timeout cannot outlive the run budget."""
+        parent = Deadline(0.05, 'max_runtime')
+        child = parent.child(10, 'actions[0]')
+        assert child.expires_at == parent.expires_at
+
+        time.sleep(0.06)
+        with pytest.raises(DeadlineExceeded, match="max_runtime"):
+            child.check()
+
+    def test_child_reports_itself_when_first_to_expire(self):
+        """Test that the tighter budget is named in the error."""
+        parent = Deadline(10, 'max_runtime')
+        child = parent.child(0.01, 'actions[2]')
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded, match=r"actions\[2\] \(0.01 seconds\)"):
+            child.check()
+
+    def test_watchdog_fires_once(self):
+        """Test that the watchdog reports an expired deadline exactly once."""
+        fired = []
+        watchdog = Watchdog(fired.append, interval=0.01).start()
+        deadline = Deadline(0.02, 'step')
+        watchdog.watch(deadline)
+        watchdog.watch(Deadline(10, 'other'))
+        time.sleep(0.1)
+        watchdog.stop()
+
+        assert fired == [deadline]
+
+    def test_watchdog_unwatch(self):
+        """Test that finished steps are no longer watched."""
+        fired = []
+        watchdog = Watchdog(fired.append, interval=0.01).start()
+        deadline = Deadline(0.02, 'step')
+        watchdog.watch(deadline)
+        watchdog.unwatch(deadline)
+        time.sleep(0.05)
+        watchdog.stop()
+
+        assert fired == []
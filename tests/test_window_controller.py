@@ -1,8 +1,21 @@
 """Tests for WindowController module."""
 
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import json
+from mactoro.execution_plan import PlanError
+from mactoro.navigation import NavigationError
+from mactoro.run_log import DEBUG, WARNING, RunLogger
+from mactoro.screen_capture import FakeCapture, FakeWindowCapture
+from mactoro.screen_catalog import ScreenCatalog
+from mactoro.template_match import match_template
+from mactoro.timing import DeadlineExceeded, Pacer, Poller, ProbeBudgetExceeded
 from mactoro.window_controller import WindowController
 
 
@@ -137,15 +150,49 @@ class TestWindowController:
         controller.execute_action(action, None)
         mock_hotkey.assert_called_once_with("cmd", "c")
 
-    @patch('time.sleep')
-    def test_execute_wait_action(self, mock_sleep, controller):
+    @patch('pyautogui.hotkey')
+    def test_hotkey_uses_event_delay(self, mock_hotkey, controller):
+        """Test that a configured event delay spaces the keys of a hotkey."""
+        controller.pacer = Pacer(event_delay=0.02)
+        controller.execute_action({"type": "hotkey", "keys": ["cmd", "v"]})
+        mock_hotkey.assert_called_once_with("cmd", "v", interval=0.02)
+
+    def test_execute_wait_action(self, controller):
         """Test executing wait action."""
+        controller._stop_event = Mock()
+        controller._stop_event.is_set.return_value = False
+        controller._stop_event.wait.return_value = False
         action = {
             "type": "wait",
             "seconds": 2.5
         }
-        controller.execute_action(action, None)
-        mock_sleep.assert_called_once_with(2.5)
+        controller.execute_action(action)
+        controller._stop_event.wait.assert_called_once_with(2.5)
+
+    def test_stop_interrupts_wait(self, controller):
+        """Test that stopping the run wakes a long wait immediately."""
+        threading.Timer(0.05, controller.stop).start()
+        start = time.monotonic()
+        controller.execute_action({"type": "wait", "seconds": 30})
+
+        assert time.monotonic() - start < 1
+        assert controller.running is False
+
+    @patch('mactoro.window_controller.WindowController.take_window_screenshot')
+    def test_action_timeout_bounds_nested_loop(self, mock_screenshot, controller):
+        """Test that a per-action timeout aborts a long loop from inside."""
+        action = {
+            "type": "loop",
+            "max_iterations": 100000,
+            "timeout": 0.1,
+            "actions": [{"type": "wait", "seconds": 0.02}]
+        }
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            controller.execute_action(action)
+
+        assert time.monotonic() - start < 1
+        mock_screenshot.assert_called_once()
 
     def test_execute_invalid_action(self, controller):
         """Test executing invalid action type."""
@@ -195,4 +242,482 @@ class TestWindowController:
         
         # Should succeed on third check
         controller.execute_action(action, None)
-        assert mock_pixel.call_count == 3
\ No newline at end of file
+        assert mock_pixel.call_count == 3
+
+    def test_probe_condition_single_capture(self, controller):
+        """Test that probing a condition captures once and returns immediately."""
+        controller.capture = FakeCapture.solid(50, 50, (255, 0, 0))
+
+        condition = {"type": "color_match", "x": 10, "y": 20, "color": [0, 255, 0]}
+        assert controller.probe_condition(condition) is False
+        assert controller.capture.grab_count == 1
+
+    def test_wait_for_color_reads_capture_backend(self, controller):
+        """Test that wait_for_color polls frames until the color appears."""
+        red = FakeCapture.solid(50, 50, (255, 0, 0)).frame
+        green = FakeCapture.solid(50, 50, (0, 255, 0)).frame
+        controller.capture = FakeCapture([red, red, green])
+
+        condition = {"type": "color_match", "x": 10, "y": 20, "color": [0, 255, 0]}
+        assert controller.wait_for_condition(condition, timeout=5) is True
+        assert controller.capture.grab_count == 3
+
+    def test_wait_for_condition_counts_probes(self, controller):
+        """Test that adaptive polling backs off on a static screen and charges the run budget."""
+        controller.capture = FakeCapture.solid(50, 50, (255, 0, 0))
+        controller.poller = Poller("adaptive", interval=0.001, max_interval=0.004)
+        condition = {"type": "color_match", "x": 10, "y": 20, "color": [0, 255, 0]}
+
+        with patch.object(controller, 'sleep', return_value=True) as mock_sleep:
+            assert controller.wait_for_condition(condition, timeout=0.05) is False
+        pauses = [call.args[0] for call in mock_sleep.call_args_list]
+        assert pauses[:4] == [0.001, 0.002, 0.004, 0.004]
+        assert controller.poller.waits == 1
+        assert controller.poller.max_probes == controller.poller.probes
+
+        controller.poller = Poller(interval=0.001, budget=3)
+        with pytest.raises(ProbeBudgetExceeded):
+            controller.wait_for_condition(condition, timeout=5)
+        assert controller.poller.probes == 3
+
+    def test_loop_until_is_paced_and_budgeted(self, controller):
+        """Test that an empty loop_until waits between checks and charges each one."""
+        controller.capture = FakeCapture.solid(50, 50, (255, 0, 0))
+        controller.screenshot_on_error = False
+        action = {"type": "loop_until", "timeout": 0.5, "actions": [],
+                  "condition": {"type": "color_match", "x": 10, "y": 20, "color": [0, 255, 0]}}
+
+        controller.poller = Poller("backoff", interval=0.001, budget=5)
+        with pytest.raises(ProbeBudgetExceeded):
+            controller.execute_action(action)
+        assert controller.poller.probes == 5
+
+        controller.poller = Poller(interval=0.05)
+        controller.capture.grab_count = 0
+        controller.execute_action(dict(action, timeout=0.2))
+        assert controller.capture.grab_count <= 6
+        assert controller.poller.probes == controller.capture.grab_count
+
+    def test_debug_messages_skipped_when_disabled(self, controller):
+        """Test that hot-path debug messages are not even built above debug level."""
+        controller.capture = FakeCapture.solid(50, 50, (255, 0, 0))
+        condition = {"type": "color_match", "x": 10, "y": 20, "color": [0, 255, 0]}
+        with patch.object(controller.log, 'debug') as mock_debug:
+            controller.wait_for_condition(condition, timeout=0.01)
+            controller.execute_action({"type": "click_on_color", "color": [0, 255, 0]})
+            controller.execute_action({"type": "find_colors", "palette": [{"color": [0, 255, 0]}]})
+        mock_debug.assert_not_called()
+
+    def test_log_level_controls_step_output(self, controller):
+        """Test that --verbose alone shows steps and --quiet builds no loop progress."""
+        stream = io.StringIO()
+        controller.log = RunLogger(level=DEBUG, stream=stream)
+        controller.execute_action({"type": "log", "message": "hello"})
+        assert "Executing: log" in stream.getvalue()
+
+        controller.log = RunLogger(level=WARNING, stream=stream)
+        with patch.object(controller.log, 'action') as mock_action:
+            controller.execute_action({"type": "loop", "max_iterations": 20, "actions": []})
+        mock_action.assert_not_called()
+
+    def test_invalid_log_level_is_reported(self, controller, tmp_path, capsys):
+        """Test that a bad settings.log.level is reported like other bad settings."""
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"settings": {"log": {"level": "loud"}}, "actions": []}))
+        with pytest.raises(SystemExit) as exit_info:
+            controller.run_automation(window_name="App", config_path=str(path))
+        assert exit_info.value.code == 1
+        assert "Invalid configuration: Unknown log level 'loud'" in capsys.readouterr().out
+
+    @patch('pyautogui.screenshot')
+    def test_window_screenshot_uses_window_capture(self, mock_screenshot, controller, tmp_path):
+        """Test that window screenshots read only the window's pixels, not the screen."""
+        frame = FakeCapture.solid(30, 20, (255, 255, 255)).frame
+        frame[3, 4] = (0, 0, 255)
+        controller.capture = FakeWindowCapture(frame, (100, 50, 30, 20), window_id=42)
+        window = {"window_id": 42, "bounds": {"x": 100, "y": 50, "width": 30, "height": 20}}
+
+        path = controller.take_window_screenshot(window, str(tmp_path / "window.png"))
+        saved = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        assert saved.shape == (20, 30, 3)
+        assert tuple(saved[3, 4]) == (0, 0, 255)
+        mock_screenshot.assert_not_called()
+
+    def test_classify_screen(self, controller):
+        """Test that classify_screen names the catalogued screen the capture shows."""
+        rng = np.random.default_rng(0)
+        screens = [cv2.resize(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), (160, 100),
+                              interpolation=cv2.INTER_NEAREST) for _ in range(2)]
+        controller.screens = ScreenCatalog()
+        controller.screens.add("menu", screens[0])
+        controller.screens.add("game", screens[1])
+        controller.capture = FakeCapture([screens[1], np.zeros_like(screens[0])])
+
+        plan = controller.compile_plan([
+            {"type": "classify_screen", "store_as": "screen"},
+            {"type": "conditional",
+             "condition": {"type": "stored_result", "name": "screen", "label": "game"},
+             "if_true": [{"type": "classify_screen", "max_distance": 0, "store_as": "next"}]}
+        ])
+        controller.run_steps(plan.steps)
+        assert controller.results["screen"]["matched"] == "game"
+        assert controller.results["screen"]["distance"] == 0
+        assert controller.results["next"]["matched"] is None
+
+        with pytest.raises(PlanError):
+            controller.compile_plan([{"type": "classify_screen", "screens": ["settings"]}])
+
+    def test_apply_settings_rejects_bad_settings(self, controller):
+        """Test that the settings shared by runs and dry runs are validated up front."""
+        with pytest.raises(ValueError, match="speed must be a positive number"):
+            controller.apply_settings({"speed": 0})
+        with pytest.raises(ValueError, match="speed must be a positive number"):
+            controller.apply_settings({"speed": 2}, speed=-1)
+        with pytest.raises(ValueError):
+            controller.apply_settings({"poll": {"strategy": "sometimes"}})
+        with pytest.raises(ValueError):
+            controller.apply_settings({"search": {"threads": 0}})
+
+        controller.apply_settings({"speed": 4, "search": {"threads": 2}})
+        assert controller.speed == 4
+        assert controller.tiles.threads == 2
+        controller.tiles.close()
+
+    def test_compile_config_catalogues_screens(self, controller, tmp_path):
+        """Test that compiling a whole config builds the screen catalogue its actions use."""
+        path = tmp_path / "game.png"
+        cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8))
+        config = {
+            "screens": {"game": {"image": str(path)}},
+            "actions": [
+                {"type": "classify_screen", "store_as": "screen"},
+                {"type": "exit_if", "condition": {"type": "screen", "name": "game"}}
+            ]
+        }
+
+        assert len(controller.compile_config(config)) == 2
+        assert "game" in controller.screens
+        with pytest.raises(PlanError, match="Unknown screen 'game'"):
+            WindowController().compile_plan(config["actions"][1:])
+
+    def test_compile_config_shares_stored_results(self, controller, tmp_path):
+        """Test that transitions and actions can click each other's stored results."""
+        path = tmp_path / "menu.png"
+        cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8))
+        palette = [{"color": [255, 0, 0]}]
+        config = {
+            "screens": {"menu": {"image": str(path)}},
+            "transitions": [{"from": "*", "to": "menu", "actions": [
+                {"type": "click", "coordinate": "btn"},
+                {"type": "find_colors", "palette": palette, "store_as": "close"}
+            ]}],
+            "actions": [
+                {"type": "find_colors", "palette": palette, "store_as": "btn"},
+                {"type": "goto", "screen": "menu"},
+                {"type": "click", "coordinate": "close"}
+            ]
+        }
+
+        assert len(controller.compile_config(config)) == 3
+        assert len(controller.navigation) == 1
+        config["transitions"][0]["to"] = "credits"
+        with pytest.raises(PlanError, match=r"transitions\[0\]: unknown screen 'credits'"):
+            controller.compile_config(config)
+
+    def test_goto_replans_after_wrong_screen(self, controller):
+        """Test that goto follows the shortest route and recovers from a misdirected hop."""
+        rng = np.random.default_rng(1)
+        names = ["menu", "settings", "audio", "game"]
+        frames = {name: cv2.resize(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), (160, 100),
+                                   interpolation=cv2.INTER_NEAREST) for name in names}
+        controller.screens = ScreenCatalog()
+        for name in names:
+            controller.screens.add(name, frames[name])
+        controller.capture = FakeCapture(frames["game"])
+        controller.compile_navigation([
+            {"from": "menu", "to": "settings", "timeout": 0.05,
+             "actions": [{"type": "click", "x": 1, "y": 0}]},
+            {"from": "settings", "to": "audio", "actions": [{"type": "click", "x": 2, "y": 0}]},
+            {"from": "*", "to": "menu", "actions": [{"type": "click", "x": 9, "y": 0}]},
+        ])
+
+        # The first click meant for settings opens the game instead
+        landings = {1: ["game", "settings"], 2: ["audio"], 9: ["menu", "menu"]}
+        def click(x, y):
+            controller.capture.set_frame(frames[landings[x].pop(0)])
+
+        plan = controller.compile_plan([{"type": "goto", "screen": "audio"}])
+        with patch('pyautogui.click', side_effect=click):
+            result = controller.run_step(plan.steps[0])
+        assert result == {"matched": "audio", "hops": 5,
+                          "path": ["menu", "settings", "menu", "settings", "audio"]}
+
+        with pytest.raises(NavigationError):
+            controller.goto("game")
+        with pytest.raises(PlanError):
+            controller.compile_plan([{"type": "goto", "screen": "credits"}])
+
+    def test_wait_for_change(self, controller):
+        """Test that wait_for_change returns once the region is redrawn."""
+        before = FakeCapture.solid(40, 30, (255, 255, 255)).frame
+        after = FakeCapture.solid(40, 30, (30, 30, 30)).frame
+        controller.capture = FakeCapture([before, before, before, after])
+
+        result = controller.execute_action({"type": "wait_for_change", "region": [0, 0, 40, 30],
+                                            "interval": 0.001})
+        assert result["changed"] is True
+        assert controller.capture.grab_count == 4
+
+    def test_wait_for_stable(self, controller):
+        """Test that wait_for_stable waits for redraws to stop, and times out softly."""
+        frames = [FakeCapture.solid(40, 30, (level, level, level)).frame for level in (0, 80, 160)]
+        controller.capture = FakeCapture(frames)
+        result = controller.execute_action({"type": "wait_for_stable", "stable_ms": 20,
+                                            "interval": 0.001})
+        assert result["stable"] is True
+        assert controller.capture.index == 2
+
+        controller.capture = FakeCapture(frames)
+        result = controller.execute_action({"type": "wait_for_stable", "stable_ms": 1000,
+                                            "timeout": 0.01, "interval": 0.001})
+        assert result["stable"] is False
+
+    def test_pixel_set_conditions(self, controller):
+        """Test all_of and any_of against one capture of the probes' bounding box."""
+        frame = FakeCapture.solid(50, 50, (255, 255, 255)).frame
+        frame[10, 5] = (0, 120, 255)
+        frame[40, 30] = (0, 0, 0)
+        controller.capture = FakeCapture(frame)
+        pixels = [
+            {"x": 5, "y": 10, "color": [0, 122, 255]},
+            {"x": 30, "y": 40, "color": [0, 0, 0], "tolerance": 0},
+            {"x": 20, "y": 20, "color": [0, 0, 0]},
+        ]
+
+        assert controller.probe_condition({"type": "all_of", "pixels": pixels[:2]}) is True
+        assert controller.probe_condition({"type": "all_of", "pixels": pixels}) is False
+        assert controller.probe_condition({"type": "any_of", "pixels": pixels[2:]}) is False
+        assert controller.probe_condition({"type": "any_of", "pixels": pixels, "tolerance": 1}) is True
+        assert controller.capture.grab_count == 4
+
+    @patch('pyautogui.click')
+    def test_click_on_color_searches_frame(self, mock_click, controller):
+        """Test that click_on_color clicks the first matching point of the region."""
+        frame = FakeCapture.solid(40, 30).frame
+        frame[12, 25] = (0, 0, 255)
+        controller.capture = FakeCapture(frame)
+
+        controller.execute_action({
+            "type": "click_on_color",
+            "color": [0, 0, 255],
+            "search_region": [20, 10, 10, 10]
+        })
+        mock_click.assert_called_once_with(25, 12)
+
+    @patch('pyautogui.click')
+    def test_click_on_color_nearest_returns_all_hits(self, mock_click, controller):
+        """Test nearest-first ordering and returning every hit in screen coordinates."""
+        frame = FakeCapture.solid(40, 30).frame
+        frame[1, 1] = (0, 0, 255)
+        frame[28, 38] = (0, 0, 255)
+        controller.capture = FakeCapture(frame)
+
+        hits = controller.execute_action({
+            "type": "click_on_color",
+            "color": [0, 0, 255],
+            "scan_order": "nearest",
+            "x": 35,
+            "y": 25,
+            "return_all": True
+        })
+        mock_click.assert_called_once_with(38, 28)
+        assert hits == [[38, 28], [1, 1]]
+
+    @patch('pyautogui.click')
+    def test_click_on_color_blob_centroid(self, mock_click, controller):
+        """Test that blob mode clicks the centroid of the largest region, not an edge pixel."""
+        frame = FakeCapture.solid(40, 30).frame
+        frame[2, 2] = (0, 0, 255)
+        frame[10:15, 20:27] = (0, 0, 255)
+        controller.capture = FakeCapture(frame)
+
+        point = controller.execute_action({
+            "type": "click_on_color",
+            "color": [0, 0, 255],
+            "search_region": [10, 5, 30, 25],
+            "blob": "largest",
+            "min_area": 4
+        })
+        mock_click.assert_called_once_with(23, 12)
+        assert point == [23, 12]
+
+    @patch('pyautogui.click')
+    def test_click_on_color_tracks_changes(self, mock_click, controller):
+        """Test that repeated searches rescan only the tiles that changed."""
+        frame = FakeCapture.solid(200, 100).frame
+        moved = frame.copy()
+        moved[80, 150] = (0, 0, 255)
+        controller.capture = FakeCapture([frame, frame, moved])
+        plan = controller.compile_plan([
+            {"type": "click_on_color", "color": [0, 0, 255], "track_changes": True}
+        ])
+        step = plan.steps[0]
+
+        assert controller.run_step(step) is None
+        assert controller.run_step(step) is None
+        assert controller.run_step(step) == [150, 80]
+        mock_click.assert_called_once_with(150, 80)
+
+    @patch('pyautogui.click')
+    def test_click_on_color_downsample(self, mock_click, controller):
+        """Test that a downsampled search clicks the same points as a full scan."""
+        frame = FakeCapture.solid(200, 100).frame
+        frame[41:50, 117:130] = (0, 0, 255)
+        controller.capture = FakeCapture(frame)
+
+        assert controller.execute_action({"type": "click_on_color", "color": [0, 0, 255],
+                                          "downsample": 8}) == [117, 41]
+        assert controller.execute_action({"type": "click_on_color", "color": [0, 0, 255],
+                                          "downsample": 4, "blob": "largest"}) == [123, 45]
+        with pytest.raises(ValueError):
+            controller.execute_action({"type": "click_on_color", "color": [0, 0, 255],
+                                       "downsample": 4, "return_all": True})
+
+    @patch('pyautogui.click')
+    def test_searches_offset_by_window_origin(self, mock_click, controller, tmp_path):
+        """Test that searches without a search_region click screen points under window capture."""
+        rng = np.random.default_rng(0)
+        frame = cv2.resize(rng.integers(0, 200, (30, 40, 3), dtype=np.uint8), (400, 300))
+        frame[3, 4] = (0, 0, 255)
+        path = tmp_path / "button.png"
+        cv2.imwrite(str(path), cv2.cvtColor(frame[100:140, 200:260], cv2.COLOR_RGB2BGR))
+        controller.capture = FakeWindowCapture(frame, (100, 50, 400, 300), window_id=42)
+        controller.current_window = {"window_id": 42,
+                                     "bounds": {"x": 100, "y": 50, "width": 400, "height": 300}}
+
+        assert controller.execute_action({"type": "click_on_color", "color": [0, 0, 255],
+                                          "tolerance": 0}) == [104, 53]
+        assert controller.execute_action({"type": "click_on_color", "color": [0, 0, 255],
+                                          "tolerance": 0, "scan_order": "nearest",
+                                          "x": 110, "y": 60}) == [104, 53]
+        found = controller.execute_action({"type": "click_on_any_color", "tolerance": 0,
+                                           "palette": [{"color": [0, 0, 255]}]})
+        assert found["point"] == [104, 53]
+        result = controller.execute_action({"type": "click_on_image", "image": str(path)})
+        assert result["point"] == [330, 170]
+        assert result["window_point"] == [230, 120]
+        assert [call.args for call in mock_click.call_args_list] == [
+            (104, 53), (104, 53), (104, 53), (330, 170)]
+
+    @patch('pyautogui.click')
+    def test_click_on_any_color_stores_result(self, mock_click, controller):
+        """Test that one palette search clicks the first listed color found and stores it."""
+        frame = FakeCapture.solid(40, 30).frame
+        frame[20, 30] = (0, 200, 0)
+        frame[5, 5] = (200, 0, 0)
+        controller.capture = FakeCapture(frame)
+
+        plan = controller.compile_plan([
+            {
+                "type": "click_on_any_color",
+                "palette": [
+                    {"label": "disabled", "color": [90, 90, 90]},
+                    {"label": "ready", "color": [0, 200, 0]},
+                    {"label": "error", "color": [200, 0, 0]},
+                ],
+                "store_as": "button"
+            },
+            {"type": "conditional",
+             "condition": {"type": "stored_result", "name": "button", "label": "ready"},
+             "if_true": [{"type": "double_click", "coordinate": "button"}]}
+        ])
+        with patch('pyautogui.doubleClick') as mock_double_click:
+            controller.run_steps(plan.steps)
+            mock_double_click.assert_called_once_with(30, 20)
+
+        mock_click.assert_called_once_with(30, 20)
+        assert controller.results["button"]["matched"] == "ready"
+        assert controller.results["button"]["matches"]["error"] == {"point": [5, 5], "count": 1}
+
+    @patch('pyautogui.click')
+    def test_click_on_image(self, mock_click, controller, tmp_path):
+        """Test that click_on_image clicks the match centre and reports window coordinates."""
+        rng = np.random.default_rng(0)
+        frame = cv2.resize(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8), (400, 300))
+        path = tmp_path / "button.png"
+        cv2.imwrite(str(path), cv2.cvtColor(frame[100:140, 200:260], cv2.COLOR_RGB2BGR))
+        controller.capture = FakeCapture(frame)
+        controller.current_window = {"window_id": 1, "bounds": {"x": 50, "y": 20, "width": 400, "height": 300}}
+
+        result = controller.execute_action({
+            "type": "click_on_image",
+            "image": str(path),
+            "search_region": [150, 50, 200, 200]
+        })
+        mock_click.assert_called_once_with(230, 120)
+        assert result["bbox"] == [200, 100, 60, 40]
+        assert result["window_point"] == [180, 100]
+
+        assert controller.probe_condition({"type": "image_exists", "image": str(path)}) is True
+        assert controller.probe_condition({"type": "image_exists", "image": str(path),
+                                           "downsample": 1}) is True
+        # Decoded once at compile time, then served from the template store
+        assert controller.templates.misses == 1
+
+    def test_image_search_reuses_unchanged_result(self, controller, tmp_path):
+        """Test that a tracked image search skips matching while the region is unchanged."""
+        rng = np.random.default_rng(0)
+        frame = cv2.resize(rng.integers(0, 256, (30, 40, 3), dtype=np.uint8), (400, 300))
+        path = tmp_path / "button.png"
+        cv2.imwrite(str(path), cv2.cvtColor(frame[100:140, 200:260], cv2.COLOR_RGB2BGR))
+        blank = np.zeros_like(frame)
+        controller.capture = FakeCapture([frame, frame, blank])
+        condition = controller._compile_condition(
+            {"type": "image_exists", "image": str(path), "track_changes": True})
+
+        with patch('mactoro.window_controller.match_template', wraps=match_template) as mock_match:
+            assert controller.probe_condition(condition) is True
+            assert controller.probe_condition(condition) is True
+            assert mock_match.call_count == 1
+            assert controller.probe_condition(condition) is False
+            assert mock_match.call_count == 2
+
+    def test_click_on_image_missing_file(self, controller):
+        """Test that a missing template fails at compile time with the step path."""
+        with pytest.raises(PlanError, match=r"actions\[0\]: Cannot read image"):
+            controller.compile_plan([{"type": "click_on_image", "image": "missing.png"}])
+
+    def test_click_on_missing_stored_result(self, controller):
+        """Test that clicking a stored result with no match fails the step."""
+        controller.capture = FakeCapture.solid(10, 10)
+        plan = controller.compile_plan([
+            {"type": "find_colors", "palette": [{"color": [255, 0, 0]}], "store_as": "target"},
+            {"type": "click", "coordinate": "target"}
+        ])
+        controller.screenshot_on_error = False
+        with pytest.raises(ValueError, match="has no match"):
+            controller.run_steps(plan.steps)
+
+    @patch('time.sleep')
+    def test_conditional_does_not_poll(self, mock_sleep, controller):
+        """Test that a false conditional does not wait before taking the else branch."""
+        controller.probe_condition = Mock(return_value=False)
+        controller.wait_for_condition = Mock(return_value=False)
+
+        controller.execute_action({
+            "type": "conditional",
+            "condition": {"type": "window_exists", "window_name": "Missing"},
+            "if_false": [{"type": "log", "message": "not found"}]
+        })
+
+        controller.probe_condition.assert_called_once()
+        controller.wait_for_condition.assert_not_called()
+        mock_sleep.assert_not_called()
+
+    def test_condition_poll_timeout(self, controller):
+        """Test that poll_timeout opts a condition into blocking polls."""
+        controller.wait_for_condition = Mock(return_value=True)
+
+        condition = {"type": "window_exists", "window_name": "Done", "poll_timeout": 0.5}
+        assert controller.check_condition(condition) is True
+        controller.wait_for_condition.assert_called_once_with(condition, 0.5, None)